@@ -0,0 +1,8 @@
+from djmoney.apps import MoneyConfig
+
+
+class StorefrontMoneyConfig(MoneyConfig):
+    """djmoney для профиля витрины: без правок админки, которые импортируют django.contrib.admin"""
+
+    def ready(self):
+        pass
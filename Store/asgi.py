@@ -14,3 +14,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Store.settings')
 
 application = get_asgi_application()
+
+# Прогрев кэша каталога до первых запросов (CATALOG_CACHE['WARM_ON_STARTUP'])
+from appProducts.warmup import warm_on_startup  # noqa: E402
+
+warm_on_startup()
+
+# Обращения из спул-файлов процессов, завершившихся без сброса (appProducts.intake)
+from appProducts.intake import recover_on_startup  # noqa: E402
+
+recover_on_startup()
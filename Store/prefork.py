@@ -0,0 +1,293 @@
+"""
+Pre-fork сервер для рабочего окружения.
+
+    python -m Store.prefork --bind 0.0.0.0:8000 --workers 4
+    python -m Store.prefork --report --workers 4
+
+Главный процесс полностью инициализирует приложение: реестр приложений
+(unfold, djmoney, babel и остальные импорты), URL-резолвер, скомпилированные
+шаблоны и функции прогрева из settings.PREFORK_PRELOAD. Затем он закрывает
+соединения с базой, собирает мусор, вызывает gc.freeze() и только после этого
+порождает рабочие процессы через fork. Рабочие наследуют готовое приложение и
+общий слушающий сокет, а страницы памяти с объектами главного процесса
+остаются общими (copy-on-write): замороженные объекты сборщик мусора не
+обходит и не переписывает их заголовки в дочерних процессах.
+
+Главный процесс перезапускает упавших рабочих и по SIGTERM/SIGINT
+останавливает всех. Рабочий по SIGTERM перестаёт принимать соединения,
+дожидается текущих запросов, сбрасывает буферы процесса (просмотры товаров,
+обращения) и только после этого завершается. --report сравнивает время
+запуска рабочих и их память (RSS, PSS, собственные страницы) без
+предзагрузки и с ней.
+
+Рабочие обслуживают запросы HTTP-сервером из стандартной библиотеки
+(django.core.servers.basehttp, поток на соединение, журнал только ошибок).
+Это временное решение для одного хоста без внешних зависимостей: ограничений
+на размер и время запроса, защиты от медленных клиентов и TLS он не даёт,
+поэтому перед ним нужен обратный прокси (nginx), а при
+переходе на gunicorn или uWSGI предзагрузку и gc.freeze() выполняет их
+хук запуска главного процесса.
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Store.settings')
+
+
+def preload():
+    """Инициализирует приложение в текущем процессе и возвращает WSGI-приложение"""
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+    from django.urls import get_resolver
+    from django.utils.module_loading import import_string
+
+    application = get_wsgi_application()
+    # Модули приложений импортируются только после настройки Django
+    from appProducts.warmup import compile_templates
+
+    # Резолвер импортирует все модули представлений и строит таблицы reverse()
+    resolver = get_resolver()
+    resolver.reverse_dict
+    templates = compile_templates()
+    for path in getattr(settings, 'PREFORK_PRELOAD', []):
+        import_string(path)()
+    # Соединения главного процесса не должны достаться рабочим
+    connections.close_all()
+    return application, templates
+
+
+def _listen(bind):
+    host, _, port = bind.rpartition(':')
+    return socket.create_server((host or '0.0.0.0', int(port)), backlog=2048)
+
+
+def _serve(listener, application):
+    """Обслуживает запросы до SIGTERM, затем дожидается текущих и возвращается"""
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class RequestHandler(WSGIRequestHandler):
+        # Простаивающее keep-alive соединение не должно задерживать остановку рабочего
+        timeout = 10
+
+        def log_message(self, format, *args):
+            # Журнал каждого запроса пишет прокси; здесь только ошибки
+            if len(args) > 1 and str(args[1])[:1] in ('4', '5'):
+                super().log_message(format, *args)
+
+    class Server(ThreadedWSGIServer):
+        # server_close() дожидается запросов, начатых до остановки
+        daemon_threads = False
+
+    server = Server(listener.getsockname()[:2], RequestHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.server_name = socket.getfqdn(listener.getsockname()[0])
+    server.server_port = listener.getsockname()[1]
+    server.setup_environ()
+    server.set_app(application)
+
+    def stop(signum, frame):
+        # shutdown() ждёт выхода из serve_forever(), поэтому вызывается из другого потока
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def _flush_buffers():
+    """Сбрасывает буферы процесса: при выходе через os._exit обработчики atexit не выполняются"""
+    try:
+        from appProducts.buffering import flush_all
+        flush_all()
+    except BaseException:
+        traceback.print_exc()
+
+
+class Master:
+    def __init__(self, listener, workers, application=None, ready_pipe=None):
+        self.listener = listener
+        self.workers = workers
+        # Без предзагруженного приложения каждый рабочий инициализирует Django сам
+        self.application = application
+        self.ready_pipe = ready_pipe
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self):
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid:
+            self.children[pid] = started
+            return pid
+        # Рабочий процесс
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        status = 0
+        try:
+            application = self.application or preload()[0]
+            if self.ready_pipe is not None:
+                os.write(self.ready_pipe, f"{os.getpid()}\n".encode())
+            _serve(self.listener, application)
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            _flush_buffers()
+            os._exit(status)
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self.children.pop(pid, None)
+            if not self.stopping:
+                print(f"Рабочий {pid} завершился (статус {status}), запускаю новый", file=sys.stderr)
+                self.spawn()
+
+    def stop(self):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _stop(self, signum, frame):
+        self.stop()
+
+
+def _memory(pid):
+    """RSS, PSS и собственные страницы процесса в КБ (Linux)"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if rest.strip().endswith('kB'):
+                values[key] = int(rest.split()[0])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def _measure(mode, workers, paths, requests):
+    """Запускает рабочих в режиме cold или preload и печатает JSON с замерами"""
+    listener = _listen('127.0.0.1:0')
+    application = None
+    if mode == 'preload':
+        application, _ = preload()
+        gc.collect()
+        gc.freeze()
+    read_fd, write_fd = os.pipe()
+    master = Master(listener, workers, application=application, ready_pipe=write_fd)
+    spawn_times = []
+    statuses = {}
+    try:
+        for _ in range(workers):
+            master.spawn()
+        with os.fdopen(read_fd) as ready:
+            for _ in range(workers):
+                pid = int(ready.readline())
+                spawn_times.append(time.perf_counter() - master.children[pid])
+
+        port = listener.getsockname()[1]
+        for n in range(requests):
+            url = f'http://127.0.0.1:{port}{paths[n % len(paths)]}'
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            statuses[status] = statuses.get(status, 0) + 1
+
+        memory = [_memory(pid) for pid in master.children]
+    finally:
+        # Рабочие держат stdout: без них родительский --report не дождётся вывода
+        master.stop()
+        while master.children:
+            pid, _ = os.wait()
+            master.children.pop(pid, None)
+        os.close(write_fd)
+    print(json.dumps({'spawn': spawn_times, 'memory': memory, 'statuses': statuses}))
+
+
+def _report(workers, paths, requests):
+    print(f"Рабочих: {workers}, запросов после запуска: {requests} ({', '.join(paths)})")
+    print(f"{'режим':>8} {'запуск ср.':>11} {'запуск макс.':>13} {'RSS':>9} {'PSS':>9} {'своя':>9} {'PSS всего':>10}")
+    for mode in ('cold', 'preload'):
+        # Отдельный интерпретатор, чтобы режим cold не получил уже импортированный Django
+        output = subprocess.run(
+            [sys.executable, '-m', 'Store.prefork', '--measure', mode, '--workers', str(workers),
+             '--requests', str(requests), *(arg for path in paths for arg in ('--path', path))],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        memory = result['memory']
+        average = {key: sum(m[key] for m in memory) / len(memory) / 1024 for key in ('rss', 'pss', 'private')}
+        if set(result['statuses']) != {'200'}:
+            print(f"{mode:>8}: ответы рабочих {result['statuses']}", file=sys.stderr)
+        print(
+            f"{mode:>8} {sum(result['spawn']) / workers * 1000:>9.0f}мс {max(result['spawn']) * 1000:>11.0f}мс "
+            f"{average['rss']:>7.1f}МБ {average['pss']:>7.1f}МБ {average['private']:>7.1f}МБ "
+            f"{sum(m['pss'] for m in memory) / 1024:>8.1f}МБ"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fork сервер с предзагрузкой приложения")
+    parser.add_argument('--bind', default=os.getenv('PREFORK_BIND', '127.0.0.1:8000'), help='Адрес host:port')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('PREFORK_WORKERS', '4')),
+                        help='Число рабочих процессов')
+    parser.add_argument('--report', action='store_true',
+                        help='Сравнить память и время запуска рабочих без предзагрузки и с ней')
+    parser.add_argument('--requests', type=int, default=50, help='Запросов к рабочим перед замером памяти (--report)')
+    parser.add_argument('--path', action='append', help='Адреса для запросов при --report (по умолчанию / и /products/)')
+    parser.add_argument('--measure', choices=['cold', 'preload'], help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+    paths = options.path or ['/', '/products/']
+
+    if options.measure:
+        _measure(options.measure, options.workers, paths, options.requests)
+        return
+    if options.report:
+        _report(options.workers, paths, options.requests)
+        return
+
+    started = time.perf_counter()
+    application, templates = preload()
+    listener = _listen(options.bind)
+    gc.collect()
+    gc.freeze()
+    print(
+        f"Приложение загружено за {time.perf_counter() - started:.2f} с (шаблонов: {templates}), "
+        f"заморожено объектов: {gc.get_freeze_count()}; {options.workers} рабочих на {options.bind}",
+        file=sys.stderr,
+    )
+    Master(listener, options.workers, application=application).run()
+
+
+if __name__ == '__main__':
+    main()
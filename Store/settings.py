@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'appProducts.replica.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,15 +88,80 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Store.wsgi.application'
 
+# Вызываются в главном процессе Store.prefork до запуска рабочих (прогрев, дозапись спула обращений): пути к функциям без аргументов
+PREFORK_PRELOAD = ['appProducts.warmup.warm_up', 'appProducts.intake.recover_on_startup']
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite в режиме WAL: читатели не блокируют писателя, писатели открывают
+# транзакцию сразу с блокировкой записи (IMMEDIATE) и ждут её до timeout секунд
+# вместо немедленной ошибки "database is locked"
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-32000',
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Тестовая база в файле, а не в памяти: проверки конкурентных
+        # оформлений открывают по соединению на поток
+        'TEST': {'NAME': os.getenv('DB_TEST_PATH', str(BASE_DIR / 'test_db.sqlite3'))},
+    }
+}
+
+# Асинхронные страницы каталога (appProducts.async_views): включать при запуске под ASGI
+ASYNC_CATALOG_VIEWS = os.getenv('ASYNC_CATALOG_VIEWS', '0') == '1'
+
+# Реплика для чтения каталога: копия базы, которую обновляет sync_replica
+DB_REPLICA_PATH = os.getenv('DB_REPLICA_PATH')
+if DB_REPLICA_PATH:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_PATH,
+        'OPTIONS': {
+            **DATABASES['default']['OPTIONS'],
+            'init_command': ';'.join(SQLITE_PRAGMAS + ['PRAGMA query_only=ON']),
+        },
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_ROUTERS = ['appProducts.replica.ReplicaRouter']
+
+REPLICA = {
+    'MAX_LAG': 30,  # при большем отставании каталог читается из основной базы
+    'CHECK_INTERVAL': 5,
+    # Админка и сотрудники читают только основную базу
+    'EXCLUDE_PATHS': ['/admin/'],
+    # После изменяющего запроса GET покупателя MAX_LAG секунд читает основную базу
+    'STICKY_COOKIE': 'primary_reads',
+    'MODELS': [
+        'appProducts.Category',
+        'appProducts.Subcategory',
+        'appProducts.Product',
+        'appProducts.ProductImage',
+        'appProducts.ProductSalesStats',
+        'appProducts.Promotion',
+    ],
+}
+
+# Повтор транзакций, не дождавшихся блокировки записи (appProducts.retry)
+SQLITE_RETRY = {
+    'ATTEMPTS': 4,
+    'BASE_DELAY': 0.05,
+    'MAX_DELAY': 1.0,
 }
 
 
@@ -152,3 +218,143 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
+
+# Почта: по умолчанию письма выводятся в консоль
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Clean Store <info@cleanstore.ru>')
+ADMINS = [('Clean Store', os.getenv('ADMIN_EMAIL'))] if os.getenv('ADMIN_EMAIL') else []
+
+# Очередь фоновых задач (python manage.py run_jobs)
+JOB_QUEUE = {
+    'WORKERS': int(os.getenv('JOB_WORKERS', 4)),
+    'MODE': os.getenv('JOB_WORKER_MODE', 'thread'),  # thread или process
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,  # секунд до первого повтора, далее удваивается
+    'BACKOFF_MAX': 3600,
+    'STALE_TIMEOUT': 600,
+}
+
+# Приём обращений с формы обратной связи: буфер в памяти + спул на диске,
+# запись в базу пакетами (python manage.py flush_contact_intake — ручной сброс)
+CONTACT_INTAKE = {
+    'ENABLED': os.getenv('CONTACT_INTAKE_ENABLED', '1') == '1',
+    'BATCH_SIZE': 50,
+    'FLUSH_INTERVAL': 2.0,
+    'SPOOL_DIR': BASE_DIR / 'var' / 'contact_spool',
+}
+
+# Счётчики просмотров товаров: как часто сбрасывать накопленное в базу, с
+PRODUCT_VIEWS = {
+    'FLUSH_INTERVAL': 10.0,
+}
+
+# Рейтинг продаж: refresh_sales_stats по расписанию (например, раз в 15 минут)
+SALES_RANKING = {
+    'BATCH_SIZE': 500,
+    # Сколько лидеров каждой подкатегории автоматически получают метку «Хит продаж»; 0 — вручную
+    'HIT_TOP_N': int(os.getenv('SALES_HIT_TOP_N', '0')),
+}
+
+# Архивация: archive_records по расписанию (например, раз в неделю)
+ARCHIVE = {
+    'ORDERS_AFTER_DAYS': 365,
+    'MESSAGES_AFTER_DAYS': 180,
+    'BATCH_SIZE': 500,
+    'PAUSE': 0.1,
+}
+
+# Сессии в БД с кэшем чтения в процессе: неизменённые сессии не перезаписываются
+SESSION_ENGINE = 'appProducts.session_store'
+SESSION_STORE = {
+    'TTL': 30,  # сколько секунд сессия живёт в общем кэше, прежде чем её перечитают из базы
+}
+
+# Очистка истёкших сессий и брошенных корзин: sweep_stale_data или
+# периодическая задача (sweep_stale_data --schedule)
+SWEEPER = {
+    'CART_TTL_DAYS': int(os.getenv('CART_TTL_DAYS', '30')),
+    'JOB_DONE_TTL_DAYS': 7,
+    'JOB_DEAD_TTL_DAYS': 30,
+    'BATCH_SIZE': 200,
+    'PAUSE': 0.2,
+    'INTERVAL': 3600,
+    'MAX_BATCHES_PER_RUN': 50,
+}
+
+# Общий кэш всех процессов на сервере: файл SQLite (лучше в /dev/shm), LRU в пределах лимитов
+CACHES = {
+    'default': {
+        'BACKEND': 'appProducts.cache_backend.SQLiteCache',
+        'LOCATION': os.getenv('CACHE_PATH', str(BASE_DIR / 'var' / 'cache.sqlite3')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_SIZE': int(os.getenv('CACHE_MAX_SIZE_MB', '256')) * 1024 * 1024,
+        },
+    },
+}
+
+# Кэш каталога (appProducts.catalog_cache) и прогрев после деплоя (warm_catalog)
+CATALOG_CACHE = {
+    'TREE_TIMEOUT': 3600,
+    'PAGE_TIMEOUT': 120,  # остатки и метки товаров меняются в обход сигналов
+    'WARM_TOP_N': 20,
+    # Защита от лавины пересчётов (appProducts.catalog_cache.get_or_build)
+    'STALE_TIMEOUT': 300,  # сколько отдавать устаревшее значение, пока его пересчитывает другой процесс
+    'LOCK_WAIT': 2.0,  # сколько ждать чужого пересчёта, если устаревшего значения нет
+    'LOCK_TIMEOUT': 30,
+    'EARLY_REFRESH_BETA': 1.0,  # >1 — пересчитывать раньше срока чаще
+    # Прогрев при загрузке Store.wsgi / Store.asgi; Store.prefork прогревает через PREFORK_PRELOAD
+    'WARM_ON_STARTUP': os.getenv('CATALOG_WARM_ON_STARTUP', '0') == '1',
+}
+
+# Журнал изменений каталога (appProducts.change_feed): catalog_changes --prune по расписанию
+CATALOG_CHANGES = {
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 0.5,  # с, пауза follow() при пустом журнале
+    'KEEP_DAYS': 7,
+}
+
+# Статическая копия каталога для файлового сервера: build_snapshot после изменений
+# каталога (обновляет только затронутые страницы) и build_snapshot --full раз в сутки
+SNAPSHOT = {
+    'ROOT': BASE_DIR / 'var' / 'snapshot',
+    'WORKERS': int(os.getenv('SNAPSHOT_WORKERS', '4')),
+    'BROTLI': True,  # .br рядом с .gz, если установлен пакет brotli
+}
+
+# Адрес сайта для абсолютных ссылок вне запроса (карта сайта, фиды)
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')
+
+# Карта сайта (appProducts.sitemaps): build_sitemaps по расписанию или сами
+# представления не чаще раза в CHECK_INTERVAL секунд
+SITEMAP = {
+    'ROOT': BASE_DIR / 'var' / 'sitemaps',
+    'CHUNK_SIZE': 50000,  # диапазон ID товаров в одном файле, не больше 50 000
+    'QUERY_CHUNK_SIZE': 2000,
+    'CHECK_INTERVAL': 600,
+    'BUILD_WAIT': 30,  # с, сколько запрос ждёт первую сборку, которую ведёт другой запрос
+}
+
+# Фид товаров для маркетплейсов (appProducts.feeds): /products/feed.<csv|jsonl|yml>[.gz]
+# и команда export_feed
+FEED = {
+    'CHUNK_SIZE': 1000,
+    'TOKEN': os.getenv('FEED_TOKEN', ''),  # фид отдаётся только с ?token=; без токена он отключён
+    'SHOP_NAME': 'Clean Store',
+    'COMPANY': 'Clean Store',
+    'CURRENCY': 'RUB',
+}
+
+# Панель администратора: сводка продаж на главной странице
+UNFOLD = {
+    'DASHBOARD_CALLBACK': 'appProducts.analytics.dashboard_callback',
+}
+
+# «Похожие товары»: build_related_products по расписанию (например, раз в сутки)
+RELATED_PRODUCTS = {
+    'LIMIT': 8,
+    'LOOKBACK_DAYS': 365,
+    'MIN_CO_PURCHASES': 1,
+}
@@ -0,0 +1,26 @@
+"""
+Профиль настроек для публичных рабочих процессов витрины.
+
+    DJANGO_SETTINGS_MODULE=Store.settings_storefront python -m Store.prefork --workers 8
+    python -m Store.prefork --bind 127.0.0.1:8001 --workers 1   # админка, обычный Store.settings
+
+Всё как в Store.settings, но без django.contrib.admin и интеграций unfold:
+их модули (import_export, guardian, simple_history, constance и т. д.)
+не импортируются, admin.py приложений не загружаются, djmoney не правит
+админку, а URL-схема
+не содержит /admin/. Адреса /admin/ балансировщик отправляет рабочим
+с обычными настройками. Время запуска обоих профилей сравнивает
+команда startup_bench.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS
+
+ADMIN_ONLY_APPS = ['django.contrib.admin']
+
+# djmoney при запуске подключается к админке и импортирует её модули
+REPLACED_APPS = {'djmoney': 'Store.apps.StorefrontMoneyConfig'}
+
+INSTALLED_APPS = [
+    REPLACED_APPS.get(app, app) for app in INSTALLED_APPS
+    if app not in ADMIN_ONLY_APPS and app != 'unfold' and not app.startswith('unfold.')
+]
@@ -1,18 +1,35 @@
-
-from django.contrib import admin
+from django.apps import apps
+from django.contrib.auth import views as auth_views
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from appProducts.views import home_view
+from appProducts import async_views, sitemaps, views
+
+home_view = async_views.home_view if settings.ASYNC_CATALOG_VIEWS else views.home_view
+
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    admin_patterns = [path('admin/', admin.site.urls)]
+    auth_patterns = include('django.contrib.auth.urls')
+else:
+    # Профиль витрины (Store.settings_storefront): шаблоны смены и сброса пароля
+    # приходят из админки, поэтому здесь только вход и выход
+    admin_patterns = []
+    auth_patterns = include([
+        path('login/', auth_views.LoginView.as_view(), name='login'),
+        path('logout/', auth_views.LogoutView.as_view(), name='logout'),
+    ])
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
+urlpatterns = admin_patterns + [
     path('', home_view, name='home'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-<slug:section>.xml', sitemaps.sitemap_section, name='sitemap_section'),
     path('products/', include('appProducts.urls', namespace='appProducts')),
-    path('accounts/', include('django.contrib.auth.urls')),
+    path('accounts/', auth_patterns),
     path('accounts/', include('appAccounts.urls')),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
@@ -1,7 +1,13 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils import timezone
 from django.utils.html import format_html
 from unfold.admin import ModelAdmin
-from .models import Category, Subcategory, Product, ProductImage, OrderItem, Order, ContactMessage
+from .intake import backlog_size
+from .inventory import apply_stock_edit
+from .models import (
+    Category, Subcategory, Product, ProductImage, OrderItem, Order, ContactMessage, Promotion, Job,
+    ProductSalesStats, ArchivedOrder, ArchivedOrderItem, ArchivedContactMessage, CatalogChange,
+)
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
@@ -129,15 +135,31 @@ class SubcategoryAdmin(ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(ModelAdmin):
-    list_display = ['name', 'subcategory', 'price', 'is_active', 'created_at']
+    list_display = ['name', 'subcategory', 'price', 'stock', 'views_count', 'is_active', 'created_at']
     list_display_links = ['name']
-    list_editable = ['price', 'is_active']
+    list_editable = ['price', 'stock', 'is_active']
     list_filter = ['subcategory__category', 'subcategory', 'is_active', 'created_at', 'is_new', 'is_hit', 'is_sale']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductImageInline]
     exclude = ['created_at', 'updated_at']
+    readonly_fields = ['views_count']
     ordering = ['-created_at']
+    # Поля, которые пишут фоновые процессы (счётчик просмотров, build_related_products):
+    # сохранение формы не должно затирать их значениями, загруженными вместе с формой
+    background_fields = ['views_count', 'related_ids']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Остаток списывают оформления заказов: пишем только изменение, сделанное в форме
+        obj.save(update_fields=[
+            field.name for field in obj._meta.concrete_fields
+            if not field.primary_key and field.name not in self.background_fields and field.name != 'stock'
+        ])
+        if 'stock' in form.changed_data:
+            apply_stock_edit(obj.pk, form.initial.get('stock'), obj.stock)
+            obj.refresh_from_db(fields=['stock'])
 
     # Показываем поле subcategory вместо category
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
@@ -153,7 +175,47 @@ class ProductImageAdmin(ModelAdmin):
     search_fields = ['product__name']
     ordering = ['product']
 
-class OrderItemInline(admin.TabularInline):
+@admin.register(Promotion)
+class PromotionAdmin(ModelAdmin):
+    list_display = ['title', 'kind', 'value', 'min_quantity', 'target_display', 'is_active', 'starts_at', 'ends_at']
+    list_display_links = ['title']
+    list_filter = ['kind', 'is_active', 'starts_at', 'ends_at']
+    list_editable = ['is_active']
+    search_fields = ['title']
+    autocomplete_fields = ['product']
+    fieldsets = (
+        ('Основная информация', {
+            'fields': ('title', 'kind', 'value', 'min_quantity', 'is_active')
+        }),
+        ('На что действует', {
+            'fields': ('product', 'subcategory', 'category'),
+            'description': 'Укажите одну цель. Если ничего не выбрано, акция действует на весь каталог.'
+        }),
+        ('Период действия', {
+            'fields': ('starts_at', 'ends_at')
+        }),
+    )
+    ordering = ['-created_at']
+
+    def target_display(self, obj):
+        return obj.product or obj.subcategory or obj.category or 'Весь каталог'
+    target_display.short_description = 'Действует на'
+
+class ReadOnlyAdminMixin:
+    """Записи только просматриваются: архив и позиции заказов"""
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class OrderItemInline(ReadOnlyAdminMixin, admin.TabularInline):
+    # Позиции заказа учтены в дневных сводках продаж: правка разошлась бы с ними
     model = OrderItem
     extra = 0
 
@@ -165,6 +227,11 @@ class OrderAdmin(ModelAdmin):
     inlines = [OrderItemInline]
     readonly_fields = ['user', 'first_name', 'last_name', 'phone', 'address', 'total_price', 'created_at']
 
+    def has_delete_permission(self, request, obj=None):
+        # Удалённый заказ остался бы в дневных сводках продаж: вместо удаления заказ отменяют,
+        # старые заказы переносит в архив команда archive_records
+        return False
+
 
 @admin.register(ContactMessage)
 class ContactMessageAdmin(ModelAdmin):
@@ -227,6 +294,12 @@ class ContactMessageAdmin(ModelAdmin):
         return format_html('<span style="color: red;">✗</span>')
     has_phone.short_description = 'Телефон'
     
+    def changelist_view(self, request, extra_context=None):
+        backlog = backlog_size()
+        if backlog:
+            self.message_user(request, f'Ожидают записи из буфера: {backlog} обращений', messages.INFO)
+        return super().changelist_view(request, extra_context)
+
     def change_view(self, request, object_id, form_url='', extra_context=None):
         extra_context = extra_context or {}
         message = self.get_object(request, object_id)
@@ -241,9 +314,76 @@ class ContactMessageAdmin(ModelAdmin):
     mark_as_in_progress.short_description = 'Отметить как "В работе"'
     
     def mark_as_resolved(self, request, queryset):
-        from django.utils import timezone
         count = queryset.update(status='resolved', resolved_at=timezone.now())
         self.message_user(request, f'{count} сообщений отмечено как "Решено"')
     mark_as_resolved.short_description = 'Отметить как "Решено"'
     
-    actions = ['mark_as_in_progress', 'mark_as_resolved']
\ No newline at end of file
+    actions = ['mark_as_in_progress', 'mark_as_resolved']
+
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'name', 'created_at']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['name', 'payload', 'status', 'attempts', 'max_attempts', 'run_after',
+                       'locked_at', 'last_error', 'created_at', 'updated_at']
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_after=timezone.now(), locked_at=None
+        )
+        self.message_user(request, f'{count} задач поставлено в очередь повторно')
+    requeue.short_description = 'Поставить в очередь повторно'
+
+    actions = ['requeue']
+
+
+@admin.register(ProductSalesStats)
+class ProductSalesStatsAdmin(ModelAdmin):
+    list_display = ['product', 'subcategory', 'units_7d', 'units_30d', 'revenue_30d', 'units_90d', 'updated_at']
+    list_filter = ['category', 'subcategory']
+    search_fields = ['product__name']
+    list_select_related = ['product', 'subcategory']
+    ordering = ['-units_30d']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedOrderItemInline(ReadOnlyAdminMixin, admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    fields = ['product_name', 'product', 'quantity', 'price', 'discount', 'line_total']
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ReadOnlyAdminMixin, ModelAdmin):
+    list_display = ['id', 'first_name', 'last_name', 'status', 'total_price', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['id', 'first_name', 'last_name', 'phone']
+    date_hierarchy = 'created_at'
+    inlines = [ArchivedOrderItemInline]
+
+
+@admin.register(ArchivedContactMessage)
+class ArchivedContactMessageAdmin(ReadOnlyAdminMixin, ModelAdmin):
+    list_display = ['name', 'email', 'category', 'status', 'created_at', 'archived_at']
+    list_filter = ['category', 'status', 'created_at']
+    search_fields = ['name', 'email', 'subject', 'message']
+    date_hierarchy = 'created_at'
+
+
+@admin.register(CatalogChange)
+class CatalogChangeAdmin(ReadOnlyAdminMixin, ModelAdmin):
+    list_display = ['sequence', 'entity', 'entity_id', 'operation', 'created_at']
+    list_filter = ['entity', 'operation', 'created_at']
+    search_fields = ['entity_id']
+    ordering = ['-sequence']
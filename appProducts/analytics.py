@@ -0,0 +1,223 @@
+"""
+Дневные сводки продаж для панели администратора.
+
+Сводки обновляются в той же транзакции, что и сами заказы: при оформлении
+(record_new_order из checkout) и при смене статуса (сигнал post_save Order,
+в том числе из списка и формы OrderAdmin). Удалять заказы в админке нельзя —
+их отменяют, а архивация переносит заказ в ArchivedOrder, который сводки
+тоже учитывают. Массовые изменения в обход save()
+и правки позиций заказа вручную исправляет команда rebuild_sales_rollups.
+Дашборд читает только сводки и не агрегирует Order/OrderItem.
+"""
+import json
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, DailyOrderStats, DailyProductSales, Order, OrderItem, Product,
+)
+
+NOT_COUNTED_STATUSES = {'cancelled'}
+DASHBOARD_DAYS = 30
+
+
+def _increment(model, lookup, defaults, **deltas):
+    """UPDATE ... SET field = field + delta, а при отсутствии строки — INSERT"""
+    updated = model.objects.filter(**lookup).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **defaults, **deltas)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        model.objects.filter(**lookup).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+
+def _order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+def _add_order(order, status, sign):
+    _increment(
+        DailyOrderStats,
+        {'day': _order_day(order), 'status': status},
+        {},
+        orders=sign,
+        units=sign * order.items_count,
+        revenue=sign * order.total_price.amount,
+    )
+
+
+def _add_items(order, items, sign):
+    day = _order_day(order)
+    for item in items:
+        _increment(
+            DailyProductSales,
+            {'day': day, 'product_id': item.product_id},
+            {'category_id': item.product.subcategory.category_id},
+            units=sign * item.quantity,
+            revenue=sign * item.line_total.amount,
+        )
+
+
+def record_new_order(order, items):
+    """Учитывает только что созданный заказ; items — его позиции с product__subcategory"""
+    _add_order(order, order.status, 1)
+    if order.status not in NOT_COUNTED_STATUSES:
+        _add_items(order, items, 1)
+
+
+def record_status_change(order, old_status, new_status):
+    """Переносит заказ между статусами сводки; при отмене списывает продажи товаров"""
+    _add_order(order, old_status, -1)
+    _add_order(order, new_status, 1)
+    was_counted = old_status not in NOT_COUNTED_STATUSES
+    is_counted = new_status not in NOT_COUNTED_STATUSES
+    if was_counted != is_counted:
+        items = order.items.select_related('product__subcategory')
+        _add_items(order, items, 1 if is_counted else -1)
+
+
+def _day_bounds(date_from, date_to):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(date_from, time.min), tz)
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def _sum_rows(rows, key_fields, sum_fields):
+    totals = {}
+    for row in rows:
+        key = tuple(row[field] for field in key_fields)
+        if key not in totals:
+            totals[key] = dict.fromkeys(sum_fields, 0)
+        for field in sum_fields:
+            totals[key][field] += row[field] or 0
+    return totals
+
+
+def rebuild_rollups(date_from, date_to):
+    """Пересчитывает сводки за дни [date_from; date_to] заново по заказам, включая архивные"""
+    start, end = _day_bounds(date_from, date_to)
+    order_rows = []
+    for model in (Order, ArchivedOrder):
+        order_rows += (
+            model.objects.filter(created_at__gte=start, created_at__lt=end)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'status')
+            .annotate(orders=Count('id'), units=Sum('items_count'), revenue=Sum('total_price'))
+            .order_by()
+        )
+    product_rows = []
+    for model in (OrderItem, ArchivedOrderItem):
+        product_rows += (
+            # Позиции удалённых товаров в архиве не учитываются: их не к чему привязать
+            model.objects.filter(order__created_at__gte=start, order__created_at__lt=end, product__isnull=False)
+            .exclude(order__status__in=NOT_COUNTED_STATUSES)
+            .annotate(day=TruncDate('order__created_at'))
+            .values('day', 'product_id', 'product__subcategory__category_id')
+            .annotate(units=Sum('quantity'), revenue=Sum('line_total'))
+            .order_by()
+        )
+    order_totals = _sum_rows(order_rows, ('day', 'status'), ('orders', 'units', 'revenue'))
+    product_totals = _sum_rows(
+        product_rows, ('day', 'product_id', 'product__subcategory__category_id'), ('units', 'revenue')
+    )
+    with transaction.atomic():
+        DailyOrderStats.objects.filter(day__gte=date_from, day__lte=date_to).delete()
+        DailyProductSales.objects.filter(day__gte=date_from, day__lte=date_to).delete()
+        orders = DailyOrderStats.objects.bulk_create(
+            [
+                DailyOrderStats(day=day, status=status, **values)
+                for (day, status), values in order_totals.items()
+            ],
+            batch_size=500,
+        )
+        products = DailyProductSales.objects.bulk_create(
+            [
+                DailyProductSales(day=day, product_id=product_id, category_id=category_id, **values)
+                for (day, product_id, category_id), values in product_totals.items()
+            ],
+            batch_size=500,
+        )
+    return len(orders), len(products)
+
+
+def dashboard_callback(request, context):
+    """Показатели за последние DASHBOARD_DAYS дней для главной страницы админки"""
+    today = timezone.localdate()
+    since = today - timedelta(days=DASHBOARD_DAYS - 1)
+
+    order_stats = DailyOrderStats.objects.filter(day__gte=since)
+    counted = order_stats.exclude(status__in=NOT_COUNTED_STATUSES)
+    totals = counted.aggregate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+    orders_total = totals['orders'] or 0
+    revenue_total = totals['revenue'] or 0
+
+    revenue_by_day = dict(
+        counted.values('day').annotate(revenue=Sum('revenue')).values_list('day', 'revenue')
+    )
+    days = [since + timedelta(days=offset) for offset in range(DASHBOARD_DAYS)]
+    revenue_chart = {
+        'labels': [day.strftime('%d.%m') for day in days],
+        'datasets': [{
+            'label': 'Выручка, ₽',
+            'data': [float(revenue_by_day.get(day, 0)) for day in days],
+        }],
+    }
+
+    status_names = dict(Order.STATUS_CHOICES)
+    by_status = order_stats.values('status').annotate(orders=Sum('orders')).order_by('-orders')
+
+    product_sales = DailyProductSales.objects.filter(day__gte=since)
+    top_categories = list(
+        product_sales.values('category_id')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')[:5]
+    )
+    top_products = list(
+        product_sales.values('product_id')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-units')[:10]
+    )
+    category_titles = Category.objects.in_bulk([row['category_id'] for row in top_categories])
+    product_names = Product.objects.only('name').in_bulk([row['product_id'] for row in top_products])
+
+    context.update({
+        'sales_dashboard': {
+            'days': DASHBOARD_DAYS,
+            'orders': orders_total,
+            'units': totals['units'] or 0,
+            'revenue': revenue_total,
+            'average_order': revenue_total / orders_total if orders_total else 0,
+            'revenue_chart': json.dumps(revenue_chart),
+            'statuses': {
+                'headers': ['Статус', 'Заказов'],
+                'rows': [[status_names.get(row['status'], row['status']), row['orders']] for row in by_status],
+            },
+            'categories': {
+                'headers': ['Категория', 'Продано, шт.', 'Выручка'],
+                'rows': [
+                    [str(category_titles.get(row['category_id'], row['category_id'])), row['units'], row['revenue']]
+                    for row in top_categories
+                ],
+            },
+            'products': {
+                'headers': ['Товар', 'Продано, шт.', 'Выручка'],
+                'rows': [
+                    [getattr(product_names.get(row['product_id']), 'name', row['product_id']), row['units'], row['revenue']]
+                    for row in top_products
+                ],
+            },
+        },
+    })
+    return context
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class AppproductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appProducts'
-    verbose_name = "Товары"
\ No newline at end of file
+    verbose_name = "Товары"
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,135 @@
+"""
+Перенос старых заказов и обращений в архивные таблицы.
+
+Завершённые заказы и закрытые обращения старше заданного срока переносятся
+пачками: каждая пачка копируется в архив и удаляется из оперативной таблицы
+одной транзакцией, а между пачками делается пауза, чтобы не держать
+блокировку записи SQLite долго. Архив доступен в админке только для чтения.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedContactMessage, ArchivedOrder, ArchivedOrderItem, ContactMessage, Order, OrderItem,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_ORDER_STATUSES = ('delivered', 'cancelled')
+ARCHIVED_MESSAGE_STATUSES = ('resolved', 'closed')
+
+
+def _setting(name, default):
+    return getattr(settings, 'ARCHIVE', {}).get(name, default)
+
+
+def orders_to_archive(cutoff):
+    return Order.objects.filter(status__in=ARCHIVED_ORDER_STATUSES, created_at__lt=cutoff)
+
+
+def messages_to_archive(cutoff):
+    return ContactMessage.objects.filter(status__in=ARCHIVED_MESSAGE_STATUSES, updated_at__lt=cutoff)
+
+
+def _archive_order_batch(cutoff, batch_size):
+    with transaction.atomic():
+        orders = list(orders_to_archive(cutoff).order_by('pk')[:batch_size])
+        if not orders:
+            return 0
+        order_ids = [order.pk for order in orders]
+        items = OrderItem.objects.filter(order_id__in=order_ids).select_related('product')
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order.pk,
+                user_id=order.user_id,
+                first_name=order.first_name,
+                last_name=order.last_name,
+                phone=order.phone,
+                address=order.address,
+                status=order.status,
+                total_price=order.total_price,
+                items_count=order.items_count,
+                created_at=order.created_at,
+            )
+            for order in orders
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(
+                order_id=item.order_id,
+                product_id=item.product_id,
+                product_name=item.product.name,
+                quantity=item.quantity,
+                price=item.price,
+                discount=item.discount,
+                line_total=item.line_total,
+            )
+            for item in items
+        ])
+        # Позиции удаляются каскадом вместе с заказами
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(orders)
+
+
+def _archive_message_batch(cutoff, batch_size):
+    with transaction.atomic():
+        contact_messages = list(messages_to_archive(cutoff).order_by('pk')[:batch_size])
+        if not contact_messages:
+            return 0
+        ArchivedContactMessage.objects.bulk_create([
+            ArchivedContactMessage(
+                id=message.pk,
+                name=message.name,
+                email=message.email,
+                phone=message.phone,
+                category=message.category,
+                subject=message.subject,
+                message=message.message,
+                status=message.status,
+                admin_notes=message.admin_notes,
+                created_at=message.created_at,
+                updated_at=message.updated_at,
+                resolved_at=message.resolved_at,
+            )
+            for message in contact_messages
+        ])
+        ContactMessage.objects.filter(pk__in=[message.pk for message in contact_messages]).delete()
+    return len(contact_messages)
+
+
+def _run_batches(archive_batch, cutoff, batch_size, pause):
+    total = 0
+    while archived := archive_batch(cutoff, batch_size):
+        total += archived
+        if archived < batch_size:
+            break
+        time.sleep(pause)
+    return total
+
+
+def archive_orders(days=None, batch_size=None, pause=None):
+    """Переносит в архив доставленные и отменённые заказы старше days дней"""
+    cutoff = timezone.now() - timedelta(days=days or _setting('ORDERS_AFTER_DAYS', 365))
+    total = _run_batches(
+        _archive_order_batch, cutoff,
+        batch_size or _setting('BATCH_SIZE', 500),
+        _setting('PAUSE', 0.1) if pause is None else pause,
+    )
+    logger.info(f"Перенесено в архив заказов: {total}")
+    return total
+
+
+def archive_messages(days=None, batch_size=None, pause=None):
+    """Переносит в архив решённые и закрытые обращения, не менявшиеся days дней"""
+    cutoff = timezone.now() - timedelta(days=days or _setting('MESSAGES_AFTER_DAYS', 180))
+    total = _run_batches(
+        _archive_message_batch, cutoff,
+        batch_size or _setting('BATCH_SIZE', 500),
+        _setting('PAUSE', 0.1) if pause is None else pause,
+    )
+    logger.info(f"Перенесено в архив обращений: {total}")
+    return total
@@ -0,0 +1,188 @@
+"""
+Асинхронные версии страниц каталога для запуска под ASGI (Store.asgi).
+
+Включаются настройкой ASYNC_CATALOG_VIEWS; шаблоны, контекст, фильтры и
+размеры страниц те же, что у views.py (appProducts.listings). Данные
+страниц берутся из того же кэша каталога, поэтому действует та же защита
+от лавины пересчётов: после истечения или сброса кэша часть страницы
+пересчитывает один процесс, остальные получают прежнее значение.
+
+Части страницы кэшируются под отдельными ключами (HOME_PARTS,
+product_parts, число объектов и строки списка), и при промахе кэша их
+запросы выполняются одновременно через gather_queries.
+Асинхронный ORM Django выполняет все запросы запроса по очереди в одном
+потоке, поэтому для параллельной выборки каждая часть уходит в поток общего
+пула со своим соединением к базе. Одиночные выборки (подкатегория) идут
+через асинхронный ORM.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import Http404
+from django.core.paginator import Page, Paginator
+from django.shortcuts import aget_object_or_404, render
+
+from .catalog_cache import (
+    HOME_PARTS, cache_key, catalog_tree, catalog_version, get_or_build, listing_count, listing_rows, page_number,
+    params_key, product_parts, requested_page,
+)
+from .counters import product_views
+from .listings import (
+    ALL_PRODUCTS_PER_PAGE, PRODUCT_LIST_PER_PAGE, all_products_filters, all_products_listing, all_products_params,
+    all_products_queryset, product_list_listing, product_list_queryset, search_results,
+)
+from .models import Category, Subcategory
+
+
+def _evaluate(query):
+    try:
+        return query() if callable(query) else list(query)
+    finally:
+        # Поток пула живёт дольше запроса: соединение закрываем по тем же правилам, что и в конце запроса
+        close_old_connections()
+
+
+async def gather_queries(**queries):
+    """
+    Выполняет независимые запросы одновременно и возвращает словарь результатов.
+
+    Значение — QuerySet (вычисляется в список) или функция без аргументов.
+    """
+    results = await asyncio.gather(
+        *(sync_to_async(_evaluate, thread_sensitive=False)(query) for query in queries.values())
+    )
+    return dict(zip(queries, results))
+
+
+async def listing_page(name, queryset, per_page, value, **queries):
+    """
+    Страница списка: число объектов, строки запрошенной страницы и queries
+    выбираются одновременно. Возвращает (страница, результаты queries).
+    """
+    results = await gather_queries(
+        count=functools.partial(listing_count, name, queryset),
+        rows=functools.partial(listing_rows, name, queryset, per_page, requested_page(value)),
+        **queries,
+    )
+    paginator = Paginator(queryset, per_page)
+    paginator.count = results.pop('count')
+    rows = results.pop('rows')
+    number = page_number(paginator, value)
+    if number != requested_page(value):
+        # Номер за пределами списка: строки исправленной страницы
+        rows = (await gather_queries(rows=functools.partial(listing_rows, name, queryset, per_page, number)))['rows']
+    return Page(rows, number, paginator), results
+
+
+async def _render(request, template_name, context):
+    # Контекст-процессоры обращаются к request.user и сессии синхронно
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def category_list(request):
+    """Главная страница каталога: категории и поиск по товарам"""
+    search_query = request.GET.get('search', '').strip()
+
+    if search_query:
+        results = await gather_queries(
+            categories=catalog_tree,
+            search_results=search_results(search_query),
+        )
+        return await _render(request, 'appProducts/category_list.html', {
+            'categories': results['categories'],
+            'search_query': search_query,
+            'search_results': results['search_results'],
+            'search_count': len(results['search_results']),
+        })
+
+    results = await gather_queries(categories=catalog_tree)
+    return await _render(request, 'appProducts/category_list.html', {
+        'categories': results['categories']
+    })
+
+
+async def all_products(request):
+    """Страница всех товаров: число товаров, строки страницы и фильтры выбираются одновременно"""
+    params = all_products_params(request.GET)
+    products = all_products_queryset(**params)
+    filters_key = params_key(category=params['category'], subcategory=params['subcategory'])
+
+    page_obj, results = await listing_page(
+        all_products_listing(params), products, ALL_PRODUCTS_PER_PAGE, request.GET.get('page'),
+        filters=functools.partial(
+            get_or_build,
+            cache_key('all_products_filters', filters_key),
+            functools.partial(all_products_filters, params['category'], params['subcategory']),
+        ),
+    )
+    return await _render(request, 'appProducts/all_products.html', {
+        'page_obj': page_obj,
+        'products': page_obj,
+        **results['filters'],
+        'current_category': params['category'],
+        'current_subcategory': params['subcategory'],
+        'current_sort': params['sort'],
+        'search_query': params['search'],
+        'in_stock_only': params['in_stock'],
+        'total_products': page_obj.paginator.count,
+    })
+
+
+async def subcategory_list(request, category_slug):
+    """Список подкатегорий: категория и её подкатегории выбираются одновременно"""
+    results = await gather_queries(
+        category=Category.objects.filter(slug=category_slug, is_active=True).first,
+        subcategories=Subcategory.objects.filter(
+            category__slug=category_slug, category__is_active=True, is_active=True
+        ),
+    )
+    if results['category'] is None:
+        raise Http404("Категория не найдена")
+    return await _render(request, 'appProducts/subcategory_list.html', {
+        'category': results['category'],
+        'subcategories': results['subcategories'],
+    })
+
+
+async def product_list(request, category_slug, subcategory_slug):
+    """Товары подкатегории: число товаров и строки страницы выбираются одновременно"""
+    subcategory = await aget_object_or_404(
+        Subcategory.objects.select_related('category'),
+        slug=subcategory_slug,
+        category__slug=category_slug,
+        category__is_active=True,
+        is_active=True,
+    )
+    tag = request.GET.get('tag')
+    sort = request.GET.get('sort', '')
+    products = product_list_queryset(subcategory, tag, sort)
+
+    page_obj, _ = await listing_page(
+        product_list_listing(subcategory, tag, sort), products, PRODUCT_LIST_PER_PAGE, request.GET.get('page')
+    )
+    return await _render(request, 'appProducts/product_list.html', {
+        'category': subcategory.category,
+        'subcategory': subcategory,
+        'page_obj': page_obj
+    })
+
+
+async def product_detail(request, category_slug, subcategory_slug, product_slug):
+    """Страница товара: товар, фотографии и похожие товары выбираются одновременно"""
+    page = await gather_queries(
+        **product_parts(category_slug, subcategory_slug, product_slug),
+        catalog_version=catalog_version,
+    )
+    if page['product'] is None:
+        raise Http404("No Product matches the given query.")
+    # Только счётчик в памяти: запись в базу делает фоновый поток
+    product_views.record(page['product'].id)
+
+    return await _render(request, 'appProducts/product_detail.html', page)
+
+
+async def home_view(request):
+    """Главная страница: новинки и категории выбираются одновременно"""
+    return await _render(request, 'home/home.html', await gather_queries(**HOME_PARTS))
@@ -0,0 +1,77 @@
+"""
+Фоновый сброс буферов, накопленных в памяти процесса
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_flushers = []
+
+
+def flush_all():
+    """
+    Последний сброс всех буферов процесса. Для процессов, которые завершаются
+    через os._exit (рабочие Store.prefork): обработчики atexit там не выполняются.
+    """
+    for flusher in list(_flushers):
+        flusher.flush_now()
+
+
+class BackgroundFlusher:
+    """
+    Вызывает flush() в фоновом потоке раз в interval секунд или по wakeup().
+
+    Поток запускается лениво при первом обращении и перезапускается в
+    дочернем процессе после fork. При завершении процесса выполняется
+    последний сброс, чтобы не потерять накопленные данные.
+    """
+
+    def __init__(self, flush, interval, name):
+        self._flush = flush
+        self.interval = interval
+        self.name = name
+        self._thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        atexit.register(self.flush_now)
+        _flushers.append(self)
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def wakeup(self):
+        """Попросить фоновый поток сбросить буфер, не дожидаясь интервала"""
+        self._wakeup.set()
+
+    def flush_now(self):
+        try:
+            self._flush()
+        except Exception:
+            logger.exception(f"Ошибка при сбросе буфера {self.name}")
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush_now()
+
+    def _reset_after_fork(self):
+        self._thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
@@ -0,0 +1,267 @@
+"""
+Бэкенд кэша Django в файле SQLite, общий для всех процессов на сервере.
+
+    CACHES = {'default': {
+        'BACKEND': 'appProducts.cache_backend.SQLiteCache',
+        'LOCATION': '/dev/shm/clean_store_cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'MAX_SIZE': 256 * 1024 * 1024},
+    }}
+
+Все рабочие процессы читают и пишут один файл (в /dev/shm он целиком
+в памяти), поэтому запись или сброс версии в кэше сразу видны всем.
+Файл работает в режиме WAL с mmap: чтения не ждут запись.
+
+Объём ограничен числом записей (MAX_ENTRIES) и суммарным размером значений
+в байтах (MAX_SIZE). Счётчики в таблице cache_stats ведут триггеры, а при
+превышении лимита удаляются сначала истёкшие, затем давно не читанные
+записи (LRU). Время последнего чтения обновляется не чаще раза в
+ACCESS_RESOLUTION секунд, чтобы чтения почти не писали в файл.
+
+Целые числа хранятся в столбце как есть, поэтому incr()/decr() — один
+атомарный UPDATE без блокировок на стороне Python.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+    CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires) WHERE expires IS NOT NULL;
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        entries INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO cache_stats (id, entries, bytes) VALUES (1, 0, 0);
+    CREATE TRIGGER IF NOT EXISTS cache_stats_insert AFTER INSERT ON cache BEGIN
+        UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS cache_stats_delete AFTER DELETE ON cache BEGIN
+        UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS cache_stats_update AFTER UPDATE OF size ON cache BEGIN
+        UPDATE cache_stats SET bytes = bytes + NEW.size - OLD.size WHERE id = 1;
+    END;
+"""
+
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    # Содержимое кэша можно потерять при сбое питания
+    'PRAGMA synchronous=OFF',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+]
+
+# Доля лимита, до которой чистится кэш при переполнении, чтобы не чистить на каждой записи
+CULL_TARGET = 0.9
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._max_size = int(options.get('MAX_SIZE', 256 * 1024 * 1024))
+        self._access_resolution = float(options.get('ACCESS_RESOLUTION', 5))
+        self._busy_timeout = int(float(options.get('BUSY_TIMEOUT', 5)) * 1000)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = set()
+
+    # Соединение: своё у каждого потока и у каждого процесса после fork
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=self._busy_timeout / 1000, isolation_level=None)
+        conn.execute(f'PRAGMA busy_timeout={self._busy_timeout}')
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with self._schema_lock:
+            if self._path not in self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready.add(self._path)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, func):
+        """Выполняет func(conn) в транзакции записи и чистит кэш при переполнении"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(conn)
+            self._cull_if_needed(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def _cull_if_needed(self, conn):
+        entries, size = conn.execute('SELECT entries, bytes FROM cache_stats WHERE id = 1').fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        conn.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        entries, size = conn.execute('SELECT entries, bytes FROM cache_stats WHERE id = 1').fetchone()
+        target_entries = int(self._max_entries * CULL_TARGET)
+        target_size = int(self._max_size * CULL_TARGET)
+        while entries > target_entries or size > target_size:
+            # Удаляем давно не читанные порциями: по числу записей точно, по размеру — по среднему размеру
+            excess_size = max(size - target_size, 0)
+            batch = max(entries - target_entries, -(-excess_size * entries // max(size, 1)), 1)
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)', (batch,)
+            )
+            entries, size = conn.execute('SELECT entries, bytes FROM cache_stats WHERE id = 1').fetchone()
+
+    # Сериализация: целые числа как есть (для атомарного incr), остальное — pickle
+    def _encode(self, value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value, 8
+        data = pickle.dumps(value, self.pickle_protocol)
+        return data, len(data)
+
+    def _decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _upsert(self, conn, key, value, timeout, only_if_missing=False):
+        data, size = self._encode(value)
+        now = time.time()
+        condition = 'WHERE cache.expires IS NOT NULL AND cache.expires <= excluded.accessed' if only_if_missing else ''
+        cursor = conn.execute(
+            'INSERT INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+            f'accessed = excluded.accessed, size = excluded.size {condition}',
+            (key, data, self._expires(timeout), now, size),
+        )
+        return cursor.rowcount > 0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(lambda conn: self._upsert(conn, key, value, timeout, only_if_missing=True))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(lambda conn: self._upsert(conn, key, value, timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = {self.make_and_validate_key(key, version=version): value for key, value in data.items()}
+
+        def write(conn):
+            for key, value in keys.items():
+                self._upsert(conn, key, value, timeout)
+
+        self._write(write)
+        return []
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._get_many([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_and_validate_key(key, version=version): key for key in keys}
+        found = self._get_many(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        conn = self._connection()
+        now = time.time()
+        rows = conn.execute(
+            f"SELECT key, value, expires, accessed FROM cache WHERE key IN ({', '.join('?' * len(keys))})",
+            keys,
+        ).fetchall()
+        found = {}
+        stale_access = []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            found[key] = self._decode(value)
+            if now - accessed > self._access_resolution:
+                stale_access.append(key)
+        if stale_access:
+            # Отметка для LRU без ожидания блокировки: если файл занят записью, пропускаем её
+            conn.execute('PRAGMA busy_timeout=0')
+            try:
+                conn.execute(
+                    f"UPDATE cache SET accessed = ? WHERE key IN ({', '.join('?' * len(stale_access))})",
+                    [now, *stale_access],
+                )
+            except sqlite3.OperationalError:
+                pass
+            finally:
+                conn.execute(f'PRAGMA busy_timeout={self._busy_timeout}')
+        return found
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(lambda conn: conn.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time()),
+        ).rowcount > 0)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._write(lambda conn: conn.execute(
+            "UPDATE cache SET value = value + ? "
+            "WHERE key = ? AND typeof(value) = 'integer' AND (expires IS NULL OR expires > ?) RETURNING value",
+            (delta, key, time.time()),
+        ).fetchone())
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(lambda conn: conn.execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._write(lambda conn: conn.execute(
+                f"DELETE FROM cache WHERE key IN ({', '.join('?' * len(keys))})", keys
+            ))
+
+    def clear(self):
+        self._write(lambda conn: conn.execute('DELETE FROM cache'))
+
+    def close(self, **kwargs):
+        # Соединение с файлом живёт столько же, сколько поток: открывать его на каждый запрос дорого
+        pass
+
+    def stats(self):
+        """Число записей и суммарный размер значений в байтах"""
+        entries, size = self._connection().execute(
+            'SELECT entries, bytes FROM cache_stats WHERE id = 1'
+        ).fetchone()
+        return {'entries': entries, 'bytes': size}
@@ -0,0 +1,240 @@
+"""
+Кэш каталога: дерево категорий, данные страниц и версия для фрагментов шаблонов.
+
+Записи хранятся под ключами без версии вместе с версией каталога, для
+которой построены (CATALOG_VERSION_KEY в общем кэше). Сигналы меняют версию
+после изменения категорий, подкатегорий, товаров и их фотографий, и все
+записи сразу становятся устаревшими. Остатки, просмотры и «похожие товары»
+обновляются в обход save(), поэтому данные страниц хранятся недолго
+(CATALOG_CACHE['PAGE_TIMEOUT']).
+
+get_or_build() защищает базу от лавины пересчётов, когда популярная
+страница истекла или каталог только что изменили:
+
+- пересчитывает только процесс, взявший блокировку ключа в общем кэше,
+  остальные в это время получают устаревшее значение (stale-while-revalidate)
+  или ждут до LOCK_WAIT секунд, если значения ещё нет;
+- устаревшее значение хранится ещё STALE_TIMEOUT секунд после срока;
+- незадолго до срока запись пересчитывается заранее с вероятностью, растущей
+  к сроку и к времени пересчёта (XFetch, EARLY_REFRESH_BETA), поэтому
+  популярные ключи обычно обновляются до истечения.
+"""
+import functools
+import hashlib
+import logging
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Prefetch
+from django.utils.http import urlencode
+
+from .models import Category, Product, ProductImage, Subcategory
+from .related import get_related_products
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, default)
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # add, а не set: версию мог только что записать другой процесс
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    """Делает устаревшими все записи кэша каталога во всех процессах"""
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def cache_key(*parts):
+    return ':'.join(['catalog', *map(str, parts)])
+
+
+def params_key(**params):
+    """Короткий ключ для набора параметров фильтрации"""
+    return hashlib.md5(urlencode(sorted(params.items())).encode()).hexdigest()
+
+
+def _fresh(entry, version, now, early=False):
+    """Запись построена для текущей версии и не истекла (early — с учётом XFetch)"""
+    if entry is None:
+        return False
+    built_for, _, expires, delta = entry
+    if built_for != version:
+        return False
+    if early:
+        # XFetch: -log(u) редко бывает большим, поэтому ранний пересчёт достаётся немногим запросам
+        now += delta * _setting('EARLY_REFRESH_BETA', 1.0) * -math.log(1.0 - random.random())
+    return now < expires
+
+
+def get_or_build(key, builder, timeout=None):
+    """
+    Значение из кэша или результат builder(); None тоже кэшируется.
+
+    Запись — (версия каталога, значение, срок, время пересчёта в секундах).
+    """
+    timeout = timeout or _setting('PAGE_TIMEOUT', 60)
+    version = catalog_version()
+    entry = cache.get(key)
+    if _fresh(entry, version, time.time(), early=True):
+        return entry[1]
+
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + _setting('LOCK_WAIT', 2.0)
+    while not cache.add(lock_key, 1, _setting('LOCK_TIMEOUT', 30)):
+        if entry is not None:
+            # Пересчитывает другой процесс: отдаём устаревшее значение
+            return entry[1]
+        if time.monotonic() >= deadline:
+            logger.warning(f"Кэш каталога: не дождались пересчёта {key}, считаем без блокировки")
+            return builder()
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if _fresh(entry, version, time.time()):
+            return entry[1]
+
+    try:
+        # Пока брали блокировку, значение мог пересчитать другой процесс
+        current = cache.get(key)
+        rebuilt = current is not None and (entry is None or current[2] > entry[2])
+        if rebuilt and _fresh(current, version, time.time()):
+            return current[1]
+        started = time.perf_counter()
+        value = builder()
+        delta = time.perf_counter() - started
+        cache.set(key, (version, value, time.time() + timeout, delta), timeout + _setting('STALE_TIMEOUT', 300))
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def catalog_tree():
+    """Активные категории с активными подкатегориями, по названию"""
+    return get_or_build(
+        cache_key('tree'),
+        lambda: list(
+            Category.objects.filter(is_active=True).prefetch_related(
+                Prefetch('subcategories', queryset=Subcategory.objects.filter(is_active=True))
+            ).order_by('title')
+        ),
+        _setting('TREE_TIMEOUT', 3600),
+    )
+
+
+def new_products():
+    return get_or_build(cache_key('home', 'new_products'), lambda: list(
+        Product.objects.filter(is_new=True, is_active=True)
+        .select_related('subcategory__category').prefetch_related('images')[:6]
+    ))
+
+
+def popular_categories():
+    return get_or_build(cache_key('home', 'popular_categories'), lambda: list(
+        Category.objects.filter(is_active=True).prefetch_related('subcategories')[:9]
+    ))
+
+
+# Части главной страницы: у каждой свой ключ, асинхронные представления выбирают их одновременно
+HOME_PARTS = {
+    'new_products': new_products,
+    'popular_categories': popular_categories,
+}
+
+
+def home_page():
+    """Новинки и категории для главной страницы"""
+    return {name: build() for name, build in HOME_PARTS.items()}
+
+
+def _product_filter(category_slug, subcategory_slug, product_slug, prefix=''):
+    return {
+        f'{prefix}slug': product_slug,
+        f'{prefix}subcategory__slug': subcategory_slug,
+        f'{prefix}subcategory__category__slug': category_slug,
+        f'{prefix}is_active': True,
+    }
+
+
+def product_parts(category_slug, subcategory_slug, product_slug):
+    """
+    Части страницы товара функциями без аргументов: {'product', 'extra_images',
+    'related_products'}. Каждая выбирает данные по slug сама и кэшируется под
+    своим ключом, поэтому части не ждут друг друга.
+    """
+    slugs = (category_slug, subcategory_slug, product_slug)
+    lookup = _product_filter(*slugs)
+
+    def product():
+        return Product.objects.select_related('subcategory__category').filter(**lookup).first()
+
+    def extra_images():
+        return list(ProductImage.objects.filter(**_product_filter(*slugs, prefix='product__')).order_by('pk'))
+
+    def related_products():
+        product = Product.objects.only('related_ids').filter(**lookup).first()
+        return get_related_products(product) if product is not None else []
+
+    return {
+        name: functools.partial(get_or_build, cache_key('product', name, *slugs), build)
+        for name, build in (
+            ('product', product), ('extra_images', extra_images), ('related_products', related_products)
+        )
+    }
+
+
+def product_page(category_slug, subcategory_slug, product_slug):
+    """Товар с фотографиями и похожими товарами или None, если товара нет"""
+    parts = product_parts(category_slug, subcategory_slug, product_slug)
+    product = parts.pop('product')()
+    if product is None:
+        return None
+    return {'product': product, **{name: build() for name, build in parts.items()}}
+
+
+def requested_page(value):
+    """Номер страницы из GET-параметра до того, как известно число объектов"""
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def page_number(paginator, value):
+    """Номер страницы по тем же правилам, что Paginator.get_page(), без выборки строк"""
+    try:
+        return paginator.validate_number(value)
+    except PageNotAnInteger:
+        return 1
+    except EmptyPage:
+        return paginator.num_pages
+
+
+def listing_count(name, queryset):
+    return get_or_build(cache_key(name, 'count'), queryset.count)
+
+
+def listing_rows(name, queryset, per_page, number):
+    bottom = (number - 1) * per_page
+    return get_or_build(cache_key(name, 'page', number), lambda: list(queryset[bottom:bottom + per_page]))
+
+
+def listing_page(name, queryset, per_page, value):
+    """Страница пагинатора: число объектов и строки страницы берутся из кэша"""
+    paginator = Paginator(queryset, per_page)
+    paginator.count = listing_count(name, queryset)
+    number = page_number(paginator, value)
+    return Page(listing_rows(name, queryset, per_page, number), number, paginator)
@@ -0,0 +1,149 @@
+"""
+Журнал изменений каталога (transactional outbox).
+
+Сигналы записывают CatalogChange в той же транзакции, что и изменение
+категории, подкатегории, товара или фотографии (save() и delete() этих
+моделей сами открывают transaction.atomic, см. models.AtomicSaveMixin):
+запись в журнале есть тогда и только тогда, когда изменение зафиксировано. Номер sequence —
+AUTOINCREMENT, а запись в SQLite идёт по одной транзакции, поэтому номера
+растут в порядке фиксации и не переиспользуются.
+
+Потребители (кэши, поиск, фасеты, фиды) читают журнал пачками от своей
+контрольной точки:
+
+    def handle(changes):
+        for entity, entity_id, operation in latest_changes(changes):
+            ...
+
+    tail('search_index', handle)
+
+Пачка и сдвиг контрольной точки подтверждаются после успешного handle(),
+поэтому доставка — «хотя бы один раз»: обработчик должен быть идемпотентным.
+Изменения в обход save() (остатки, просмотры, «похожие товары») в журнал
+не попадают; массовые обновления, которые должны дойти до потребителей
+(метки хитов), записывают журнал сами через record_updates().
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import CatalogChange, Category, Checkpoint, Product, ProductImage, Subcategory
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PREFIX = 'catalog_changes.'
+
+ENTITIES = {
+    Category: 'category',
+    Subcategory: 'subcategory',
+    Product: 'product',
+    ProductImage: 'product_image',
+}
+
+
+def _setting(name, default):
+    return getattr(settings, 'CATALOG_CHANGES', {}).get(name, default)
+
+
+def record_change(instance, operation):
+    """Добавляет запись в журнал; вызывается из сигналов внутри транзакции изменения"""
+    changes = [CatalogChange(entity=ENTITIES[type(instance)], entity_id=instance.pk, operation=operation)]
+    if isinstance(instance, ProductImage):
+        # Страница и фид товара зависят от его фотографий
+        changes.append(CatalogChange(entity='product', entity_id=instance.product_id, operation='update'))
+    CatalogChange.objects.bulk_create(changes)
+
+
+def record_updates(entity, ids):
+    """Записи об изменении объектов, обновлённых в обход save() (массовый UPDATE)"""
+    CatalogChange.objects.bulk_create(
+        [CatalogChange(entity=entity, entity_id=pk, operation='update') for pk in ids], batch_size=500
+    )
+
+
+def latest_sequence():
+    return CatalogChange.objects.aggregate(latest=Max('sequence'))['latest'] or 0
+
+
+def changes_after(position, limit=None):
+    """Записи журнала с номером больше position, по порядку"""
+    return list(CatalogChange.objects.filter(sequence__gt=position)[:limit or _setting('BATCH_SIZE', 500)])
+
+
+def latest_changes(changes):
+    """
+    Последняя операция по каждому объекту пачки: [(entity, entity_id, operation)].
+
+    Создание с последующими изменениями остаётся созданием, удаление
+    перекрывает всё, что было до него.
+    """
+    result = {}
+    for change in changes:
+        key = (change.entity, change.entity_id)
+        if result.get(key) == 'create' and change.operation == 'update':
+            continue
+        result[key] = change.operation
+    return [(entity, entity_id, operation) for (entity, entity_id), operation in result.items()]
+
+
+def checkpoint_position(consumer):
+    checkpoint = Checkpoint.objects.filter(name=CHECKPOINT_PREFIX + consumer).first()
+    return checkpoint.position if checkpoint else 0
+
+
+def tail(consumer, handler, batch_size=None, max_batches=None):
+    """
+    Передаёт handler(changes) новые записи журнала пачками и сдвигает
+    контрольную точку потребителя. Возвращает число обработанных записей.
+    """
+    checkpoint, _ = Checkpoint.objects.get_or_create(name=CHECKPOINT_PREFIX + consumer)
+    processed = batches = 0
+    while max_batches is None or batches < max_batches:
+        changes = changes_after(checkpoint.position, batch_size)
+        if not changes:
+            break
+        handler(changes)
+        checkpoint.position = changes[-1].sequence
+        checkpoint.save(update_fields=['position', 'updated_at'])
+        processed += len(changes)
+        batches += 1
+    return processed
+
+
+def follow(consumer, handler, interval=None, batch_size=None):
+    """Обрабатывает журнал непрерывно, опрашивая его раз в interval секунд"""
+    interval = _setting('POLL_INTERVAL', 0.5) if interval is None else interval
+    while True:
+        if not tail(consumer, handler, batch_size):
+            time.sleep(interval)
+
+
+def consumers():
+    """Контрольные точки потребителей журнала: {имя: позиция}"""
+    return {
+        checkpoint.name[len(CHECKPOINT_PREFIX):]: checkpoint.position
+        for checkpoint in Checkpoint.objects.filter(name__startswith=CHECKPOINT_PREFIX)
+    }
+
+
+def prune_changes(keep_days=None):
+    """
+    Удаляет записи старше keep_days дней, уже прочитанные всеми потребителями.
+
+    Последняя запись остаётся, чтобы latest_sequence() не сбрасывался в 0.
+    """
+    cutoff = timezone.now() - timedelta(days=_setting('KEEP_DAYS', 7) if keep_days is None else keep_days)
+    changes = CatalogChange.objects.filter(created_at__lt=cutoff, sequence__lt=latest_sequence())
+    slowest = Checkpoint.objects.filter(name__startswith=CHECKPOINT_PREFIX).aggregate(
+        slowest=Min('position')
+    )['slowest']
+    if slowest is not None:
+        changes = changes.filter(sequence__lte=slowest)
+    deleted, _ = changes.delete()
+    if deleted:
+        logger.info(f"Журнал изменений каталога: удалено {deleted} записей")
+    return deleted
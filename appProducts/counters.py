@@ -0,0 +1,56 @@
+"""
+Счётчики просмотров товаров с отложенной записью.
+
+Просмотр увеличивает счётчик в памяти процесса; фоновый поток раз в
+FLUSH_INTERVAL секунд записывает накопленное пакетом запросов
+UPDATE ... SET views_count = views_count + n, по одному на каждое
+различное n. Страница товара никогда не ждёт записи в базу.
+"""
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .buffering import BackgroundFlusher
+from .models import Product
+
+
+class ViewCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        interval = getattr(settings, 'PRODUCT_VIEWS', {}).get('FLUSH_INTERVAL', 10.0)
+        self._flusher = BackgroundFlusher(self.flush, interval, 'product-views')
+
+    def record(self, product_id):
+        with self._lock:
+            self._counts[product_id] += 1
+        self._flusher.ensure_started()
+
+    def flush(self):
+        """Записывает накопленные просмотры в базу"""
+        with self._lock:
+            if not self._counts:
+                return 0
+            counts, self._counts = self._counts, Counter()
+
+        by_increment = defaultdict(list)
+        for product_id, increment in counts.items():
+            by_increment[increment].append(product_id)
+        try:
+            with transaction.atomic():
+                for increment, product_ids in by_increment.items():
+                    Product.objects.filter(pk__in=product_ids).update(
+                        views_count=F('views_count') + increment
+                    )
+        except Exception:
+            # Не теряем просмотры: вернём их в буфер до следующей попытки
+            with self._lock:
+                self._counts.update(counts)
+            raise
+        return len(counts)
+
+
+product_views = ViewCounter()
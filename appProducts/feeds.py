@@ -0,0 +1,247 @@
+"""
+Фид товаров для маркетплейсов и агрегаторов цен: CSV, JSON Lines и YML.
+
+    /products/feed.csv    /products/feed.jsonl    /products/feed.yml
+    /products/feed.yml.gz?since=2026-10-01T00:00:00
+
+Товары читаются потоком по FEED['CHUNK_SIZE'] штук (iterator() с
+подгрузкой фотографий на каждую пачку) и сразу отдаются клиенту через
+StreamingHttpResponse, поэтому память не зависит от размера каталога.
+Суффикс .gz сжимает поток на лету.
+
+Фид отдаётся только с ?token=, совпадающим с FEED['TOKEN']; если токен не
+задан, фид по HTTP отключён (команда export_feed работает без токена).
+
+С параметром since фид содержит только товары, изменённые после этого
+момента. Скрытые товары и товары, удалённые после since (по журналу
+изменений каталога, appProducts.change_feed), попадают в него только как
+id и available=false, чтобы площадка сняла их с продажи. Списания
+остатков, правки остатка в админке и метки хитов сдвигают updated_at
+товара, поэтому наличие и is_hit доходят до площадки и в фиде с since.
+Журнал удалений хранится CATALOG_CHANGES['KEEP_DAYS'] дней: если since
+старше, нужен полный фид (команда export_feed).
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time as dt_time
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import CatalogChange, Category, Product, ProductImage, Subcategory
+from .sitemaps import url_template
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'yml': 'application/xml; charset=utf-8',
+}
+
+CSV_FIELDS = [
+    'id', 'name', 'url', 'category', 'subcategory', 'price', 'currency', 'available', 'stock',
+    'is_new', 'is_hit', 'is_sale', 'images', 'description', 'updated_at',
+]
+
+# В YML id категорий — числа: категориям верхнего уровня добавляется смещение,
+# чтобы они не совпадали с id подкатегорий
+YML_CATEGORY_OFFSET = 1_000_000
+
+# Сколько байт копить перед отправкой клиенту
+BUFFER_SIZE = 64 * 1024
+
+
+def _setting(name, default):
+    return getattr(settings, 'FEED', {}).get(name, default)
+
+
+def parse_since(value):
+    """Дата или дата со временем из параметра since; None, если формат неверный"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        moment = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _products(since=None):
+    products = Product.objects.select_related('subcategory__category').prefetch_related(
+        Prefetch('images', queryset=ProductImage.objects.only('product_id', 'image').order_by('pk'))
+    ).order_by('pk')
+    if since is None:
+        return products.filter(is_active=True, subcategory__is_active=True, subcategory__category__is_active=True)
+    return products.filter(Q(updated_at__gt=since) | Q(subcategory__updated_at__gt=since)
+                           | Q(subcategory__category__updated_at__gt=since))
+
+
+def _deleted_ids(since):
+    """id товаров, удалённых после since, по журналу изменений каталога"""
+    deleted = CatalogChange.objects.filter(
+        entity='product', operation='delete', created_at__gt=since
+    ).values_list('entity_id', flat=True).distinct().order_by('entity_id')
+    return deleted.exclude(entity_id__in=Product.objects.values('pk')).iterator()
+
+
+def feed_items(since=None):
+    """
+    Товары фида словарями, по одному, без загрузки всего каталога в память.
+
+    В изменениях с since скрытые и удалённые товары — {'id': ..., 'available': False}.
+    """
+    product_url = url_template('appProducts:product_detail', 3)
+    site_url = settings.SITE_URL.rstrip('/')
+    for product in _products(since).iterator(chunk_size=_setting('CHUNK_SIZE', 1000)):
+        subcategory = product.subcategory
+        category = subcategory.category
+        if not (product.is_active and subcategory.is_active and category.is_active):
+            # Скрытый товар: площадке достаточно снять его с продажи
+            yield {'id': product.pk, 'available': False}
+            continue
+        images = [product.main_image, *(image.image for image in product.images.all())]
+        yield {
+            'id': product.pk,
+            'name': product.name,
+            'url': product_url.format(category.slug, subcategory.slug, product.slug),
+            'category': category.title,
+            'category_id': category.pk,
+            'subcategory': subcategory.title,
+            'subcategory_id': subcategory.pk,
+            'price': str(product.price.amount),
+            'currency': str(product.price.currency),
+            'available': product.in_stock,
+            'stock': product.stock,
+            'is_new': product.is_new,
+            'is_hit': product.is_hit,
+            'is_sale': product.is_sale,
+            'images': [site_url + image.url for image in images if image],
+            'description': product.description or '',
+            'updated_at': product.updated_at.isoformat(),
+        }
+    if since is not None:
+        for pk in _deleted_ids(since):
+            yield {'id': pk, 'available': False}
+
+
+class _Line:
+    """Псевдофайл для csv.writer: writerow() возвращает готовую строку"""
+
+    def write(self, value):
+        return value
+
+
+def _csv(items):
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_FIELDS)
+    for item in items:
+        row = {**item, 'images': ' '.join(item.get('images', []))}
+        yield writer.writerow([row.get(field, '') for field in CSV_FIELDS])
+
+
+def _jsonl(items):
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+def _yml(items):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<yml_catalog date="{timezone.now().isoformat(timespec="minutes")}">\n<shop>\n'
+    yield f"<name>{escape(_setting('SHOP_NAME', 'Clean Store'))}</name>\n"
+    yield f"<company>{escape(_setting('COMPANY', 'Clean Store'))}</company>\n"
+    yield f'<url>{escape(settings.SITE_URL)}</url>\n<currencies>\n'
+    base_currency = _setting('CURRENCY', 'RUB')
+    for currency in Product.objects.order_by().values_list('price_currency', flat=True).distinct():
+        # Цены в других валютах площадка пересчитывает по курсу ЦБ
+        rate = '1' if currency == base_currency else 'CB'
+        yield f'<currency id={quoteattr(currency)} rate="{rate}"/>\n'
+    yield '</currencies>\n<categories>\n'
+    for pk, title in Category.objects.order_by('pk').values_list('pk', 'title').iterator():
+        yield f'<category id="{YML_CATEGORY_OFFSET + pk}">{escape(title)}</category>\n'
+    for pk, category_id, title in Subcategory.objects.order_by('pk').values_list(
+        'pk', 'category_id', 'title'
+    ).iterator():
+        yield f'<category id="{pk}" parentId="{YML_CATEGORY_OFFSET + category_id}">{escape(title)}</category>\n'
+    yield '</categories>\n<offers>\n'
+    for item in items:
+        if 'name' not in item:
+            yield f'<offer id="{item["id"]}" available="false"/>\n'
+            continue
+        pictures = ''.join(f'<picture>{escape(url)}</picture>' for url in item['images'])
+        labels = ''.join(
+            f'<param name="{name}">да</param>'
+            for flag, name in (('is_new', 'Новинка'), ('is_hit', 'Хит продаж'), ('is_sale', 'Распродажа'))
+            if item[flag]
+        )
+        stock = f"<count>{item['stock']}</count>" if item['stock'] is not None else ''
+        yield (
+            f'<offer id="{item["id"]}" available="{str(item["available"]).lower()}">'
+            f'<name>{escape(item["name"])}</name><url>{escape(item["url"])}</url>'
+            f'<price>{item["price"]}</price><currencyId>{item["currency"]}</currencyId>'
+            f'<categoryId>{item["subcategory_id"]}</categoryId>{pictures}{stock}{labels}'
+            f'<description>{escape(item["description"])}</description></offer>\n'
+        )
+    yield '</offers>\n</shop>\n</yml_catalog>\n'
+
+
+def _buffered(chunks):
+    """Склеивает мелкие строки в блоки по BUFFER_SIZE байт"""
+    buffer, size = [], 0
+    for chunk in chunks:
+        data = chunk.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 — формат gzip
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def render_feed(fmt, since=None, compress=False):
+    """Фид байтовыми блоками; fmt — csv, jsonl или yml"""
+    items = feed_items(since)
+    lines = _yml(items) if fmt == 'yml' else _csv(items) if fmt == 'csv' else _jsonl(items)
+    blocks = _buffered(lines)
+    return _gzipped(blocks) if compress else blocks
+
+
+def product_feed(request, fmt):
+    fmt, compress = (fmt[:-3], True) if fmt.endswith('.gz') else (fmt, False)
+    if fmt not in FORMATS:
+        raise Http404("Неизвестный формат фида")
+    token = _setting('TOKEN', '')
+    if not token:
+        return HttpResponseForbidden("Фид отключён: не задан FEED['TOKEN']")
+    if not constant_time_compare(request.GET.get('token', ''), token):
+        return HttpResponseForbidden("Неверный токен фида")
+    since = None
+    if request.GET.get('since'):
+        since = parse_since(request.GET['since'])
+        if since is None:
+            return HttpResponseBadRequest("Параметр since: дата или дата и время в формате ISO 8601")
+
+    filename = f"products{'-since-' + since.strftime('%Y%m%d%H%M%S') if since else ''}.{fmt}"
+    if compress:
+        response = StreamingHttpResponse(render_feed(fmt, since, compress=True), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(render_feed(fmt, since), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
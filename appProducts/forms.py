@@ -1,4 +1,6 @@
+import uuid
 from django import forms
+from django.core.validators import RegexValidator
 from .validators import phone_validator
 from .models import ContactMessage
 
@@ -39,6 +41,19 @@ class OrderForm(forms.Form):
         }), 
         label="Адрес доставки"
     )
+    # Повторная отправка той же формы (двойной клик, ретрай прокси)
+    # приходит с тем же ключом и не создаёт второй заказ
+    idempotency_key = forms.CharField(
+        max_length=64,
+        required=False,
+        validators=[RegexValidator(r'^[A-Za-z0-9_-]+$')],
+        widget=forms.HiddenInput()
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            self.initial.setdefault('idempotency_key', uuid.uuid4().hex)
 
 
 class ContactForm(forms.Form):
@@ -0,0 +1,228 @@
+"""
+Приём обращений с формы обратной связи с отложенной пакетной записью.
+
+Обращение сразу дописывается в спул-файл процесса (для сохранности при
+падении) и в буфер в памяти. Фоновый поток записывает буфер в базу одним
+bulk_create при накоплении BATCH_SIZE обращений или раз в FLUSH_INTERVAL
+секунд.
+
+Спул-файлы процесса называются contact-<pid>-<метка>-<поколение>.jsonl:
+случайная метка отличает процесс от прежнего владельца того же PID (PID
+переиспользуются после перезапуска рабочих и контейнеров). Пока процесс
+жив, он держит блокировку flock на файле contact-<pid>-<метка>.lock; её
+снимает ядро при любом завершении процесса. Спул-файлы процессов,
+завершившихся без сброса, дозаписываются при запуске приложения
+(recover_on_startup из Store.wsgi, Store.asgi и PREFORK_PRELOAD), при первом
+сбросе каждого процесса и командой flush_contact_intake.
+"""
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+from .buffering import BackgroundFlusher
+from .jobs import enqueue
+from .models import ContactMessage
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('name', 'email', 'phone', 'category', 'subject', 'message')
+
+
+def _setting(name, default):
+    return getattr(settings, 'CONTACT_INTAKE', {}).get(name, default)
+
+
+def is_enabled():
+    return _setting('ENABLED', False)
+
+
+def _spool_dir():
+    return str(_setting('SPOOL_DIR', settings.BASE_DIR / 'var' / 'contact_spool'))
+
+
+def _lock_path(owner):
+    return os.path.join(_spool_dir(), f"contact-{owner}.lock")
+
+
+def _read_spool(path):
+    records = []
+    with open(path, encoding='utf-8') as spool:
+        for line in spool:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Недописанная строка при аварийном завершении
+                logger.warning(f"Пропущена повреждённая запись в {path}")
+    return records
+
+
+def _save(records):
+    """Записывает пачку обращений одним запросом и ставит одно уведомление"""
+    if not records:
+        return
+    with transaction.atomic():
+        created = ContactMessage.objects.bulk_create(
+            [ContactMessage(**{field: record.get(field, '') for field in FIELDS}) for record in records]
+        )
+        enqueue('contact.notify_admins_batch', message_ids=[message.pk for message in created])
+    logger.info(f"Записано обращений из буфера: {len(created)}")
+
+
+class ContactIntake:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._spool = None
+        self._spool_path = None
+        self._generation = 0
+        self._owner = None
+        self._owner_lock = None
+        self._recovered = False
+        self._flusher = BackgroundFlusher(self.flush, _setting('FLUSH_INTERVAL', 2.0), 'contact-intake')
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def submit(self, data):
+        """Принимает очищенные данные ContactForm; запись в БД произойдёт позже"""
+        record = {field: data.get(field) or '' for field in FIELDS}
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._spool is None:
+                self._open_spool()
+            self._spool.write(line)
+            self._spool.flush()
+            self._buffer.append(record)
+            pending = len(self._buffer)
+        self._flusher.ensure_started()
+        if pending >= _setting('BATCH_SIZE', 50):
+            self._flusher.wakeup()
+
+    def flush(self):
+        """Сбрасывает буфер процесса в базу"""
+        if not self._recovered and self._owner is not None:
+            # Первый сброс процесса, принимающего обращения (рабочий мог быть перезапущен после падения)
+            self._recovered = True
+            recover_orphaned_spools(exclude=self._owner)
+        with self._lock:
+            if not self._buffer:
+                return 0
+            records, self._buffer = self._buffer, []
+            # Откладываем текущий спул: новые обращения пойдут в новый файл,
+            # а этот удалим только после успешной записи в базу
+            self._spool.close()
+            flushing_path = f"{self._spool_path}.flushing"
+            os.replace(self._spool_path, flushing_path)
+            self._spool = None
+        try:
+            _save(records)
+        except Exception:
+            # Возвращаем записи в буфер и текущий спул до следующей попытки
+            with self._lock:
+                self._buffer[:0] = records
+                if self._spool is None:
+                    self._open_spool()
+                self._spool.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+                self._spool.flush()
+            os.remove(flushing_path)
+            raise
+        os.remove(flushing_path)
+        return len(records)
+
+    def _open_spool(self):
+        os.makedirs(_spool_dir(), exist_ok=True)
+        if self._owner_lock is None:
+            # Блокировка создаётся до первого спул-файла и держится до завершения процесса
+            self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+            self._owner_lock = open(_lock_path(self._owner), 'w')
+            fcntl.flock(self._owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._spool_path = os.path.join(_spool_dir(), f"contact-{self._owner}-{self._next_generation()}.jsonl")
+        self._spool = open(self._spool_path, 'x', encoding='utf-8')
+
+    def _next_generation(self):
+        self._generation += 1
+        return self._generation
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._spool = None
+        self._spool_path = None
+        if self._owner_lock is not None:
+            # Иначе блокировка родителя переживёт его, пока жив дочерний процесс
+            self._owner_lock.close()
+        self._owner = None
+        self._owner_lock = None
+        self._recovered = False
+
+
+def recover_orphaned_spools(exclude=None):
+    """
+    Дозаписывает в базу спул-файлы процессов, которые завершились без сброса.
+
+    Процесс считается завершившимся, если его файл блокировки удаётся
+    захватить. Файлы живых процессов и процесса exclude не трогаются: ими
+    распоряжается сам процесс.
+    """
+    recovered = 0
+    for lock_path in sorted(glob.glob(os.path.join(_spool_dir(), 'contact-*.lock'))):
+        owner = os.path.basename(lock_path)[len('contact-'):-len('.lock')]
+        if owner == exclude:
+            continue
+        try:
+            lock = open(lock_path, 'r')
+        except FileNotFoundError:
+            # Файлы уже дозаписал другой процесс
+            continue
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            for path in sorted(glob.glob(os.path.join(_spool_dir(), f'contact-{owner}-*.jsonl*'))):
+                records = _read_spool(path)
+                _save(records)
+                os.remove(path)
+                recovered += len(records)
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+    return recovered
+
+
+def recover_on_startup():
+    """Дозаписывает спул-файлы завершившихся процессов при запуске приложения"""
+    if not is_enabled():
+        return 0
+    try:
+        recovered = recover_orphaned_spools(exclude=contact_intake._owner)
+    except Exception:
+        logger.exception("Не удалось дозаписать спул-файлы обращений при запуске")
+        return 0
+    if recovered:
+        logger.info(f"При запуске дозаписано обращений из спул-файлов: {recovered}")
+    return recovered
+
+
+def backlog_size():
+    """Количество обращений, ещё не записанных в базу, по всем процессам хоста"""
+    total = 0
+    for path in glob.glob(os.path.join(_spool_dir(), 'contact-*.jsonl*')):
+        try:
+            with open(path, 'rb') as spool:
+                total += sum(1 for line in spool if line.strip())
+        except FileNotFoundError:
+            continue
+    return total
+
+
+contact_intake = ContactIntake()
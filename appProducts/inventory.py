@@ -0,0 +1,69 @@
+"""
+Учёт остатков и резервирование товара при оформлении заказа
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest, Now
+
+from .models import Product
+
+
+class InsufficientStock(ValidationError):
+    """Недостаточно товара на складе для резервирования"""
+
+    def __init__(self, product_id, requested):
+        self.product_id = product_id
+        self.requested = requested
+        super().__init__(
+            f"Недостаточно товара на складе (товар #{product_id}, запрошено: {requested})"
+        )
+
+
+def reserve_stock(lines):
+    """
+    Резервирует товар под заказ условными декрементами.
+
+    lines — итерируемое из пар (product_id, quantity). Каждая строка списывается
+    одним запросом UPDATE ... SET stock = stock - n WHERE stock >= n, поэтому
+    остаток не уходит в минус даже при сотнях одновременных оформлений.
+    Строки обрабатываются в порядке возрастания id товара, чтобы параллельные
+    заказы захватывали блокировки в одном порядке и не взаимоблокировались.
+    Если хотя бы одна строка не прошла, выбрасывается InsufficientStock и
+    транзакция откатывает уже выполненные списания.
+    Товары с пустым остатком (не учитывается) не ограничиваются.
+    Списание сдвигает updated_at: по нему фид с since узнаёт о смене наличия.
+    """
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+
+    with transaction.atomic():
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            updated = Product.objects.filter(
+                Q(stock__isnull=True) | Q(stock__gte=quantity),
+                pk=product_id,
+                is_active=True,
+            ).update(stock=F('stock') - quantity, updated_at=Now())
+            if not updated:
+                raise InsufficientStock(product_id, quantity)
+
+
+
+def apply_stock_edit(product_id, loaded, new):
+    """
+    Применяет правку остатка из админки как изменение на (new - loaded).
+
+    Между открытием формы и сохранением оформления могли списать товар:
+    запись значения из формы вернула бы эти списания и открыла перепродажу.
+    Включение или отключение учёта (пустой остаток) записывается как есть.
+    Остаток не уходит ниже нуля.
+    """
+    if loaded is None or new is None:
+        stock = new
+    else:
+        stock = Greatest(F('stock') + (new - loaded), 0)
+    Product.objects.filter(pk=product_id).update(stock=stock, updated_at=Now())
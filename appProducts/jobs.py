@@ -0,0 +1,124 @@
+"""
+Фоновые задачи на основе таблицы в базе данных.
+
+Задачи регистрируются декоратором @task и ставятся в очередь через enqueue():
+строка Job вставляется в текущей транзакции вместе с данными, к которым
+относится задача (заказом, обращением), и фиксируется или откатывается
+вместе с ними. Обработчик запроса отвечает сразу, а медленная работа
+(письма, уведомления) выполняется командой run_jobs.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def _setting(name, default):
+    return getattr(settings, 'JOB_QUEUE', {}).get(name, default)
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с указанным именем"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=None, max_attempts=None, **payload):
+    """
+    Ставит задачу в очередь в текущей транзакции.
+
+    Воркеры не видят строку до фиксации, а при откате она исчезает вместе
+    с транзакцией. Вне транзакции строка создаётся сразу.
+    """
+    if name not in _registry:
+        raise KeyError(f"Неизвестная фоновая задача: {name}")
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        run_after=timezone.now() + (delay or timedelta()),
+        max_attempts=max_attempts or _setting('MAX_ATTEMPTS', 5),
+    )
+
+
+def backoff_delay(attempts):
+    """Экспоненциальная задержка перед повтором с небольшим случайным разбросом"""
+    base = _setting('BACKOFF_BASE', 10)
+    cap = _setting('BACKOFF_MAX', 3600)
+    delay = min(base * 2 ** (attempts - 1), cap)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_jobs(limit):
+    """
+    Забирает до limit готовых к выполнению задач.
+
+    SQLite не поддерживает SELECT ... FOR UPDATE SKIP LOCKED, поэтому задача
+    захватывается условным UPDATE: из нескольких воркеров его выполнит только один.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status='queued', run_after__lte=now
+    ).order_by('run_after').values_list('id', flat=True)[:limit]
+    claimed = []
+    for job_id in candidates:
+        updated = Job.objects.filter(pk=job_id, status='queued').update(
+            status='running', locked_at=now, attempts=F('attempts') + 1
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def requeue_stale(timeout):
+    """Возвращает в очередь задачи, зависшие у упавшего воркера"""
+    return Job.objects.filter(
+        status='running', locked_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status='queued', locked_at=None)
+
+
+def run_job(job_id):
+    """Выполняет одну захваченную задачу и фиксирует результат"""
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        func = _registry.get(job.name)
+        try:
+            if func is None:
+                raise KeyError(f"Неизвестная фоновая задача: {job.name}")
+            func(**job.payload)
+        except Exception as e:
+            error = traceback.format_exc()
+            if job.attempts >= job.max_attempts:
+                Job.objects.filter(pk=job.pk).update(
+                    status='dead', locked_at=None, last_error=error, updated_at=timezone.now()
+                )
+                logger.error(f"Задача {job.name} #{job.pk} не выполнена после {job.attempts} попыток: {e}")
+            else:
+                Job.objects.filter(pk=job.pk).update(
+                    status='queued',
+                    locked_at=None,
+                    last_error=error,
+                    run_after=timezone.now() + backoff_delay(job.attempts),
+                    updated_at=timezone.now(),
+                )
+                logger.warning(f"Задача {job.name} #{job.pk} завершилась ошибкой, повтор позже: {e}")
+            return False
+        Job.objects.filter(pk=job.pk).update(
+            status='done', locked_at=None, last_error='', updated_at=timezone.now()
+        )
+        return True
+    finally:
+        close_old_connections()
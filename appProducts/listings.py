@@ -0,0 +1,120 @@
+"""
+Списки товаров каталога, общие для views.py и async_views.py: параметры,
+фильтры, сортировки, размеры страниц и имена списков в кэше каталога.
+"""
+from django.db.models import Q
+
+from .catalog_cache import params_key
+from .models import Category, Product, Subcategory
+from .rankings import BestsellerListing
+
+# Товаров на странице всех товаров (all_products) и подкатегории (product_list)
+ALL_PRODUCTS_PER_PAGE = 24
+PRODUCT_LIST_PER_PAGE = 12
+SEARCH_RESULTS_LIMIT = 20
+
+SORT_OPTIONS = {
+    'name': 'name',
+    'price_asc': 'price',
+    'price_desc': '-price',
+    'newest': '-created_at',
+    'popular': '-views_count',
+}
+
+
+def search_results(search_query):
+    """Товары для поиска на странице каталога"""
+    return Product.objects.filter(
+        name__icontains=search_query,
+        is_active=True
+    ).select_related('subcategory__category').prefetch_related('images')[:SEARCH_RESULTS_LIMIT]
+
+
+def all_products_params(query):
+    """Фильтры и сортировка страницы всех товаров из GET-параметров"""
+    return {
+        'category': query.get('category', ''),
+        'subcategory': query.get('subcategory', ''),
+        'sort': query.get('sort', 'name'),
+        'search': query.get('search', '').strip(),
+        'in_stock': query.get('in_stock') == '1',
+    }
+
+
+def all_products_listing(params):
+    """Имя списка всех товаров в кэше каталога"""
+    return f'all_products:{params_key(**params)}'
+
+
+def all_products_queryset(category, subcategory, sort, search, in_stock):
+    products = Product.objects.filter(is_active=True).select_related(
+        'subcategory__category'
+    ).prefetch_related('images')
+
+    if search:
+        products = products.filter(name__icontains=search)
+    if category:
+        products = products.filter(subcategory__category__slug=category)
+    if subcategory:
+        products = products.filter(subcategory__slug=subcategory)
+    if in_stock:
+        # Индекс (is_active, stock) покрывает оба условия
+        products = products.filter(Q(stock__isnull=True) | Q(stock__gt=0))
+
+    if sort == 'bestsellers':
+        if subcategory:
+            return BestsellerListing(products, subcategory__slug=subcategory)
+        if category:
+            return BestsellerListing(products, category__slug=category)
+        return BestsellerListing(products)
+    return products.order_by(SORT_OPTIONS.get(sort, 'name'))
+
+
+def all_products_filters(category_filter, subcategory_filter):
+    """Категории и подкатегории для фильтров all_products и названия выбранных"""
+    categories = Category.objects.filter(is_active=True).order_by('title')
+    subcategories = Subcategory.objects.filter(is_active=True).order_by('title')
+
+    # Если выбрана категория, показываем только её подкатегории
+    if category_filter:
+        subcategories = subcategories.filter(category__slug=category_filter)
+
+    # Названия выбранных фильтров для отображения
+    current_category_name = None
+    current_subcategory_name = None
+    if category_filter:
+        current_category_name = categories.filter(slug=category_filter).values_list('title', flat=True).first()
+    if subcategory_filter:
+        current_subcategory_name = subcategories.filter(
+            slug=subcategory_filter
+        ).values_list('title', flat=True).first()
+
+    return {
+        'categories': list(categories),
+        'subcategories': list(subcategories),
+        'current_category_name': current_category_name,
+        'current_subcategory_name': current_subcategory_name,
+    }
+
+
+def product_list_listing(subcategory, tag, sort):
+    """Имя списка товаров подкатегории в кэше каталога"""
+    return f'product_list:{subcategory.id}:{params_key(tag=tag or "", sort=sort or "")}'
+
+
+def product_list_queryset(subcategory, tag, sort):
+    products = Product.objects.filter(
+        subcategory=subcategory,
+        is_active=True
+    ).select_related('subcategory__category').prefetch_related('images')
+
+    if tag == 'new':
+        products = products.filter(is_new=True)
+    elif tag == 'hit':
+        products = products.filter(is_hit=True)
+    elif tag == 'sale':
+        products = products.filter(is_sale=True)
+
+    if tag == 'hit' or sort == 'bestsellers':
+        return BestsellerListing(products, subcategory=subcategory)
+    return products
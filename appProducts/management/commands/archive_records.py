@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from appProducts.archive import archive_messages, archive_orders, messages_to_archive, orders_to_archive
+
+
+class Command(BaseCommand):
+    help = "Переносит старые завершённые заказы и закрытые обращения в архив"
+
+    def add_arguments(self, parser):
+        archive_settings = getattr(settings, 'ARCHIVE', {})
+        parser.add_argument('--orders-days', type=int, default=archive_settings.get('ORDERS_AFTER_DAYS', 365),
+                            help='Архивировать заказы старше стольких дней')
+        parser.add_argument('--messages-days', type=int, default=archive_settings.get('MESSAGES_AFTER_DAYS', 180),
+                            help='Архивировать обращения, не менявшиеся столько дней')
+        parser.add_argument('--batch-size', type=int, default=archive_settings.get('BATCH_SIZE', 500),
+                            help='Записей в одной транзакции')
+        parser.add_argument('--pause', type=float, default=archive_settings.get('PAUSE', 0.1),
+                            help='Пауза между пачками, с')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, что будет перенесено')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='После переноса сжать файл базы SQLite (блокирует базу на время работы)')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            now = timezone.now()
+            orders = orders_to_archive(now - timedelta(days=options['orders_days'])).count()
+            contact_messages = messages_to_archive(now - timedelta(days=options['messages_days'])).count()
+            self.stdout.write(f"Будет перенесено заказов: {orders}, обращений: {contact_messages}")
+            return
+
+        orders = archive_orders(options['orders_days'], options['batch_size'], options['pause'])
+        self.stdout.write(f"Перенесено заказов: {orders}")
+        contact_messages = archive_messages(options['messages_days'], options['batch_size'], options['pause'])
+        self.stdout.write(f"Перенесено обращений: {contact_messages}")
+
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write("Файл базы сжат")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appProducts.related import build_related_products
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает блок «Похожие товары» по совместным покупкам и цене"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int,
+                            default=getattr(settings, 'RELATED_PRODUCTS', {}).get('LIMIT', 8),
+                            help='Сколько похожих товаров хранить для каждого товара')
+
+    def handle(self, *args, **options):
+        total, changed = build_related_products(options['limit'])
+        self.stdout.write(f"Товаров: {total}, обновлено: {changed}")
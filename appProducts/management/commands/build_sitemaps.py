@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appProducts.sitemaps import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = "Обновляет файлы карты сайта, подпись которых изменилась"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Перезаписать все разделы')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        sections, written = build_sitemaps(force=options['force'])
+        self.stdout.write(
+            f"Разделов: {sections}, перезаписано: {written}, {time.perf_counter() - started:.2f} с"
+        )
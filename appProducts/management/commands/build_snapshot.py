@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appProducts.snapshot import Snapshot, brotli, build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Строит статическую копию страниц каталога или обновляет её по журналу изменений"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Перерисовать все страницы')
+        parser.add_argument('--workers', type=int, help='Процессов отрисовки (SNAPSHOT[\'WORKERS\'])')
+        parser.add_argument('--output', help='Каталог копии (SNAPSHOT[\'ROOT\'])')
+        parser.add_argument('--follow', action='store_true',
+                            help='Не завершаться: обновлять копию, как только в журнале появятся изменения')
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stdout.write("Пакет brotli не установлен: сжатые копии только .gz")
+        stats = build_snapshot(options['output'], options['workers'], options['full'])
+        changes = 'полная сборка' if stats['changes'] is None else stats['changes']
+        self.stdout.write(
+            f"Страниц: {stats['pages']}, записано файлов: {stats['files_written']}, "
+            f"удалено: {stats['files_removed']}, изменений журнала: {changes}, {stats['seconds']:.2f} с"
+        )
+        if not options['follow']:
+            return
+
+        snapshot = Snapshot(options['output'], options['workers'])
+        interval = getattr(settings, 'CATALOG_CHANGES', {}).get('POLL_INTERVAL', 0.5)
+        while True:
+            written, removed = snapshot.stats['files_written'], snapshot.stats['files_removed']
+            changes = snapshot.update()
+            if changes:
+                self.stdout.write(
+                    f"Изменений журнала: {changes}, записано файлов: {snapshot.stats['files_written'] - written}, "
+                    f"удалено: {snapshot.stats['files_removed'] - removed}"
+                )
+            else:
+                time.sleep(interval)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from appProducts.change_feed import consumers, latest_sequence, prune_changes
+
+
+class Command(BaseCommand):
+    help = "Состояние журнала изменений каталога и очистка прочитанных записей"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help='Удалить старые записи, прочитанные всеми потребителями')
+        parser.add_argument('--keep-days', type=int, help='Сколько дней хранить записи (CATALOG_CHANGES)')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = prune_changes(options['keep_days'])
+            self.stdout.write(f"Удалено записей журнала: {deleted}")
+
+        latest = latest_sequence()
+        self.stdout.write(f"Последняя запись журнала: {latest}")
+        for name, position in sorted(consumers().items()):
+            self.stdout.write(f"  {name:<30} позиция {position:>10}, отставание {latest - position}")
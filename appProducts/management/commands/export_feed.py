@@ -0,0 +1,36 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appProducts.feeds import FORMATS, parse_since, render_feed
+
+
+class Command(BaseCommand):
+    help = "Выгружает фид товаров для маркетплейсов в файл или в stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='yml', help='Формат фида')
+        parser.add_argument('--since', help='Только товары, изменённые после даты (ISO 8601)')
+        parser.add_argument('--output', default='-', help='Файл фида; - — stdout')
+        parser.add_argument('--gzip', action='store_true', help='Сжать фид gzip')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_since(options['since'])
+            if since is None:
+                raise CommandError("--since: дата или дата и время в формате ISO 8601")
+
+        started = time.perf_counter()
+        size = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for block in render_feed(options['format'], since, compress=options['gzip']):
+                output.write(block)
+                size += len(block)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        if options['output'] != '-':
+            self.stdout.write(f"Записано {size / 1024:.1f} КБ за {time.perf_counter() - started:.2f} с")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from appProducts.intake import backlog_size, recover_orphaned_spools
+
+
+class Command(BaseCommand):
+    help = "Записывает в базу обращения из спул-файлов завершившихся процессов"
+
+    def handle(self, *args, **options):
+        recovered = recover_orphaned_spools()
+        self.stdout.write(f"Записано обращений: {recovered}")
+        self.stdout.write(f"Ожидают записи в работающих процессах: {backlog_size()}")
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appProducts.analytics import rebuild_rollups
+from appProducts.models import ArchivedOrder, Order
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Неверная дата «{value}», ожидается ГГГГ-ММ-ДД")
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает дневные сводки продаж за период"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Первый день периода, ГГГГ-ММ-ДД (по умолчанию — первый заказ)')
+        parser.add_argument('--to', dest='date_to', help='Последний день периода, ГГГГ-ММ-ДД (по умолчанию — сегодня)')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Сколько дней пересчитывать одной транзакцией')
+
+    def handle(self, *args, **options):
+        date_to = _parse_date(options['date_to']) if options['date_to'] else timezone.localdate()
+        if options['date_from']:
+            date_from = _parse_date(options['date_from'])
+        else:
+            first_orders = [
+                model.objects.order_by('created_at').values_list('created_at', flat=True).first()
+                for model in (Order, ArchivedOrder)
+            ]
+            first_orders = [created_at for created_at in first_orders if created_at is not None]
+            if not first_orders:
+                self.stdout.write("Заказов нет")
+                return
+            date_from = timezone.localdate(min(first_orders))
+        if date_from > date_to:
+            raise CommandError("Начало периода позже его конца")
+
+        chunk = timedelta(days=options['chunk_days'])
+        start = date_from
+        while start <= date_to:
+            end = min(start + chunk - timedelta(days=1), date_to)
+            orders, products = rebuild_rollups(start, end)
+            self.stdout.write(f"{start} — {end}: строк по статусам {orders}, по товарам {products}")
+            start = end + timedelta(days=1)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from appProducts.jobs import enqueue
+from appProducts.rankings import refresh_sales_stats
+
+
+class Command(BaseCommand):
+    help = "Обновляет рейтинг продаж товаров за 7/30/90 дней"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue', action='store_true',
+                            help='Поставить пересчёт в очередь фоновых задач вместо выполнения')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            enqueue('sales.refresh_stats')
+            self.stdout.write("Пересчёт рейтинга поставлен в очередь")
+            return
+        ingested, ranked, hits = refresh_sales_stats()
+        self.stdout.write(f"Обработано новых заказов: {ingested}")
+        self.stdout.write(f"Товаров в рейтинге: {ranked}")
+        if hits:
+            self.stdout.write(f"Отмечено хитов продаж: {hits}")
@@ -0,0 +1,67 @@
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from appProducts.jobs import claim_jobs, requeue_stale, run_job
+
+
+def _init_process_worker():
+    """Инициализация дочернего процесса: свой Django и свои соединения с БД"""
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Выполняет фоновые задачи из очереди"
+
+    def add_arguments(self, parser):
+        queue_settings = getattr(settings, 'JOB_QUEUE', {})
+        parser.add_argument('--workers', type=int, default=queue_settings.get('WORKERS', 4),
+                            help='Размер пула исполнителей')
+        parser.add_argument('--mode', choices=['thread', 'process'], default=queue_settings.get('MODE', 'thread'),
+                            help='Пул потоков или процессов')
+        parser.add_argument('--poll-interval', type=float, default=queue_settings.get('POLL_INTERVAL', 1.0),
+                            help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--stale-timeout', type=int, default=queue_settings.get('STALE_TIMEOUT', 600),
+                            help='Через сколько секунд зависшая задача возвращается в очередь')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        self.stopping = False
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+
+        if options['mode'] == 'process':
+            # Дочерние процессы не должны наследовать открытые соединения
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.stdout.write(f"Обработчик задач запущен: {workers} × {options['mode']}")
+        done = failed = 0
+        with executor:
+            while not self.stopping:
+                requeue_stale(options['stale_timeout'])
+                job_ids = claim_jobs(workers * 2)
+                if not job_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                for ok in executor.map(run_job, job_ids):
+                    if ok:
+                        done += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(f"Выполнено задач: {done}, с ошибкой: {failed}")
+
+    def _stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = """
+    CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, stock INTEGER, price NUMERIC);
+    CREATE TABLE orders (id INTEGER PRIMARY KEY, created_at REAL, total NUMERIC);
+    CREATE TABLE order_item (id INTEGER PRIMARY KEY, order_id INTEGER, product_id INTEGER, quantity INTEGER);
+    CREATE INDEX order_item_order ON order_item (order_id);
+"""
+PRODUCTS = 500
+
+
+def _profiles():
+    """Исходная конфигурация Django по умолчанию и текущая из settings.DATABASES"""
+    options = settings.DATABASES['default'].get('OPTIONS', {})
+    return {
+        'default': {'pragmas': [], 'begin': 'BEGIN', 'timeout': 5.0},
+        'production': {
+            'pragmas': [command.strip() for command in options.get('init_command', '').split(';') if command.strip()],
+            'begin': f"BEGIN {options['transaction_mode']}" if options.get('transaction_mode') else 'BEGIN',
+            'timeout': float(options.get('timeout', 5.0)),
+        },
+    }
+
+
+def _connect(path, profile):
+    conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    for pragma in profile['pragmas']:
+        conn.execute(pragma)
+    return conn
+
+
+def _writer(path, profile, deadline, queue):
+    """Оформление заказа: чтение остатка, списание, заказ и три позиции"""
+    conn = _connect(path, profile)
+    commits = errors = 0
+    latencies = []
+    n = 0
+    while time.time() < deadline:
+        n += 1
+        product_ids = [(os.getpid() * 7 + n * k) % PRODUCTS + 1 for k in (1, 2, 3)]
+        started = time.perf_counter()
+        try:
+            conn.execute(profile['begin'])
+            for product_id in product_ids:
+                conn.execute('SELECT stock, price FROM product WHERE id = ?', (product_id,)).fetchone()
+                conn.execute('UPDATE product SET stock = stock - 1 WHERE id = ?', (product_id,))
+            order_id = conn.execute('INSERT INTO orders (created_at, total) VALUES (?, ?)', (time.time(), 300)).lastrowid
+            conn.executemany(
+                'INSERT INTO order_item (order_id, product_id, quantity) VALUES (?, ?, 1)',
+                [(order_id, product_id) for product_id in product_ids],
+            )
+            conn.execute('COMMIT')
+            commits += 1
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+    queue.put(('writer', commits, errors, latencies))
+
+
+def _reader(path, profile, deadline, queue):
+    """Просмотр каталога: постраничная выборка товаров"""
+    conn = _connect(path, profile)
+    reads = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute('SELECT id, name, stock, price FROM product ORDER BY name LIMIT 24 OFFSET ?', (reads % 400,)).fetchall()
+            reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    queue.put(('reader', reads, errors, []))
+
+
+class Command(BaseCommand):
+    help = "Сравнивает пропускную способность записи SQLite с настройками по умолчанию и рабочими"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Процессов, оформляющих заказы')
+        parser.add_argument('--readers', type=int, default=4, help='Процессов, читающих каталог')
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность каждого прогона, с')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Писателей: {options['writers']}, читателей: {options['readers']}, "
+            f"по {options['duration']} с на профиль"
+        )
+        for name, profile in _profiles().items():
+            with tempfile.TemporaryDirectory() as tmp:
+                result = self._run(os.path.join(tmp, 'bench.sqlite3'), profile, options)
+            self.stdout.write(
+                f"{name:>10}: {result['commits']:>6} заказов, {result['commits'] / options['duration']:>8.1f} в с, "
+                f"ошибок блокировки {result['errors']:>5}, чтений {result['reads']:>7}, "
+                f"задержка p50 {result['p50'] * 1000:.1f} мс, p99 {result['p99'] * 1000:.1f} мс"
+            )
+
+    def _run(self, path, profile, options):
+        conn = _connect(path, profile)
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            'INSERT INTO product (id, name, stock, price) VALUES (?, ?, ?, ?)',
+            [(i, f'Товар {i}', 1_000_000, 100 + i) for i in range(1, PRODUCTS + 1)],
+        )
+        conn.close()
+
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        deadline = time.time() + options['duration']
+        workers = [
+            context.Process(target=_writer, args=(path, profile, deadline, queue)) for _ in range(options['writers'])
+        ] + [
+            context.Process(target=_reader, args=(path, profile, deadline, queue)) for _ in range(options['readers'])
+        ]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        latencies = sorted(latency for _, _, _, worker_latencies in results for latency in worker_latencies)
+        return {
+            'commits': sum(count for kind, count, _, _ in results if kind == 'writer'),
+            'reads': sum(count for kind, count, _, _ in results if kind == 'reader'),
+            'errors': sum(errors for _, _, errors, _ in results),
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p99': latencies[int(len(latencies) * 0.99)] if latencies else 0,
+        }
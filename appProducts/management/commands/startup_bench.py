@@ -0,0 +1,105 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ['Store.settings', 'Store.settings_storefront']
+
+# Запуск рабочего процесса: то же, что делает Store.prefork.preload()
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+from Store.prefork import preload
+_, templates = preload()
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'startup': elapsed,
+    'modules': len(sys.modules),
+    'templates': templates,
+    'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def _package_times(stderr):
+    """Собственное время импорта, сгруппированное по пакету верхнего уровня, в мс"""
+    totals = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            package = match.group(4).split('.')[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1)) / 1000
+    return totals
+
+
+class Command(BaseCommand):
+    help = "Сравнивает время запуска и импорта рабочего процесса для профилей настроек"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', help='Модуль настроек (по умолчанию полный и витрина)')
+        parser.add_argument('--runs', type=int, default=5, help='Запусков каждого профиля, берётся медиана')
+        parser.add_argument('--top', type=int, default=10, help='Сколько самых тяжёлых пакетов показать')
+        parser.add_argument('--max-startup-ms', type=float,
+                            help='Ошибка, если медиана запуска какого-либо профиля больше (для CI)')
+
+    def handle(self, *args, **options):
+        profiles = options['profile'] or PROFILES
+        samples = {profile: [] for profile in profiles}
+        # Профили запускаются по очереди, чтобы фоновая нагрузка одинаково влияла на все
+        for _ in range(options['runs']):
+            for profile in profiles:
+                samples[profile].append(self._run(profile))
+        results = {profile: self._median(profile_samples) for profile, profile_samples in samples.items()}
+
+        self.stdout.write(
+            f"{'профиль':>28} {'запуск':>9} {'импорт':>9} {'модулей':>8} {'шаблонов':>9} {'RSS':>9}"
+        )
+        for profile, result in results.items():
+            self.stdout.write(
+                f"{profile:>28} {result['startup'] * 1000:>7.0f}мс {sum(result['packages'].values()):>7.0f}мс "
+                f"{result['modules']:>8} {result['templates']:>9} {result['maxrss'] / 1024:>7.1f}МБ"
+            )
+
+        for profile, result in results.items():
+            self.stdout.write(f"\nСамые тяжёлые пакеты, {profile}:")
+            heaviest = sorted(result['packages'].items(), key=lambda item: item[1], reverse=True)
+            for package, ms in heaviest[:options['top']]:
+                self.stdout.write(f"  {package:<30} {ms:>7.1f} мс")
+
+        limit = options['max_startup_ms']
+        if limit is not None:
+            slow = [profile for profile, result in results.items() if result['startup'] * 1000 > limit]
+            if slow:
+                raise CommandError(f"Запуск дольше {limit:.0f} мс: {', '.join(slow)}")
+
+    def _run(self, profile):
+        # Отдельный интерпретатор: в текущем процессе Django уже загружен
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': profile},
+            capture_output=True, text=True,
+        )
+        if completed.returncode:
+            raise CommandError(f"{profile}: запуск завершился ошибкой\n{completed.stderr[-2000:]}")
+        sample = json.loads(completed.stdout.strip().splitlines()[-1])
+        sample['packages'] = _package_times(completed.stderr)
+        return sample
+
+    def _median(self, samples):
+        samples = sorted(samples, key=lambda sample: sample['startup'])
+        median = samples[len(samples) // 2]
+        return {
+            'startup': statistics.median(sample['startup'] for sample in samples),
+            'modules': median['modules'],
+            'templates': median['templates'],
+            'maxrss': median['maxrss'],
+            'packages': median['packages'],
+        }
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+
+from appProducts.inventory import reserve_stock, InsufficientStock
+from appProducts.models import Product
+
+
+class Command(BaseCommand):
+    help = "Нагрузочная проверка резервирования: параллельные оформления одного товара"
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int, help='ID товара для проверки')
+        parser.add_argument('--workers', type=int, default=200, help='Количество параллельных покупателей')
+        parser.add_argument('--stock', type=int, default=50, help='Остаток товара на время проверки')
+        parser.add_argument('--quantity', type=int, default=1, help='Количество в каждом заказе')
+
+    def handle(self, *args, **options):
+        product_id = options['product_id']
+        workers = options['workers']
+        quantity = options['quantity']
+        try:
+            product = Product.objects.get(pk=product_id)
+        except Product.DoesNotExist:
+            raise CommandError(f"Товар #{product_id} не найден")
+
+        original_stock = product.stock
+        Product.objects.filter(pk=product_id).update(stock=options['stock'])
+
+        results = {'reserved': 0, 'rejected': 0, 'locked': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(workers)
+
+        def buyer():
+            barrier.wait()
+            try:
+                reserve_stock([(product_id, quantity)])
+                outcome = 'reserved'
+            except InsufficientStock:
+                outcome = 'rejected'
+            except OperationalError:
+                outcome = 'locked'
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        threads = [threading.Thread(target=buyer) for _ in range(workers)]
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            final_stock = Product.objects.get(pk=product_id).stock
+        finally:
+            Product.objects.filter(pk=product_id).update(stock=original_stock)
+
+        expected_stock = options['stock'] - results['reserved'] * quantity
+        self.stdout.write(
+            f"Покупателей: {workers}, зарезервировано: {results['reserved']}, "
+            f"отказано: {results['rejected']}, блокировок БД: {results['locked']}, "
+            f"время: {elapsed:.2f} с"
+        )
+        self.stdout.write(f"Остаток: {final_stock} (ожидалось {expected_stock})")
+
+        if final_stock != expected_stock or final_stock < 0:
+            raise CommandError("Остаток не сходится: обнаружена перепродажа")
+        self.stdout.write(self.style.SUCCESS("Перепродаж нет, остаток согласован"))
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appProducts.sweeper import schedule_sweeper, sweep_carts, sweep_jobs, sweep_sessions
+
+
+class Command(BaseCommand):
+    help = "Удаляет истёкшие сессии, брошенные корзины и завершённые фоновые задачи небольшими пачками"
+
+    def add_arguments(self, parser):
+        sweeper_settings = getattr(settings, 'SWEEPER', {})
+        parser.add_argument('--cart-ttl-days', type=int, default=sweeper_settings.get('CART_TTL_DAYS', 30),
+                            help='Через сколько дней без изменений корзина считается брошенной')
+        parser.add_argument('--job-done-ttl-days', type=int, default=sweeper_settings.get('JOB_DONE_TTL_DAYS', 7),
+                            help='Сколько дней хранить выполненные фоновые задачи')
+        parser.add_argument('--job-dead-ttl-days', type=int, default=sweeper_settings.get('JOB_DEAD_TTL_DAYS', 30),
+                            help='Сколько дней хранить невыполненные фоновые задачи')
+        parser.add_argument('--batch-size', type=int, default=sweeper_settings.get('BATCH_SIZE', 200),
+                            help='Записей в одной транзакции удаления')
+        parser.add_argument('--pause', type=float, default=sweeper_settings.get('PAUSE', 0.2),
+                            help='Пауза между пачками, с')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Не чистить сейчас, а запланировать периодическую задачу для run_jobs')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            if schedule_sweeper():
+                self.stdout.write("Периодическая очистка запланирована")
+            else:
+                self.stdout.write("Периодическая очистка уже запланирована")
+            return
+
+        sessions = sweep_sessions(options['batch_size'], options['pause'])
+        self.stdout.write(f"Удалено истёкших сессий: {sessions}")
+        carts = sweep_carts(options['cart_ttl_days'], options['batch_size'], options['pause'])
+        self.stdout.write(f"Очищено брошенных корзин: {carts}")
+        jobs = sweep_jobs(options['job_done_ttl_days'], options['job_dead_ttl_days'],
+                          options['batch_size'], options['pause'])
+        self.stdout.write(f"Удалено завершённых фоновых задач: {jobs}")
@@ -0,0 +1,40 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appProducts.replica import replica_configured, replica_lag, sync_replica
+
+
+class Command(BaseCommand):
+    help = "Копирует основную базу SQLite в файл реплики для чтения каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Повторять синхронизацию каждые N секунд (0 — один раз)')
+        parser.add_argument('--check', action='store_true', help='Только показать отставание реплики')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError("Реплика не настроена: задайте DB_REPLICA_PATH")
+
+        if options['check']:
+            lag = replica_lag()
+            if lag is None:
+                self.stdout.write("Реплика ещё не синхронизировалась")
+            else:
+                self.stdout.write(f"Отставание реплики: {lag.total_seconds():.1f} с")
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        while not self.stopping:
+            elapsed = sync_replica()
+            self.stdout.write(f"Реплика обновлена за {elapsed:.2f} с")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def _stop(self, signum, frame):
+        self.stopping = True
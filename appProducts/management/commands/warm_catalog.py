@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appProducts.warmup import warm_up
+
+STEP_TITLES = {
+    'templates': 'Шаблоны',
+    'url_resolver': 'URL-резолвер',
+    'catalog_tree': 'Дерево каталога',
+    'pages': 'Главная и каталог',
+    'top_products': 'Популярные товары',
+    'listings': 'Страницы подкатегорий',
+    'product_pages': 'Страницы товаров',
+}
+
+
+class Command(BaseCommand):
+    help = "Прогревает шаблоны, URL-резолвер и кэш каталога после деплоя"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=getattr(settings, 'CATALOG_CACHE', {}).get('WARM_TOP_N', 20),
+                            help='Сколько самых популярных товаров прогреть')
+
+    def handle(self, *args, **options):
+        report = warm_up(top_n=options['top'])
+        for name, count, seconds in report:
+            count = 'ошибка' if count is None else count
+            self.stdout.write(f"{STEP_TITLES.get(name, name):<24} {count:>6} {seconds * 1000:>9.1f} мс")
+        self.stdout.write(f"Всего: {sum(seconds for _, _, seconds in report):.2f} с")
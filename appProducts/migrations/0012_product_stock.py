@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0011_alter_contactmessage_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Оставьте пустым, если остаток не учитывается', null=True, verbose_name='Остаток на складе'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'stock'], name='appProducts_is_acti_efbb22_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_items_count(apps, schema_editor):
+    """Пересчитываем количество товаров в уже оформленных заказах"""
+    Order = apps.get_model('appProducts', 'Order')
+    OrderItem = apps.get_model('appProducts', 'OrderItem')
+    quantities = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    Order.objects.update(items_count=Coalesce(Subquery(quantities), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0013_promotion_orderitem_discount_line_total'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество товаров'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='appProducts_user_id_168a48_idx'),
+        ),
+        migrations.RunPython(fill_items_count, migrations.RunPython.noop),
+    ]
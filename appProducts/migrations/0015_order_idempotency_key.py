@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0014_order_items_count_user_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Ключ идемпотентности'),
+        ),
+    ]
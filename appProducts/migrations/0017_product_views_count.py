@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0016_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотры'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-views_count'], name='appProducts_is_acti_f3ff3e_idx'),
+        ),
+    ]
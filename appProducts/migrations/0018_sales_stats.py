@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0017_product_views_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Checkpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Обработчик')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Позиция')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка',
+                'verbose_name_plural': 'Контрольные точки',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Продано, шт.')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_days', to='appProducts.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара за день',
+                'verbose_name_plural': 'Продажи товаров по дням',
+                'indexes': [models.Index(fields=['day'], name='appProducts_day_0eb952_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_sales_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_stats', serialize=False, to='appProducts.product', verbose_name='Товар')),
+                ('units_7d', models.PositiveIntegerField(default=0, verbose_name='Продано за 7 дней')),
+                ('revenue_7d', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка за 7 дней')),
+                ('units_30d', models.PositiveIntegerField(default=0, verbose_name='Продано за 30 дней')),
+                ('revenue_30d', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка за 30 дней')),
+                ('units_90d', models.PositiveIntegerField(default=0, verbose_name='Продано за 90 дней')),
+                ('revenue_90d', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка за 90 дней')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата пересчёта')),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='appProducts.category', verbose_name='Категория')),
+                ('subcategory', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='appProducts.subcategory', verbose_name='Подкатегория')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг продаж',
+                'verbose_name_plural': 'Рейтинг продаж',
+                'ordering': ['-units_30d'],
+                'indexes': [models.Index(fields=['-units_30d', 'product'], name='appProducts_units_3_145b8f_idx'), models.Index(fields=['-revenue_30d', 'product'], name='appProducts_revenue_77459e_idx'), models.Index(fields=['-units_7d', 'product'], name='appProducts_units_7_68f3b2_idx'), models.Index(fields=['-units_90d', 'product'], name='appProducts_units_9_4e7bbe_idx'), models.Index(fields=['category', '-units_30d', 'product'], name='appProducts_categor_d49072_idx'), models.Index(fields=['subcategory', '-units_30d', 'product'], name='appProducts_subcate_0c5240_idx')],
+            },
+        ),
+    ]
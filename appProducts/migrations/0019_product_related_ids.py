@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0018_sales_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='related_ids',
+            field=models.JSONField(default=list, editable=False, help_text='Заполняется командой build_related_products', verbose_name='Похожие товары'),
+        ),
+    ]
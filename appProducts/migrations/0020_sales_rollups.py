@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0019_product_related_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('status', models.CharField(choices=[('new', 'Новый'), ('processing', 'В обработке'), ('shipped', 'Отправлен'), ('delivered', 'Доставлен'), ('cancelled', 'Отменён')], max_length=20, verbose_name='Статус')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('units', models.IntegerField(default=0, verbose_name='Товаров, шт.')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма')),
+            ],
+            options={
+                'verbose_name': 'Сводка заказов за день',
+                'verbose_name_plural': 'Сводка заказов по дням',
+                'constraints': [models.UniqueConstraint(fields=('day', 'status'), name='unique_daily_order_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано, шт.')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='appProducts.category', verbose_name='Категория')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appProducts.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара за день (сводка)',
+                'verbose_name_plural': 'Продажи товаров по дням (сводка)',
+                'indexes': [models.Index(fields=['day', 'category'], name='appProducts_day_3669a3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product'), name='unique_daily_product_sales')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:57
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    """Для существующих позиций корзины последнее изменение — момент добавления"""
+    CartItem = apps.get_model('appProducts', 'CartItem')
+    CartItem.objects.update(updated_at=F('added_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0021_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appProducts', '0022_cartitem_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('sequence', models.BigAutoField(primary_key=True, serialize=False, verbose_name='Номер')),
+                ('entity', models.CharField(choices=[('category', 'Категория'), ('subcategory', 'Подкатегория'), ('product', 'Товар'), ('product_image', 'Фото товара')], max_length=20, verbose_name='Объект')),
+                ('entity_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('operation', models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление')], max_length=10, verbose_name='Операция')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение каталога',
+                'verbose_name_plural': 'Журнал изменений каталога',
+                'ordering': ['sequence'],
+            },
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 from djmoney.models.fields import MoneyField
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.core.exceptions import ValidationError
 from .validators import (
     validate_image_size,
     validate_image_extension,
@@ -11,7 +13,24 @@ from .validators import (
     phone_validator
 )
 
-class Category(models.Model):
+
+class AtomicSaveMixin:
+    """
+    save() и delete() модели каталога в одной транзакции с сигналами:
+    запись журнала изменений (appProducts.change_feed) фиксируется вместе
+    с изменением, даже если вызывающий код не открыл atomic().
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        with transaction.atomic(using=using or router.db_for_write(type(self), instance=self)):
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class Category(AtomicSaveMixin, models.Model):
     title = models.CharField(
         verbose_name='Название категории',
         max_length=255,
@@ -67,7 +86,7 @@ class Category(models.Model):
         ]
 
 
-class Subcategory(models.Model):
+class Subcategory(AtomicSaveMixin, models.Model):
     category = models.ForeignKey(
         Category,
         on_delete=models.CASCADE,
@@ -121,7 +140,7 @@ class Subcategory(models.Model):
         verbose_name_plural = "подкатегории"
         ordering = ['category', 'title']
 
-class Product(models.Model):
+class Product(AtomicSaveMixin, models.Model):
     name = models.CharField(
         verbose_name='Название продукта',
         max_length=255
@@ -168,6 +187,23 @@ class Product(models.Model):
     is_new = models.BooleanField("Новинка", default=False)
     is_hit = models.BooleanField("Хит продаж", default=False)
     is_sale = models.BooleanField("Распродажа", default=False)
+    stock = models.PositiveIntegerField(
+        verbose_name='Остаток на складе',
+        blank=True,
+        null=True,
+        help_text='Оставьте пустым, если остаток не учитывается'
+    )
+    views_count = models.PositiveIntegerField(
+        verbose_name='Просмотры',
+        default=0,
+        editable=False
+    )
+    related_ids = models.JSONField(
+        verbose_name='Похожие товары',
+        default=list,
+        editable=False,
+        help_text='Заполняется командой build_related_products'
+    )
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -177,6 +213,11 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} ({self.subcategory})"
 
+    @property
+    def in_stock(self):
+        """Товар доступен к заказу: остаток не учитывается или больше нуля"""
+        return self.stock is None or self.stock > 0
+
     class Meta:
         verbose_name = "Товар для продажи"
         verbose_name_plural = "товары для продажи"
@@ -187,10 +228,71 @@ class Product(models.Model):
             models.Index(fields=['is_hit', 'is_active']),
             models.Index(fields=['is_sale', 'is_active']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['is_active', 'stock']),
+            models.Index(fields=['is_active', '-views_count']),
+        ]
+
+
+class Promotion(models.Model):
+    KIND_CHOICES = [
+        ('percent', 'Скидка в процентах'),
+        ('fixed', 'Скидка в рублях за единицу'),
+        ('bundle', 'Комплект: N шт. по фиксированной цене'),
+    ]
+
+    title = models.CharField("Название акции", max_length=255)
+    kind = models.CharField("Тип скидки", max_length=20, choices=KIND_CHOICES, default='percent')
+    value = models.DecimalField(
+        "Значение",
+        max_digits=10,
+        decimal_places=2,
+        validators=[validate_positive_price],
+        help_text='Процент, сумма скидки за единицу или цена комплекта'
+    )
+    min_quantity = models.PositiveIntegerField(
+        "Минимальное количество",
+        default=1,
+        validators=[validate_quantity],
+        help_text='Для комплекта — количество товаров в комплекте'
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, blank=True, null=True,
+        related_name='promotions', verbose_name='Товар'
+    )
+    subcategory = models.ForeignKey(
+        Subcategory, on_delete=models.CASCADE, blank=True, null=True,
+        related_name='promotions', verbose_name='Подкатегория'
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, blank=True, null=True,
+        related_name='promotions', verbose_name='Категория'
+    )
+    is_active = models.BooleanField("Активна", default=True)
+    starts_at = models.DateTimeField("Начало действия", blank=True, null=True)
+    ends_at = models.DateTimeField("Окончание действия", blank=True, null=True)
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
+
+    def clean(self):
+        targets = [self.product_id, self.subcategory_id, self.category_id]
+        if sum(target is not None for target in targets) > 1:
+            raise ValidationError("Укажите только одну цель акции: товар, подкатегорию или категорию")
+        if self.kind == 'percent' and self.value is not None and self.value >= 100:
+            raise ValidationError("Скидка в процентах должна быть меньше 100")
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = "Акция"
+        verbose_name_plural = "Акции и скидки"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active']),
         ]
 
 
-class ProductImage(models.Model):
+class ProductImage(AtomicSaveMixin, models.Model):
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
@@ -219,6 +321,8 @@ class CartItem(models.Model):
         validators=[validate_quantity]
     )
     added_at = models.DateTimeField(auto_now_add=True)
+    # Последнее изменение позиции: по нему sweep_stale_data находит брошенные корзины
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('user', 'product')
@@ -241,8 +345,24 @@ class Order(models.Model):
     address = models.TextField("Адрес доставки")
     status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default='new')
     total_price = MoneyField("Итого", max_digits=10, decimal_places=2, default_currency='RUB')
+    items_count = models.PositiveIntegerField("Количество товаров", default=0)
+    idempotency_key = models.CharField(
+        "Ключ идемпотентности",
+        max_length=64,
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False
+    )
     created_at = models.DateTimeField("Дата заказа", auto_now_add=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему сигнал переносит заказ между строками сводки
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         return f"Заказ №{self.id} от {self.created_at.strftime('%d.%m.%Y')}"
 
@@ -250,6 +370,9 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
 
 
 class OrderItem(models.Model):
@@ -257,6 +380,8 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Товар")
     quantity = models.PositiveIntegerField("Количество", default=1)
     price = MoneyField("Цена за ед.", max_digits=10, decimal_places=2, default_currency='RUB')
+    discount = MoneyField("Скидка", max_digits=10, decimal_places=2, default=0, default_currency='RUB')
+    line_total = MoneyField("Сумма", max_digits=10, decimal_places=2, default=0, default_currency='RUB')
 
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
@@ -302,4 +427,236 @@ class ContactMessage(models.Model):
     class Meta:
         verbose_name = "Сообщение с сайта"
         verbose_name_plural = "Сообщения с сайта"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнено'),
+        ('dead', 'Не выполнено'),
+    ]
+
+    name = models.CharField("Задача", max_length=100)
+    payload = models.JSONField("Параметры", default=dict, blank=True)
+    status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField("Попыток", default=0)
+    max_attempts = models.PositiveIntegerField("Максимум попыток", default=5)
+    run_after = models.DateTimeField("Выполнить после", default=timezone.now)
+    locked_at = models.DateTimeField("Взята в работу", blank=True, null=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+
+class Checkpoint(models.Model):
+    """Позиция, до которой фоновый процесс уже обработал данные"""
+    name = models.CharField("Обработчик", max_length=100, unique=True)
+    position = models.BigIntegerField("Позиция", default=0)
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
+
+    class Meta:
+        verbose_name = "Контрольная точка"
+        verbose_name_plural = "Контрольные точки"
+
+
+class CatalogChange(models.Model):
+    """Запись журнала изменений каталога (appProducts.change_feed)"""
+    ENTITY_CHOICES = [
+        ('category', 'Категория'),
+        ('subcategory', 'Подкатегория'),
+        ('product', 'Товар'),
+        ('product_image', 'Фото товара'),
+    ]
+    OPERATION_CHOICES = [
+        ('create', 'Создание'),
+        ('update', 'Изменение'),
+        ('delete', 'Удаление'),
+    ]
+
+    sequence = models.BigAutoField("Номер", primary_key=True)
+    entity = models.CharField("Объект", max_length=20, choices=ENTITY_CHOICES)
+    entity_id = models.BigIntegerField("ID объекта")
+    operation = models.CharField("Операция", max_length=10, choices=OPERATION_CHOICES)
+    created_at = models.DateTimeField("Дата изменения", auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.sequence} {self.entity} {self.entity_id} {self.operation}"
+
+    class Meta:
+        verbose_name = "Изменение каталога"
+        verbose_name_plural = "Журнал изменений каталога"
+        ordering = ['sequence']
+
+
+class ProductSalesDay(models.Model):
+    """Продажи товара за день — источник для скользящих окон рейтинга"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_days', verbose_name='Товар')
+    day = models.DateField("День")
+    units = models.PositiveIntegerField("Продано, шт.", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Продажи товара за день"
+        verbose_name_plural = "Продажи товаров по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_sales_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+
+class ProductSalesStats(models.Model):
+    """Материализованный рейтинг продаж товара за 7/30/90 дней"""
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True,
+        related_name='sales_stats', verbose_name='Товар'
+    )
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, db_index=False, verbose_name='Категория')
+    subcategory = models.ForeignKey(Subcategory, on_delete=models.CASCADE, db_index=False, verbose_name='Подкатегория')
+    units_7d = models.PositiveIntegerField("Продано за 7 дней", default=0)
+    revenue_7d = models.DecimalField("Выручка за 7 дней", max_digits=14, decimal_places=2, default=0)
+    units_30d = models.PositiveIntegerField("Продано за 30 дней", default=0)
+    revenue_30d = models.DecimalField("Выручка за 30 дней", max_digits=14, decimal_places=2, default=0)
+    units_90d = models.PositiveIntegerField("Продано за 90 дней", default=0)
+    revenue_90d = models.DecimalField("Выручка за 90 дней", max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField("Дата пересчёта", auto_now=True)
+
+    def __str__(self):
+        return f"{self.product.name}: {self.units_30d} шт. за 30 дней"
+
+    class Meta:
+        verbose_name = "Рейтинг продаж"
+        verbose_name_plural = "Рейтинг продаж"
+        ordering = ['-units_30d']
+        # product_id в хвосте индекса: выборка топа товаров читает только индекс
+        # (bigint PRIMARY KEY в SQLite не является псевдонимом rowid)
+        indexes = [
+            models.Index(fields=['-units_30d', 'product']),
+            models.Index(fields=['-revenue_30d', 'product']),
+            models.Index(fields=['-units_7d', 'product']),
+            models.Index(fields=['-units_90d', 'product']),
+            models.Index(fields=['category', '-units_30d', 'product']),
+            models.Index(fields=['subcategory', '-units_30d', 'product']),
+        ]
+
+
+class DailyOrderStats(models.Model):
+    """Дневная сводка заказов по статусам"""
+    day = models.DateField("День")
+    status = models.CharField("Статус", max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField("Заказов", default=0)
+    units = models.IntegerField("Товаров, шт.", default=0)
+    revenue = models.DecimalField("Сумма", max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.get_status_display()}: {self.orders}"
+
+    class Meta:
+        verbose_name = "Сводка заказов за день"
+        verbose_name_plural = "Сводка заказов по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='unique_daily_order_stats'),
+        ]
+
+
+class DailyProductSales(models.Model):
+    """Дневная сводка продаж товара; отменённые заказы не учитываются"""
+    day = models.DateField("День")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Товар')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, db_index=False, verbose_name='Категория')
+    units = models.IntegerField("Продано, шт.", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}: {self.units}"
+
+    class Meta:
+        verbose_name = "Продажи товара за день (сводка)"
+        verbose_name_plural = "Продажи товаров по дням (сводка)"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_daily_product_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category']),
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """Заказ, перенесённый из оперативной таблицы командой archive_records"""
+    id = models.BigIntegerField("Номер заказа", primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Пользователь")
+    first_name = models.CharField("Имя", max_length=100)
+    last_name = models.CharField("Фамилия", max_length=100)
+    phone = models.CharField("Телефон", max_length=20)
+    address = models.TextField("Адрес доставки")
+    status = models.CharField("Статус", max_length=20, choices=Order.STATUS_CHOICES)
+    total_price = MoneyField("Итого", max_digits=10, decimal_places=2, default_currency='RUB')
+    items_count = models.PositiveIntegerField("Количество товаров", default=0)
+    created_at = models.DateTimeField("Дата заказа")
+    archived_at = models.DateTimeField("Дата архивации", auto_now_add=True)
+
+    def __str__(self):
+        return f"Заказ №{self.id} от {self.created_at.strftime('%d.%m.%Y')} (архив)"
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архив заказов"
+        ordering = ['-created_at']
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE, verbose_name="Заказ")
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Товар")
+    product_name = models.CharField("Название товара", max_length=255)
+    quantity = models.PositiveIntegerField("Количество", default=1)
+    price = MoneyField("Цена за ед.", max_digits=10, decimal_places=2, default_currency='RUB')
+    discount = MoneyField("Скидка", max_digits=10, decimal_places=2, default=0, default_currency='RUB')
+    line_total = MoneyField("Сумма", max_digits=10, decimal_places=2, default=0, default_currency='RUB')
+
+    def __str__(self):
+        return f"{self.product_name} x{self.quantity}"
+
+    class Meta:
+        verbose_name = "Товар в архивном заказе"
+        verbose_name_plural = "Товары в архивном заказе"
+
+
+class ArchivedContactMessage(models.Model):
+    """Обращение, перенесённое из оперативной таблицы командой archive_records"""
+    id = models.BigIntegerField("Номер обращения", primary_key=True)
+    name = models.CharField("Имя", max_length=100)
+    email = models.EmailField("Email")
+    phone = models.CharField("Телефон", max_length=20, blank=True)
+    category = models.CharField("Категория", max_length=20, choices=ContactMessage.CATEGORY_CHOICES)
+    subject = models.CharField("Тема", max_length=200, blank=True)
+    message = models.TextField("Сообщение")
+    status = models.CharField("Статус", max_length=20, choices=ContactMessage.STATUS_CHOICES)
+    admin_notes = models.TextField("Заметки администратора", blank=True)
+    created_at = models.DateTimeField("Дата создания")
+    updated_at = models.DateTimeField("Дата обновления")
+    resolved_at = models.DateTimeField("Дата решения", blank=True, null=True)
+    archived_at = models.DateTimeField("Дата архивации", auto_now_add=True)
+
+    def __str__(self):
+        return f"[{self.get_category_display()}] {self.name} - {self.subject or 'Без темы'}"
+
+    class Meta:
+        verbose_name = "Архивное сообщение"
+        verbose_name_plural = "Архив сообщений"
+        ordering = ['-created_at']
@@ -0,0 +1,164 @@
+"""
+Движок акций: расчёт цен корзины с учётом скидок.
+
+Активные акции компилируются в словарь «цель → правила» и хранятся в памяти
+процесса. При изменении акций в админке сигнал меняет версию правил в кеше,
+и все процессы перекомпилируют словарь при следующем расчёте.
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Promotion
+
+RULES_VERSION_KEY = 'pricing:rules_version'
+# Страховочный интервал перекомпиляции, если версия в кеше потерялась
+RULES_MAX_AGE = 300
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+
+PricedLine = namedtuple('PricedLine', 'unit_price quantity discount line_total promotion_id')
+
+_lock = threading.Lock()
+_state = {'version': None, 'compiled_at': None, 'rules': {}}
+
+
+def invalidate_rules():
+    """Помечает скомпилированные правила устаревшими во всех процессах"""
+    cache.set(RULES_VERSION_KEY, uuid.uuid4().hex, None)
+    _state['compiled_at'] = None
+
+
+def _compile():
+    """Собирает активные акции в словарь {цель: [правило, ...]}"""
+    rules = {}
+    queryset = Promotion.objects.filter(is_active=True).values_list(
+        'id', 'kind', 'value', 'min_quantity', 'product_id', 'subcategory_id',
+        'category_id', 'starts_at', 'ends_at'
+    )
+    for (promo_id, kind, value, min_quantity, product_id, subcategory_id,
+         category_id, starts_at, ends_at) in queryset:
+        if product_id:
+            target = ('product', product_id)
+        elif subcategory_id:
+            target = ('subcategory', subcategory_id)
+        elif category_id:
+            target = ('category', category_id)
+        else:
+            target = ('all', None)
+        if kind == 'percent':
+            # Храним сразу множитель, чтобы не делить при каждом расчёте
+            value = (100 - value) / 100
+        rules.setdefault(target, []).append((
+            promo_id,
+            kind,
+            value,
+            max(min_quantity, 1),
+            starts_at.timestamp() if starts_at else None,
+            ends_at.timestamp() if ends_at else None,
+        ))
+    return rules
+
+
+def _is_stale(version, now):
+    compiled_at = _state['compiled_at']
+    return (
+        compiled_at is None
+        or version != _state['version']
+        or now - compiled_at > RULES_MAX_AGE
+    )
+
+
+def get_rules():
+    """Возвращает скомпилированные правила, перекомпилируя их при смене версии"""
+    version = cache.get(RULES_VERSION_KEY)
+    now = time.monotonic()
+    if _is_stale(version, now):
+        with _lock:
+            if _is_stale(version, now):
+                _state['rules'] = _compile()
+                _state['version'] = version
+                _state['compiled_at'] = now
+    return _state['rules']
+
+
+def _apply(rule, unit_price, quantity, now):
+    """Сумма строки по одному правилу или None, если правило неприменимо"""
+    promo_id, kind, value, min_quantity, starts_at, ends_at = rule
+    if quantity < min_quantity:
+        return None
+    if (starts_at is not None and now < starts_at) or (ends_at is not None and now >= ends_at):
+        return None
+    if kind == 'percent':
+        return unit_price * quantity * value
+    if kind == 'fixed':
+        return max(unit_price - value, ZERO) * quantity
+    bundles, rest = divmod(quantity, min_quantity)
+    return bundles * value + rest * unit_price
+
+
+def price_lines(lines):
+    """
+    Рассчитывает цены для всех строк одним проходом.
+
+    lines — последовательность кортежей (product_id, subcategory_id, category_id,
+    unit_price, quantity). Для каждой строки выбирается самая выгодная для
+    покупателя акция (скидки не суммируются). Возвращает список PricedLine
+    в том же порядке и общую сумму.
+    """
+    rules = get_rules()
+    now = timezone.now().timestamp()
+    global_rules = rules.get(('all', None), ())
+    priced = []
+    total = ZERO
+    for product_id, subcategory_id, category_id, unit_price, quantity in lines:
+        base = unit_price * quantity
+        best = base
+        best_promo = None
+        if rules:
+            for candidates in (
+                rules.get(('product', product_id), ()),
+                rules.get(('subcategory', subcategory_id), ()),
+                rules.get(('category', category_id), ()),
+                global_rules,
+            ):
+                for rule in candidates:
+                    line_total = _apply(rule, unit_price, quantity, now)
+                    if line_total is not None and line_total < best:
+                        best = line_total
+                        best_promo = rule[0]
+        best = best.quantize(CENT)
+        priced.append(PricedLine(unit_price, quantity, base - best, best, best_promo))
+        total += best
+    return priced, total
+
+
+def price_cart(cart_items):
+    """
+    Рассчитывает корзину и проставляет каждой позиции unit_price, discount и line_total.
+
+    Позиции должны быть загружены с select_related('product__subcategory').
+    Возвращает общую сумму корзины.
+    """
+    cart_items = list(cart_items)
+    priced, total = price_lines(
+        (
+            item.product_id,
+            item.product.subcategory_id,
+            item.product.subcategory.category_id,
+            item.product.price.amount,
+            item.quantity,
+        )
+        for item in cart_items
+    )
+    for item, line in zip(cart_items, priced):
+        item.unit_price = line.unit_price
+        item.discount = line.discount
+        item.line_total = line.line_total
+    return total
@@ -0,0 +1,229 @@
+"""
+Материализованный рейтинг продаж товаров.
+
+Новые позиции заказов за контрольной точкой складываются в дневные суммы
+ProductSalesDay (таблица не больше «товары × 90 дней»), из которых затем
+пересчитываются окна 7/30/90 дней в ProductSalesStats. Исторические
+OrderItem повторно не агрегируются. Пересчёт выполняется командой
+refresh_sales_stats (по расписанию) или фоновой задачей sales.refresh_stats.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Now, TruncDate
+from django.utils import timezone
+
+from .catalog_cache import invalidate_catalog
+from .change_feed import record_updates
+from .models import Checkpoint, Order, OrderItem, Product, ProductSalesDay, ProductSalesStats
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'sales_stats'
+WINDOWS = (7, 30, 90)
+
+def _setting(name, default):
+    return getattr(settings, 'SALES_RANKING', {}).get(name, default)
+
+
+class _CheckpointMoved(Exception):
+    """Контрольную точку сдвинул параллельный запуск: пачка откатывается"""
+
+
+def ingest_new_sales(batch_size=None):
+    """
+    Добавляет в дневные суммы продажи из заказов, созданных после контрольной точки.
+
+    Позиция читается, пачка агрегируется и контрольная точка сдвигается в
+    одной транзакции записи (SQLite берёт блокировку сразу, transaction_mode
+    IMMEDIATE). Сдвиг — условный UPDATE по прочитанной позиции: если
+    параллельный запуск (задача sales.refresh_stats и команда
+    refresh_sales_stats) уже учёл эту пачку, транзакция откатывается, поэтому
+    ни повтор после сбоя, ни одновременные запуски ничего не задвоят.
+    Отменённые на момент обработки заказы не учитываются.
+    """
+    batch_size = batch_size or _setting('BATCH_SIZE', 500)
+    Checkpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    ingested = 0
+    while True:
+        try:
+            with transaction.atomic():
+                position = Checkpoint.objects.get(name=CHECKPOINT_NAME).position
+                order_ids = list(
+                    Order.objects.filter(pk__gt=position)
+                    .order_by('pk').values_list('pk', flat=True)[:batch_size]
+                )
+                if not order_ids:
+                    break
+                daily = (
+                    OrderItem.objects.filter(order_id__in=order_ids)
+                    .exclude(order__status='cancelled')
+                    .annotate(day=TruncDate('order__created_at'))
+                    .values('product_id', 'day')
+                    .annotate(units=Sum('quantity'), revenue=Sum('line_total'))
+                )
+                for row in daily:
+                    updated = ProductSalesDay.objects.filter(product_id=row['product_id'], day=row['day']).update(
+                        units=F('units') + row['units'], revenue=F('revenue') + row['revenue']
+                    )
+                    if not updated:
+                        ProductSalesDay.objects.create(
+                            product_id=row['product_id'], day=row['day'],
+                            units=row['units'], revenue=row['revenue'],
+                        )
+                moved = Checkpoint.objects.filter(name=CHECKPOINT_NAME, position=position).update(
+                    position=order_ids[-1], updated_at=timezone.now()
+                )
+                if not moved:
+                    raise _CheckpointMoved
+        except _CheckpointMoved:
+            continue
+        ingested += len(order_ids)
+    return ingested
+
+
+def rebuild_window_stats():
+    """Пересчитывает окна 7/30/90 дней по дневным суммам и удаляет устаревшие дни"""
+    today = timezone.localdate()
+    longest = max(WINDOWS)
+    window_sums = {}
+    for days in WINDOWS:
+        in_window = Q(day__gt=today - timedelta(days=days))
+        window_sums[f'units_{days}d'] = Sum('units', filter=in_window, default=0)
+        window_sums[f'revenue_{days}d'] = Sum('revenue', filter=in_window, default=0)
+
+    rows = (
+        ProductSalesDay.objects.filter(day__gt=today - timedelta(days=longest))
+        .values('product_id', 'product__subcategory_id', 'product__subcategory__category_id')
+        .annotate(**window_sums)
+    )
+    now = timezone.now()
+    stats = [
+        ProductSalesStats(
+            product_id=row['product_id'],
+            subcategory_id=row['product__subcategory_id'],
+            category_id=row['product__subcategory__category_id'],
+            updated_at=now,
+            **{field: row[field] for field in window_sums},
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        ProductSalesStats.objects.bulk_create(
+            stats,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['category', 'subcategory', 'updated_at', *window_sums],
+        )
+        # Товары, у которых не осталось продаж за самое длинное окно
+        ProductSalesStats.objects.filter(updated_at__lt=now).delete()
+        ProductSalesDay.objects.filter(day__lte=today - timedelta(days=longest)).delete()
+    return stats
+
+
+def update_hit_badges(stats):
+    """
+    Отмечает «Хитом продаж» первые HIT_TOP_N товаров каждой подкатегории за 30 дней.
+
+    При HIT_TOP_N = 0 метка остаётся ручной.
+    """
+    top_n = _setting('HIT_TOP_N', 0)
+    if not top_n:
+        return 0
+    by_subcategory = defaultdict(list)
+    for row in stats:
+        if row.units_30d:
+            by_subcategory[row.subcategory_id].append(row)
+    hits = set()
+    for rows in by_subcategory.values():
+        rows.sort(key=lambda row: row.units_30d, reverse=True)
+        hits.update(row.product_id for row in rows[:top_n])
+    with transaction.atomic():
+        unmarked = list(Product.objects.filter(is_hit=True).exclude(pk__in=hits).values_list('pk', flat=True))
+        marked = list(Product.objects.filter(pk__in=hits, is_hit=False).values_list('pk', flat=True))
+        Product.objects.filter(pk__in=unmarked).update(is_hit=False, updated_at=Now())
+        Product.objects.filter(pk__in=marked).update(is_hit=True, updated_at=Now())
+        if unmarked or marked:
+            # Массовый UPDATE не вызывает сигналов: журнал и кэш каталога обновляем сами
+            record_updates('product', unmarked + marked)
+            transaction.on_commit(invalidate_catalog)
+    return len(hits)
+
+
+def refresh_sales_stats():
+    """Полный цикл: новые продажи, окна рейтинга и метки хитов"""
+    ingested = ingest_new_sales()
+    stats = rebuild_window_stats()
+    hits = update_hit_badges(stats)
+    logger.info(f"Рейтинг продаж обновлён: новых заказов {ingested}, товаров в рейтинге {len(stats)}")
+    return ingested, len(stats), hits
+
+
+class BestsellerListing:
+    """
+    Товары списка по продажам за 30 дней, затем товары без продаж по названию.
+
+    Порядок проданных товаров читается из индекса рейтинга
+    (scope — фильтр ProductSalesStats по категории или подкатегории, индексы
+    (category|subcategory, -units_30d, product)), без соединения товаров
+    с рейтингом и сортировки всего списка. Объект подходит для Paginator:
+    count() и срезы, как у QuerySet.
+    """
+
+    def __init__(self, products, **scope):
+        self.products = products.order_by()
+        self.scope = scope
+        self._ranked = None
+
+    def ranked_ids(self):
+        """id проданных товаров, попадающих в список, по убыванию продаж"""
+        if self._ranked is None:
+            ids = list(
+                ProductSalesStats.objects.filter(units_30d__gt=0, **self.scope)
+                .order_by('-units_30d', 'product_id').values_list('product_id', flat=True)
+            )
+            listed = set(self.products.filter(pk__in=ids).values_list('pk', flat=True))
+            self._ranked = [pk for pk in ids if pk in listed]
+        return self._ranked
+
+    def count(self):
+        return self.products.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        ranked = self.ranked_ids()
+        rows = []
+        if start < len(ranked):
+            ids = ranked[start:stop]
+            by_pk = self.products.in_bulk(ids)
+            rows = [by_pk[pk] for pk in ids if pk in by_pk]
+        if stop is None or stop > len(ranked):
+            rest = self.products.exclude(pk__in=ranked).order_by('name')
+            rows += rest[max(start - len(ranked), 0):None if stop is None else stop - len(ranked)]
+        return rows
+
+
+def top_products(window=30, subcategory=None, category=None, limit=10):
+    """
+    Идентификаторы самых продаваемых товаров за окно (7, 30 или 90 дней).
+
+    Для окна 30 дней запрос читает только индекс рейтинга.
+    """
+    if window not in WINDOWS:
+        raise ValueError(f"Окно рейтинга должно быть одним из {WINDOWS}")
+    stats = ProductSalesStats.objects.filter(**{f'units_{window}d__gt': 0})
+    if subcategory is not None:
+        stats = stats.filter(subcategory=subcategory)
+    elif category is not None:
+        stats = stats.filter(category=category)
+    return list(stats.order_by(f'-units_{window}d').values_list('product_id', flat=True)[:limit])
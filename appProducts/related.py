@@ -0,0 +1,131 @@
+"""
+Предрасчёт блока «Похожие товары».
+
+Соседи товара — те, что чаще всего покупали вместе с ним в одном заказе.
+Если совместных покупок мало, список дополняется товарами той же
+подкатегории с ближайшей ценой. Результат хранится массивом id в
+Product.related_ids и пересобирается командой build_related_products.
+"""
+import bisect
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'RELATED_PRODUCTS', {}).get(name, default)
+
+
+def co_purchased(limit, lookback_days=None, min_orders=None):
+    """
+    {product_id: [id соседа, ...]} по числу общих заказов, по убыванию.
+
+    Пары считаются одним запросом с самосоединением позиций заказа; строки
+    читаются потоком, в памяти остаются только первые limit соседей товара.
+    """
+    lookback_days = lookback_days or _setting('LOOKBACK_DAYS', 365)
+    min_orders = min_orders or _setting('MIN_CO_PURCHASES', 1)
+    item_table = connection.ops.quote_name(OrderItem._meta.db_table)
+    order_table = connection.ops.quote_name(Order._meta.db_table)
+    sql = f"""
+        SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id) AS together
+        FROM {item_table} a
+        JOIN {item_table} b ON b.order_id = a.order_id AND b.product_id != a.product_id
+        JOIN {order_table} o ON o.id = a.order_id
+        WHERE o.created_at >= %s AND o.status != %s
+        GROUP BY a.product_id, b.product_id
+        HAVING COUNT(DISTINCT a.order_id) >= %s
+        ORDER BY a.product_id, together DESC, b.product_id
+    """
+    since = timezone.now() - timedelta(days=lookback_days)
+    neighbours = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [since, 'cancelled', min_orders])
+        while rows := cursor.fetchmany(2000):
+            for product_id, other_id, _together in rows:
+                ids = neighbours.setdefault(product_id, [])
+                if len(ids) < limit:
+                    ids.append(other_id)
+    return neighbours
+
+
+def nearest_by_price(product, candidates, prices, limit, exclude):
+    """
+    Товары подкатегории с ценой, ближайшей к цене product.
+
+    candidates — список (цена, id), отсортированный по цене; prices — те же
+    цены отдельным списком для bisect.
+    """
+    result = []
+    right = bisect.bisect_left(prices, product.price.amount)
+    left = right - 1
+    target = product.price.amount
+    while len(result) < limit and (left >= 0 or right < len(candidates)):
+        take_left = right >= len(candidates) or (
+            left >= 0 and target - candidates[left][0] <= candidates[right][0] - target
+        )
+        if take_left:
+            candidate_id = candidates[left][1]
+            left -= 1
+        else:
+            candidate_id = candidates[right][1]
+            right += 1
+        if candidate_id != product.id and candidate_id not in exclude:
+            result.append(candidate_id)
+    return result
+
+
+def build_related_products(limit=None):
+    """Пересчитывает related_ids всех товаров; сохраняет только изменившиеся"""
+    limit = limit or _setting('LIMIT', 8)
+    products = list(Product.objects.only('id', 'price', 'price_currency', 'subcategory_id', 'is_active', 'related_ids'))
+    active_ids = {product.id for product in products if product.is_active}
+
+    by_subcategory = {}
+    for product in products:
+        if product.is_active:
+            by_subcategory.setdefault(product.subcategory_id, []).append((product.price.amount, product.id))
+    for candidates in by_subcategory.values():
+        candidates.sort()
+    subcategory_prices = {
+        subcategory_id: [price for price, _id in candidates]
+        for subcategory_id, candidates in by_subcategory.items()
+    }
+
+    # Запас на неактивные товары, которые отсеются ниже
+    bought_together = co_purchased(limit * 2)
+    changed = []
+    for product in products:
+        related = [pk for pk in bought_together.get(product.id, []) if pk in active_ids][:limit]
+        if len(related) < limit:
+            related += nearest_by_price(
+                product,
+                by_subcategory.get(product.subcategory_id, []),
+                subcategory_prices.get(product.subcategory_id, []),
+                limit - len(related),
+                exclude=set(related),
+            )
+        if related != product.related_ids:
+            product.related_ids = related
+            changed.append(product)
+
+    Product.objects.bulk_update(changed, ['related_ids'], batch_size=500)
+    logger.info(f"Похожие товары пересчитаны: изменено {len(changed)} из {len(products)}")
+    return len(products), len(changed)
+
+
+def get_related_products(product):
+    """Похожие товары одним запросом, в порядке предрасчёта"""
+    if not product.related_ids:
+        return []
+    related = Product.objects.filter(
+        pk__in=product.related_ids, is_active=True
+    ).select_related('subcategory__category').in_bulk()
+    return [related[pk] for pk in product.related_ids if pk in related]
@@ -0,0 +1,198 @@
+"""
+Чтение каталога с реплики базы данных.
+
+ReplicaRouter отправляет чтение моделей каталога на псевдоним 'replica',
+а любую запись — на основную базу. Реплика используется только внутри
+GET/HEAD-запросов покупателей (флаг ставит ReplicaMiddleware): после первой
+записи в запросе все последующие чтения до его конца идут в основную базу,
+чтобы покупатель сразу видел свои изменения. Фоновые потоки, задачи и
+команды всегда работают с основной базой.
+
+Админка (EXCLUDE_PATHS) и сотрудники читают только основную базу: форма,
+отрисованная по отставшей реплике, при сохранении записала бы устаревшие
+цены и остатки. После POST и других изменяющих запросов ответ ставит cookie
+STICKY_COOKIE на MAX_LAG секунд, и GET после перенаправления тоже читает
+основную базу.
+
+Реплика — копия файла SQLite, которую команда sync_replica обновляет через
+backup API. Перед каждым копированием в основную базу пишется отметка
+времени (Checkpoint 'replica.heartbeat'); по её значению на реплике
+replica_lag() показывает отставание. Если реплика отстала больше MAX_LAG
+секунд, чтение возвращается в основную базу.
+"""
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import Checkpoint
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+HEARTBEAT = 'replica.heartbeat'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def _setting(name, default):
+    return getattr(settings, 'REPLICA', {}).get(name, default)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def write_heartbeat():
+    """Отметка времени в основной базе; попадёт на реплику при следующей синхронизации"""
+    Checkpoint.objects.using('default').update_or_create(
+        name=HEARTBEAT, defaults={'position': int(time.time())}
+    )
+
+
+def replica_lag():
+    """Отставание реплики от основной базы или None, если реплика не синхронизировалась"""
+    try:
+        synced_at = Checkpoint.objects.using(REPLICA_ALIAS).filter(
+            name=HEARTBEAT
+        ).values_list('updated_at', flat=True).first()
+    except DatabaseError:
+        return None
+    if synced_at is None:
+        return None
+    return timezone.now() - synced_at
+
+
+class _Freshness:
+    """Результат проверки отставания, кэшируемый в процессе на CHECK_INTERVAL секунд"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._fresh = False
+
+    def is_fresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < _setting('CHECK_INTERVAL', 5):
+            return self._fresh
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= _setting('CHECK_INTERVAL', 5):
+                lag = replica_lag()
+                self._fresh = lag is not None and lag <= timedelta(seconds=_setting('MAX_LAG', 30))
+                if not self._fresh:
+                    logger.warning(f"Реплика отстаёт ({lag}), чтение каталога идёт в основную базу")
+                self._checked_at = now
+        return self._fresh
+
+
+replica_freshness = _Freshness()
+
+
+class ReplicaRouter:
+    def _is_catalog(self, model):
+        return model._meta.label in _setting('MODELS', ())
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and self._is_catalog(model) and replica_freshness.is_fresh():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Запрос что-то записал: дальше читаем только из основной базы
+        _replica_reads.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплики приходит вместе с копией файла
+        return db != REPLICA_ALIAS
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение каталога с реплики на время GET/HEAD-запроса покупателя"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _use_replica(self, request, user):
+        return (
+            request.method in ('GET', 'HEAD')
+            and _setting('STICKY_COOKIE', 'primary_reads') not in request.COOKIES
+            and not request.path.startswith(tuple(_setting('EXCLUDE_PATHS', ['/admin/'])))
+            and not user.is_staff
+        )
+
+    def _stick_to_primary(self, request, response):
+        # Реплика догонит запись этого запроса не позже чем через MAX_LAG секунд
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                _setting('STICKY_COOKIE', 'primary_reads'), '1',
+                max_age=_setting('MAX_LAG', 30), httponly=True, samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_configured():
+            return self.get_response(request)
+        if not self._use_replica(request, request.user):
+            return self._stick_to_primary(request, self.get_response(request))
+        token = _replica_reads.set(True)
+        try:
+            return self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+
+    async def __acall__(self, request):
+        if not replica_configured():
+            return await self.get_response(request)
+        if not self._use_replica(request, await request.auser()):
+            return self._stick_to_primary(request, await self.get_response(request))
+        token = _replica_reads.set(True)
+        try:
+            return await self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+
+
+def sync_replica(pages=None, sleep=None):
+    """
+    Копирует основную базу в файл реплики через sqlite3 backup API.
+
+    Копирование идёт порциями по pages страниц с паузой sleep, поэтому запись
+    в основную базу блокируется только на время одной порции. Открытые
+    соединения реплики видят новую копию без переподключения.
+    """
+    write_heartbeat()
+    source_path = str(settings.DATABASES['default']['NAME'])
+    replica_path = str(settings.DATABASES[REPLICA_ALIAS]['NAME'])
+    # Соединения Django к реплике не должны держать транзакцию чтения во время копирования
+    connections[REPLICA_ALIAS].close()
+    started = time.perf_counter()
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(
+            target,
+            pages=pages or _setting('BACKUP_PAGES', 1024),
+            sleep=_setting('BACKUP_SLEEP', 0.005) if sleep is None else sleep,
+        )
+    finally:
+        target.close()
+        source.close()
+    return time.perf_counter() - started
@@ -0,0 +1,58 @@
+"""
+Повтор операций записи при блокировке базы SQLite.
+
+Писатели открывают транзакции в режиме IMMEDIATE и ждут освобождения
+блокировки до OPTIONS['timeout'] секунд. Если ожидание всё же истекло,
+retry_on_lock повторяет операцию целиком несколько раз с экспоненциальной
+задержкой и случайным разбросом, чтобы повторы не шли в ногу.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'database schema is locked')
+
+
+def _setting(name, default):
+    return getattr(settings, 'SQLITE_RETRY', {}).get(name, default)
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and any(text in str(error) for text in LOCK_ERRORS)
+
+
+def retry_on_lock(func=None, *, attempts=None, base_delay=None, max_delay=None):
+    """
+    Декоратор: повторить функцию, если она упала на блокировке базы.
+
+    Функция должна сама открывать транзакцию: внутри внешнего atomic()
+    повтор невозможен (транзакция уже сломана), и ошибка пробрасывается сразу.
+    Работы после фиксации (transaction.on_commit) в функции быть не должно:
+    её сбой повторил бы уже зафиксированную транзакцию.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            max_attempts = attempts or _setting('ATTEMPTS', 4)
+            delay = base_delay or _setting('BASE_DELAY', 0.05)
+            cap = max_delay or _setting('MAX_DELAY', 1.0)
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_lock_error(e) or attempt == max_attempts or connection.in_atomic_block:
+                        raise
+                    pause = random.uniform(0, min(cap, delay * 2 ** (attempt - 1)))
+                    logger.warning(f"База заблокирована в {func.__qualname__}, повтор {attempt} через {pause:.3f} с")
+                    time.sleep(pause)
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,130 @@
+"""
+Сессии в базе данных с кэшем чтения в общем кэше сервера.
+
+Загруженная сессия кладётся в кэш Django (CACHES['default'] — общий для
+всех процессов файл SQLite, appProducts.cache_backend) на
+SESSION_STORE['TTL'] секунд, поэтому повторные запросы того же покупателя
+не читают django_session. Запись пропускается, если содержимое сессии не
+изменилось и срок её действия не пора продлевать. База остаётся основным
+хранилищем: после истечения TTL или вытеснения из кэша сессия снова
+читается из неё. Выход из аккаунта (delete/flush) удаляет запись кэша для
+всех процессов сразу.
+
+Запись условная: UPDATE проходит, только если в базе лежит та же
+session_data, с которой запрос начинал работу. Если сессию успел
+переписать параллельный запрос, она перечитывается из базы, ключи,
+изменённые в этом запросе, переносятся поверх свежих данных, и запись
+повторяется. Чужие изменения (сообщения, вход в аккаунт) не затираются.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils import timezone
+
+KEY_PREFIX = 'session:'
+
+# payload — сериализованные данные для сравнения, session_data — строка из базы (версия)
+_Entry = namedtuple('_Entry', 'session_key payload session_data expire_date')
+
+# Сколько раз переносить изменения поверх чужой записи, прежде чем сдаться
+MERGE_ATTEMPTS = 3
+
+
+def _setting(name, default):
+    return getattr(settings, 'SESSION_STORE', {}).get(name, default)
+
+
+def cached_session(session_key):
+    entry = cache.get(KEY_PREFIX + session_key)
+    if entry is None or entry.expire_date <= timezone.now():
+        return None
+    return entry
+
+
+def forget_session(session_key):
+    cache.delete(KEY_PREFIX + session_key)
+
+
+class SessionStore(DBStore):
+    def _remember(self, session_data, expire_date, data):
+        self._stored = _Entry(self.session_key, self.serializer().dumps(data), session_data, expire_date)
+        timeout = min(_setting('TTL', 30), (expire_date - timezone.now()).total_seconds())
+        if timeout > 0:
+            cache.set(KEY_PREFIX + self.session_key, self._stored, timeout)
+
+    def load(self):
+        entry = cached_session(self.session_key) if self.session_key else None
+        if entry is None:
+            s = self._get_session_from_db()
+            if s is None:
+                return {}
+            data = self.decode(s.session_data)
+            self._remember(s.session_data, s.expire_date, data)
+            return data
+        self._stored = entry
+        # Каждый запрос получает свою копию данных
+        return self.serializer().loads(entry.payload)
+
+    def _expiry_needs_refresh(self, stored):
+        # Продлеваем скользящий срок, когда прошла половина его длительности
+        remaining = stored.expire_date - timezone.now()
+        return remaining < timedelta(seconds=self.get_expiry_age() / 2)
+
+    def save(self, must_create=False):
+        stored = getattr(self, '_stored', None)
+        if must_create or self.session_key is None or stored is None or stored.session_key != self.session_key:
+            super().save(must_create=must_create)
+            if self.session_key is not None:
+                data = self._get_session()
+                self._remember(self._written.session_data, self._written.expire_date, data)
+            return
+
+        data = self._get_session()
+        if self.serializer().dumps(data) == stored.payload and not self._expiry_needs_refresh(stored):
+            return
+        base = self.serializer().loads(stored.payload)
+        changed = {key: value for key, value in data.items() if key not in base or base[key] != value}
+        removed = base.keys() - data.keys()
+        for _ in range(MERGE_ATTEMPTS):
+            obj = self.create_model_instance(data)
+            using = router.db_for_write(self.model, instance=obj)
+            with transaction.atomic(using=using):
+                updated = self.model.objects.using(using).filter(
+                    session_key=self.session_key, session_data=stored.session_data
+                ).update(session_data=obj.session_data, expire_date=obj.expire_date)
+            if updated:
+                self._remember(obj.session_data, obj.expire_date, data)
+                return
+            # Сессию переписал другой процесс: переносим свои изменения поверх его данных
+            forget_session(self.session_key)
+            current = self.model.objects.using(using).filter(
+                session_key=self.session_key, expire_date__gt=timezone.now()
+            ).first()
+            if current is None:
+                # Сессию удалили (выход из аккаунта) — как и в DBStore, не воскрешаем её
+                raise UpdateError
+            data = self.decode(current.session_data)
+            for key in removed:
+                data.pop(key, None)
+            data.update(changed)
+            self._session_cache = data
+            stored = stored._replace(session_data=current.session_data)
+        raise UpdateError
+
+    def create_model_instance(self, data):
+        # Запоминаем записанную строку: она — версия сессии для следующей условной записи
+        self._written = super().create_model_instance(data)
+        return self._written
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        self._stored = None
+        super().delete(session_key)
+        # После удаления строки: запрос, читающий базу в этот момент, не вернёт сессию в кэш позже нас
+        if session_key is not None:
+            forget_session(session_key)
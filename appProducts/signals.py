@@ -0,0 +1,38 @@
+"""
+Сигналы приложения appProducts
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .analytics import record_status_change
+from .catalog_cache import invalidate_catalog
+from .change_feed import record_change
+from .models import Category, Order, Product, ProductImage, Promotion, Subcategory
+from .pricing import invalidate_rules
+
+
+@receiver([post_save, post_delete], sender=Promotion)
+def promotion_changed(sender, **kwargs):
+    """Перекомпилировать правила акций после изменения в админке"""
+    transaction.on_commit(invalidate_rules)
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Subcategory)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+def catalog_changed(sender, instance, signal, created=False, **kwargs):
+    """Записать изменение в журнал и сбросить кэш каталога после фиксации"""
+    record_change(instance, 'delete' if signal is post_delete else 'create' if created else 'update')
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, raw=False, **kwargs):
+    """Обновить дневные сводки при смене статуса заказа (в той же транзакции)"""
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created or raw or previous is None or previous == instance.status:
+        return
+    record_status_change(instance, previous, instance.status)
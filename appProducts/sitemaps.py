@@ -0,0 +1,236 @@
+"""
+Карта сайта: индекс sitemap.xml и файлы разделов в SITEMAP['ROOT'].
+
+Раздел catalog — главная, каталог и страницы категорий и подкатегорий.
+Товары разбиты на разделы products-<n> по диапазонам первичного ключа
+(по CHUNK_SIZE ключей, не больше 50 000 адресов в файле — ограничение
+протокола). Границы диапазонов не сдвигаются при удалении и скрытии
+товаров, поэтому изменение товара затрагивает только его раздел.
+
+Для каждого раздела одним запросом GROUP BY считается подпись: число
+товаров, сумма ключей и последний updated_at, а также подпись структуры
+каталога (slug категорий и подкатегорий входят в адреса товаров). Файл
+раздела перезаписывается, только если подпись изменилась. Адреса читаются
+потоком через values_list(...).iterator() без создания объектов моделей.
+
+Файлы строит команда build_sitemaps; представления отдают готовые файлы и
+не чаще раза в CHECK_INTERVAL секунд на все процессы обновляют их сами.
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max, Sum
+from django.http import FileResponse, Http404
+from django.urls import reverse
+
+from .models import Category, Product, Subcategory
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+MAX_URLS = 50000
+INDEX = 'sitemap.xml'
+STATE = 'state.json'
+CHECKED_KEY = 'sitemaps:checked'
+
+
+def _setting(name, default):
+    return getattr(settings, 'SITEMAP', {}).get(name, default)
+
+
+def _root():
+    return Path(_setting('ROOT', settings.BASE_DIR / 'var' / 'sitemaps'))
+
+
+def _absolute(path):
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def url_template(name, count):
+    """
+    Абсолютный адрес с подстановками {0}, {1}, ... для slug: reverse() на
+    каждый адрес раздела в несколько раз дороже всего остального.
+    """
+    markers = [f'slug{n}marker' for n in range(count)]
+    template = reverse(name, args=markers)
+    for n, marker in enumerate(markers):
+        template = template.replace(marker, f'{{{n}}}')
+    return _absolute(template)
+
+
+def _lastmod(value):
+    return value.isoformat(timespec='seconds') if value else None
+
+
+def _stamp(value):
+    # Для подписи нужна полная точность: правки в пределах секунды тоже должны её менять
+    return value.isoformat() if value else None
+
+
+def _active_products():
+    return Product.objects.filter(
+        is_active=True, subcategory__is_active=True, subcategory__category__is_active=True
+    )
+
+
+def _structure_signature():
+    """
+    Подпись категорий и подкатегорий и их последний updated_at: от них
+    зависят раздел catalog и адреса всех товаров.
+    """
+    parts = [
+        model.objects.aggregate(count=Count('pk'), ids=Sum('pk'), updated=Max('updated_at'))
+        for model in (Category, Subcategory)
+    ]
+    signature = ';'.join(f"{part['count']}:{part['ids']}:{_stamp(part['updated'])}" for part in parts)
+    return signature, max(filter(None, (part['updated'] for part in parts)), default=None)
+
+
+def _catalog_urls():
+    yield _absolute(reverse('home')), None
+    yield _absolute(reverse('appProducts:category_list')), None
+    yield _absolute(reverse('appProducts:all_products')), None
+    for slug, updated_at in Category.objects.filter(is_active=True).order_by('pk').values_list(
+        'slug', 'updated_at'
+    ).iterator(chunk_size=2000):
+        yield _absolute(reverse('appProducts:subcategory_list', args=[slug])), updated_at
+    for category_slug, slug, updated_at in Subcategory.objects.filter(
+        is_active=True, category__is_active=True
+    ).order_by('pk').values_list('category__slug', 'slug', 'updated_at').iterator(chunk_size=2000):
+        yield _absolute(reverse('appProducts:product_list', args=[category_slug, slug])), updated_at
+
+
+def _product_urls(chunk, chunk_size):
+    rows = _active_products().filter(
+        pk__gte=chunk * chunk_size, pk__lt=(chunk + 1) * chunk_size
+    ).order_by('pk').values_list(
+        'subcategory__category__slug', 'subcategory__slug', 'slug', 'updated_at'
+    ).iterator(chunk_size=_setting('QUERY_CHUNK_SIZE', 2000))
+    template = url_template('appProducts:product_detail', 3)
+    for category_slug, subcategory_slug, slug, updated_at in rows:
+        yield template.format(category_slug, subcategory_slug, slug), updated_at
+
+
+def _product_chunks(chunk_size):
+    """Подписи разделов товаров: {номер: (подпись, последний updated_at)}"""
+    rows = _active_products().annotate(
+        chunk=ExpressionWrapper(F('pk') / chunk_size, output_field=IntegerField())
+    ).values('chunk').annotate(count=Count('pk'), ids=Sum('pk'), updated=Max('updated_at')).order_by('chunk')
+    return {
+        row['chunk']: (f"{row['count']}:{row['ids']}:{_stamp(row['updated'])}", row['updated'])
+        for row in rows
+    }
+
+
+def _write_atomic(path, lines):
+    # Уникальный временный файл: сборку могут одновременно вести потоки одного процесса и команда
+    fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _urlset(urls):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'
+    for location, updated_at in urls:
+        lastmod = f'<lastmod>{_lastmod(updated_at)}</lastmod>' if updated_at else ''
+        yield f'<url><loc>{escape(location)}</loc>{lastmod}</url>\n'
+    yield '</urlset>\n'
+
+
+def _sitemap_index(sections):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for name, lastmod in sections:
+        location = escape(_absolute(reverse('sitemap_section', args=[name])))
+        lastmod = f'<lastmod>{_lastmod(lastmod)}</lastmod>' if lastmod else ''
+        yield f'<sitemap><loc>{location}</loc>{lastmod}</sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def build_sitemaps(force=False):
+    """
+    Перезаписывает файлы разделов с изменившейся подписью, удаляет файлы
+    исчезнувших разделов и обновляет индекс. Возвращает (разделов, перезаписано).
+    """
+    root = _root()
+    root.mkdir(parents=True, exist_ok=True)
+    try:
+        state = json.loads((root / STATE).read_text())
+    except FileNotFoundError:
+        state = {}
+    chunk_size = min(_setting('CHUNK_SIZE', MAX_URLS), MAX_URLS)
+    if state.get('chunk_size') != chunk_size:
+        state = {'chunk_size': chunk_size, 'sections': {}}
+
+    structure, catalog_lastmod = _structure_signature()
+    sections = {'catalog': (structure, catalog_lastmod, _catalog_urls)}
+    for chunk, (signature, lastmod) in sorted(_product_chunks(chunk_size).items()):
+        sections[f'products-{chunk}'] = (
+            f'{structure}|{signature}', lastmod, lambda chunk=chunk: _product_urls(chunk, chunk_size)
+        )
+
+    written = 0
+    for name, (signature, _, urls) in sections.items():
+        path = root / f'sitemap-{name}.xml'
+        if force or state['sections'].get(name) != signature or not path.exists():
+            _write_atomic(path, _urlset(urls()))
+            state['sections'][name] = signature
+            written += 1
+    for name in set(state['sections']) - set(sections):
+        (root / f'sitemap-{name}.xml').unlink(missing_ok=True)
+        del state['sections'][name]
+
+    _write_atomic(root / INDEX, _sitemap_index((name, lastmod) for name, (_, lastmod, _) in sections.items()))
+    _write_atomic(root / STATE, [json.dumps(state, indent=1)])
+    if written:
+        logger.info(f"Карта сайта: перезаписано разделов {written} из {len(sections)}")
+    return len(sections), written
+
+
+def _ensure_fresh():
+    index = _root() / INDEX
+    missing = not index.exists()
+    # add() удаётся одному процессу раз в CHECK_INTERVAL секунд, в том числе когда индекса ещё нет
+    if cache.add(CHECKED_KEY, 1, _setting('CHECK_INTERVAL', 600)):
+        try:
+            build_sitemaps()
+        except Exception:
+            if missing:
+                # Первая сборка не удалась: следующий запрос попробует снова
+                cache.delete(CHECKED_KEY)
+            raise
+        return
+    # Первую сборку ведёт другой запрос: ждём его индекс, а не строим карту параллельно
+    deadline = time.monotonic() + _setting('BUILD_WAIT', 30)
+    while missing and time.monotonic() < deadline:
+        time.sleep(0.1)
+        missing = not index.exists()
+
+
+def _serve(name):
+    try:
+        return FileResponse(open(_root() / name, 'rb'), content_type='application/xml')
+    except FileNotFoundError:
+        raise Http404("Раздел карты сайта не найден")
+
+
+def sitemap_index(request):
+    _ensure_fresh()
+    return _serve(INDEX)
+
+
+def sitemap_section(request, section):
+    _ensure_fresh()
+    return _serve(f'sitemap-{section}.xml')
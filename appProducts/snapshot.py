@@ -0,0 +1,281 @@
+"""
+Статическая копия страниц каталога для анонимных покупателей.
+
+Команда build_snapshot отрисовывает главную, каталог, страницы категорий,
+все страницы списков подкатегорий и карточки товаров в HTML-файлы
+SNAPSHOT['ROOT'] пулом процессов и рядом кладёт сжатые копии (.gz и .br,
+если установлен пакет brotli). Если сервер приложений недоступен, файловый
+сервер отдаёт страницы из копии, например в nginx:
+
+    location / {
+        root /srv/clean_store/var/snapshot;
+        gzip_static on;
+        try_files $uri/page-$arg_page.html $uri/index.html @app;
+    }
+
+Первый запуск строит всё. Дальше копия обновляется по журналу изменений
+каталога (потребитель 'snapshot'): перерисовываются только страницы,
+зависящие от изменённых объектов, а файлы удалённых и скрытых страниц
+удаляются. Какие файлы относятся к какой странице, записано в manifest.json.
+Остатки, просмотры и «похожие товары» меняются в обход журнала и
+обновляются при полной пересборке (build_snapshot --full).
+"""
+import functools
+import gzip
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from . import views
+from .catalog_cache import catalog_version, product_page
+from .change_feed import CHECKPOINT_PREFIX, latest_sequence, tail
+from .listings import PRODUCT_LIST_PER_PAGE
+from .models import Category, Checkpoint, Product, Subcategory
+from .warmup import anonymous_request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'snapshot'
+MANIFEST = 'manifest.json'
+
+
+def _setting(name, default):
+    return getattr(settings, 'SNAPSHOT', {}).get(name, default)
+
+
+def _file_path(url, page=1):
+    directory = url.strip('/')
+    name = 'index.html' if page == 1 else f'page-{page}.html'
+    return f'{directory}/{name}' if directory else name
+
+
+def _render_page(key):
+    """
+    Отрисовывает страницу по ключу: 'home', 'category_list', 'category:<id>',
+    'subcategory:<id>' (все страницы списка) или 'product:<id>'.
+
+    Возвращает (родительский ключ, [(путь файла, HTML)]); пустой список —
+    страницы больше нет.
+    """
+    kind, _, pk = key.partition(':')
+    if kind == 'home':
+        return None, [(_file_path('/'), views.home_view(anonymous_request('/')).content)]
+    if kind == 'category_list':
+        url = reverse('appProducts:category_list')
+        return None, [(_file_path(url), views.category_list(anonymous_request(url)).content)]
+
+    if kind == 'category':
+        category = Category.objects.filter(pk=pk, is_active=True).first()
+        if category is None:
+            return None, []
+        url = reverse('appProducts:subcategory_list', args=[category.slug])
+        return None, [(_file_path(url), views.subcategory_list(anonymous_request(url), category.slug).content)]
+
+    if kind == 'subcategory':
+        subcategory = Subcategory.objects.filter(
+            pk=pk, is_active=True, category__is_active=True
+        ).select_related('category').first()
+        if subcategory is None:
+            return None, []
+        slugs = (subcategory.category.slug, subcategory.slug)
+        url = reverse('appProducts:product_list', args=slugs)
+        count = Product.objects.filter(subcategory=subcategory, is_active=True).count()
+        pages = []
+        for page in range(1, max(math.ceil(count / PRODUCT_LIST_PER_PAGE), 1) + 1):
+            request = anonymous_request(url, f'page={page}' if page > 1 else '')
+            pages.append((_file_path(url, page), views.product_list(request, *slugs).content))
+        return f'category:{subcategory.category_id}', pages
+
+    # Карточка товара отрисовывается без представления, чтобы не засчитывать просмотр
+    product = Product.objects.filter(pk=pk).select_related('subcategory__category').first()
+    if product is None:
+        return None, []
+    parent = f'subcategory:{product.subcategory_id}'
+    slugs = (product.subcategory.category.slug, product.subcategory.slug, product.slug)
+    page = product_page(*slugs) if product.subcategory.is_active and product.subcategory.category.is_active else None
+    if page is None:
+        return parent, []
+    url = reverse('appProducts:product_detail', args=slugs)
+    html = render_to_string(
+        'appProducts/product_detail.html',
+        {**page, 'catalog_version': catalog_version()},
+        request=anonymous_request(url),
+    )
+    return parent, [(_file_path(url), html.encode())]
+
+
+def _write(path, data):
+    """Записывает файл атомарно; одинаковое содержимое не перезаписывается"""
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def _variants(name, html):
+    yield name, html
+    # Максимальное сжатие: файлы сжимаются один раз, а отдаются много раз
+    yield f'{name}.gz', gzip.compress(html, compresslevel=9, mtime=0)
+    if brotli is not None and _setting('BROTLI', True):
+        yield f'{name}.br', brotli.compress(html)
+
+
+def build_page(root, key):
+    """Отрисовывает страницу и записывает её файлы; выполняется в процессе пула"""
+    root = Path(root)
+    parent, pages = _render_page(key)
+    written = 0
+    for name, html in pages:
+        for variant, data in _variants(name, html):
+            written += _write(root / variant, data)
+    return key, parent, [name for name, _ in pages], written
+
+
+class Snapshot:
+    def __init__(self, root=None, workers=None):
+        self.root = Path(root or _setting('ROOT', settings.BASE_DIR / 'var' / 'snapshot'))
+        self.workers = workers or _setting('WORKERS', os.cpu_count() or 1)
+        self.manifest_path = self.root / MANIFEST
+        try:
+            self.manifest = json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            self.manifest = {}
+        self.stats = {'pages': 0, 'files_written': 0, 'files_removed': 0}
+
+    def all_keys(self):
+        keys = ['home', 'category_list']
+        keys += [f'category:{pk}' for pk in Category.objects.filter(is_active=True).values_list('pk', flat=True)]
+        keys += [
+            f'subcategory:{pk}' for pk in Subcategory.objects.filter(
+                is_active=True, category__is_active=True
+            ).values_list('pk', flat=True)
+        ]
+        keys += [
+            f'product:{pk}' for pk in Product.objects.filter(
+                is_active=True, subcategory__is_active=True, subcategory__category__is_active=True
+            ).values_list('pk', flat=True)
+        ]
+        return keys
+
+    def _children(self, key, model_filter):
+        """Дочерние ключи по базе и по манифесту (объект мог переехать или исчезнуть)"""
+        kind = 'subcategory' if key.startswith('category:') else 'product'
+        model = Subcategory if kind == 'subcategory' else Product
+        children = {f'{kind}:{pk}' for pk in model.objects.filter(**model_filter).values_list('pk', flat=True)}
+        children |= {child for child, entry in self.manifest.items() if entry.get('parent') == key}
+        return children
+
+    def affected_keys(self, changes):
+        """Страницы, которые нужно перерисовать после пачки изменений журнала"""
+        keys = {'home', 'category_list'}
+        for change in changes:
+            key = f'{change.entity}:{change.entity_id}'
+            if change.entity == 'category':
+                keys.add(key)
+                for subcategory in self._children(key, {'category_id': change.entity_id}):
+                    keys.add(subcategory)
+                    keys |= self._children(subcategory, {'subcategory_id': subcategory.partition(':')[2]})
+            elif change.entity == 'subcategory':
+                keys.add(key)
+                keys |= self._children(key, {'subcategory_id': change.entity_id})
+                keys |= {
+                    f'category:{pk}' for pk in
+                    Subcategory.objects.filter(pk=change.entity_id).values_list('category_id', flat=True)
+                }
+                if self.manifest.get(key, {}).get('parent'):
+                    keys.add(self.manifest[key]['parent'])
+            elif change.entity == 'product':
+                keys.add(key)
+                keys |= {
+                    f'subcategory:{pk}' for pk in
+                    Product.objects.filter(pk=change.entity_id).values_list('subcategory_id', flat=True)
+                }
+                if self.manifest.get(key, {}).get('parent'):
+                    keys.add(self.manifest[key]['parent'])
+        return keys
+
+    def build(self, keys):
+        """Перерисовывает страницы и удаляет файлы исчезнувших страниц"""
+        keys = sorted(keys)
+        if self.workers > 1 and len(keys) > 1:
+            # Рабочие наследуют загруженное приложение, но не соединения с базой
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(self.workers) as pool:
+                build = functools.partial(build_page, str(self.root))
+                results = list(pool.imap_unordered(build, keys, chunksize=8))
+        else:
+            results = [build_page(self.root, key) for key in keys]
+
+        for key, parent, files, written in results:
+            old_files = set(self.manifest.get(key, {}).get('files', []))
+            self._remove(old_files - set(files))
+            if files:
+                self.manifest[key] = {'parent': parent, 'files': files}
+            else:
+                self.manifest.pop(key, None)
+            self.stats['pages'] += len(files)
+            self.stats['files_written'] += written
+        self._save_manifest()
+
+    def _remove(self, names):
+        for name in names:
+            for variant in (name, f'{name}.gz', f'{name}.br'):
+                try:
+                    (self.root / variant).unlink()
+                    self.stats['files_removed'] += 1
+                except FileNotFoundError:
+                    pass
+
+    def _save_manifest(self):
+        _write(self.manifest_path, json.dumps(self.manifest, sort_keys=True, indent=1).encode())
+
+    def full_build(self):
+        # Позиция журнала берётся до отрисовки: изменения во время сборки попадут в следующую
+        position = latest_sequence()
+        keys = self.all_keys()
+        self._remove_missing(set(keys))
+        self.build(keys)
+        Checkpoint.objects.update_or_create(name=CHECKPOINT_PREFIX + CONSUMER, defaults={'position': position})
+
+    def _remove_missing(self, keys):
+        for key in set(self.manifest) - keys:
+            self._remove(self.manifest.pop(key)['files'])
+
+    def update(self):
+        """Перерисовывает страницы по журналу изменений; возвращает число записей журнала"""
+        return tail(CONSUMER, lambda changes: self.build(self.affected_keys(changes)))
+
+
+def build_snapshot(root=None, workers=None, full=False):
+    """Полная сборка при первом запуске или --full, иначе обновление по журналу"""
+    started = time.perf_counter()
+    snapshot = Snapshot(root, workers)
+    checkpoint = Checkpoint.objects.filter(name=CHECKPOINT_PREFIX + CONSUMER).first()
+    if full or not snapshot.manifest or checkpoint is None:
+        snapshot.full_build()
+        changes = None
+    else:
+        changes = snapshot.update()
+    snapshot.stats['seconds'] = time.perf_counter() - started
+    snapshot.stats['changes'] = changes
+    logger.info(f"Статическая копия каталога обновлена: {snapshot.stats}")
+    return snapshot.stats
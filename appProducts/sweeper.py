@@ -0,0 +1,116 @@
+"""
+Очистка истёкших сессий, брошенных корзин и завершённых фоновых задач.
+
+Удаление идёт маленькими пачками по индексированным полям
+(Session.expire_date, CartItem.updated_at, Job.status) с паузой между пачками: каждая
+пачка — короткая отдельная транзакция, поэтому блокировка записи SQLite не
+задерживает оформление заказов. Запускается командой sweep_stale_data или
+фоновой задачей maintenance.sweep_stale_data, которая сама ставит себя в
+очередь на следующий запуск.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db.models import Q
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import CartItem, Job
+
+logger = logging.getLogger(__name__)
+
+SWEEP_TASK = 'maintenance.sweep_stale_data'
+
+
+def _setting(name, default):
+    return getattr(settings, 'SWEEPER', {}).get(name, default)
+
+
+def _delete_in_batches(next_batch, delete_batch, batch_size, pause, max_batches=None):
+    deleted = batches = 0
+    while max_batches is None or batches < max_batches:
+        keys = list(next_batch(batch_size))
+        if not keys:
+            break
+        delete_batch(keys)
+        deleted += len(keys)
+        batches += 1
+        if len(keys) < batch_size:
+            break
+        time.sleep(pause)
+    return deleted
+
+
+def sweep_sessions(batch_size=None, pause=None, max_batches=None):
+    """Удаляет сессии с истёкшим сроком действия"""
+    now = timezone.now()
+    return _delete_in_batches(
+        lambda limit: Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:limit],
+        lambda keys: Session.objects.filter(session_key__in=keys).delete(),
+        batch_size or _setting('BATCH_SIZE', 200),
+        _setting('PAUSE', 0.2) if pause is None else pause,
+        max_batches,
+    )
+
+
+def stale_cart_users(cutoff):
+    """Пользователи, в корзине которых ничего не менялось с момента cutoff"""
+    active_users = CartItem.objects.filter(updated_at__gte=cutoff).values('user_id')
+    return (
+        CartItem.objects.filter(updated_at__lt=cutoff)
+        .exclude(user_id__in=active_users)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+
+def sweep_carts(ttl_days=None, batch_size=None, pause=None, max_batches=None):
+    """Очищает корзины, не менявшиеся ttl_days дней; корзина удаляется целиком"""
+    cutoff = timezone.now() - timedelta(days=ttl_days or _setting('CART_TTL_DAYS', 30))
+    # Пачка — это пользователи, а не позиции, чтобы корзина не удалялась частями
+    return _delete_in_batches(
+        lambda limit: stale_cart_users(cutoff)[:limit],
+        lambda user_ids: CartItem.objects.filter(user_id__in=user_ids, updated_at__lt=cutoff).delete(),
+        batch_size or _setting('BATCH_SIZE', 200),
+        _setting('PAUSE', 0.2) if pause is None else pause,
+        max_batches,
+    )
+
+
+def sweep_jobs(done_ttl_days=None, dead_ttl_days=None, batch_size=None, pause=None, max_batches=None):
+    """
+    Удаляет выполненные задачи старше done_ttl_days дней и невыполненные
+    старше dead_ttl_days: последние хранятся дольше, чтобы успеть разобрать ошибку.
+    """
+    now = timezone.now()
+    done_cutoff = now - timedelta(days=_setting('JOB_DONE_TTL_DAYS', 7) if done_ttl_days is None else done_ttl_days)
+    dead_cutoff = now - timedelta(days=_setting('JOB_DEAD_TTL_DAYS', 30) if dead_ttl_days is None else dead_ttl_days)
+    finished = Job.objects.filter(
+        Q(status='done', updated_at__lt=done_cutoff) | Q(status='dead', updated_at__lt=dead_cutoff)
+    )
+    return _delete_in_batches(
+        lambda limit: finished.values_list('pk', flat=True)[:limit],
+        lambda keys: Job.objects.filter(pk__in=keys).delete(),
+        batch_size or _setting('BATCH_SIZE', 200),
+        _setting('PAUSE', 0.2) if pause is None else pause,
+        max_batches,
+    )
+
+
+def sweep_stale_data(**options):
+    sessions = sweep_sessions(**options)
+    carts = sweep_carts(**options)
+    jobs = sweep_jobs(**options)
+    logger.info(f"Очистка: удалено сессий {sessions}, брошенных корзин {carts}, завершённых задач {jobs}")
+    return sessions, carts, jobs
+
+
+def schedule_sweeper(delay=None):
+    """Ставит в очередь следующий запуск очистки, если он ещё не запланирован"""
+    if Job.objects.filter(name=SWEEP_TASK, status='queued').exists():
+        return False
+    enqueue(SWEEP_TASK, delay=delay or timedelta(seconds=_setting('INTERVAL', 3600)))
+    return True
@@ -0,0 +1,98 @@
+"""
+Фоновые задачи магазина, выполняемые командой run_jobs
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import mail_admins, send_mail
+
+from .jobs import task
+from .models import Order, ContactMessage
+from .rankings import refresh_sales_stats
+from .sweeper import SWEEP_TASK, schedule_sweeper, sweep_stale_data
+
+logger = logging.getLogger(__name__)
+
+
+@task('orders.send_confirmation')
+def send_order_confirmation(order_id):
+    """Письмо покупателю с подтверждением заказа"""
+    order = Order.objects.select_related('user').get(pk=order_id)
+    if not order.user or not order.user.email:
+        return
+    lines = [
+        f"{item.product.name} × {item.quantity} — {item.line_total}"
+        for item in order.items.select_related('product')
+    ]
+    send_mail(
+        subject=f"Заказ №{order.id} принят",
+        message=(
+            f"Здравствуйте, {order.first_name}!\n\n"
+            f"Ваш заказ №{order.id} принят в обработку.\n\n"
+            + "\n".join(lines)
+            + f"\n\nИтого: {order.total_price}\n"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[order.user.email],
+    )
+    logger.info(f"Отправлено подтверждение заказа #{order.id}")
+
+
+@task('orders.notify_admins')
+def notify_admins_about_order(order_id):
+    """Уведомление администраторов о новом заказе"""
+    order = Order.objects.get(pk=order_id)
+    mail_admins(
+        subject=f"Новый заказ №{order.id}",
+        message=(
+            f"{order.first_name} {order.last_name}, {order.phone}\n"
+            f"Товаров: {order.items_count}, сумма: {order.total_price}\n"
+            f"Адрес: {order.address}"
+        ),
+    )
+
+
+@task('contact.notify_admins')
+def notify_admins_about_message(message_id):
+    """Уведомление администраторов о новом обращении"""
+    message = ContactMessage.objects.get(pk=message_id)
+    mail_admins(
+        subject=f"Новое обращение: {message.get_category_display()}",
+        message=(
+            f"{message.name} <{message.email}> {message.phone}\n"
+            f"Тема: {message.subject or 'Без темы'}\n\n"
+            f"{message.message}"
+        ),
+    )
+
+
+@task('contact.notify_admins_batch')
+def notify_admins_about_messages(message_ids):
+    """Одно уведомление администраторов о пачке обращений из буфера"""
+    contact_messages = ContactMessage.objects.filter(pk__in=message_ids).order_by('created_at')
+    if not contact_messages:
+        return
+    mail_admins(
+        subject=f"Новые обращения: {len(contact_messages)}",
+        message="\n\n".join(
+            f"[{message.get_category_display()}] {message.name} <{message.email}> {message.phone}\n"
+            f"Тема: {message.subject or 'Без темы'}\n{message.message}"
+            for message in contact_messages
+        ),
+    )
+
+
+@task('sales.refresh_stats')
+def refresh_sales_rankings():
+    """Пересчёт рейтинга продаж и меток «Хит продаж»"""
+    refresh_sales_stats()
+
+
+@task(SWEEP_TASK)
+def sweep_stale_data_periodically():
+    """Очистка сессий, корзин и завершённых задач; следующий запуск ставится в очередь сразу"""
+    try:
+        # Ограничиваем объём одного запуска, чтобы задача не занимала воркер надолго
+        sweep_stale_data(max_batches=getattr(settings, 'SWEEPER', {}).get('MAX_BATCHES_PER_RUN', 50))
+    finally:
+        schedule_sweeper()
@@ -1,9 +1,18 @@
 from django import template
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 register = template.Library()
 
 
+def _to_decimal(value):
+    """Приводит число к Decimal без лишнего преобразования через строку"""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    return Decimal(str(value))
+
+
 @register.filter
 def multiply(value, arg):
     """
@@ -12,9 +21,9 @@ def multiply(value, arg):
     """
     try:
         if hasattr(value, 'amount'):  # MoneyField
-            return Decimal(str(value.amount)) * Decimal(str(arg))
-        return Decimal(str(value)) * Decimal(str(arg))
-    except (ValueError, TypeError, AttributeError):
+            value = value.amount
+        return _to_decimal(value) * _to_decimal(arg)
+    except (ValueError, TypeError, AttributeError, InvalidOperation):
         return 0
 
 
@@ -46,10 +55,7 @@ def get_total_price(cart_items):
     Использование: {{ cart_items|get_total_price }}
     """
     try:
-        total = sum(
-            item.product.price.amount * item.quantity 
-            for item in cart_items
-        )
+        total = sum(_line_total(item) for item in cart_items)
         # Если число целое, не показываем десятичные знаки
         if total == int(total):
             return f"{int(total):,} ₽".replace(',', ' ')
@@ -59,13 +65,21 @@ def get_total_price(cart_items):
         return "0 ₽"
 
 
+def _line_total(item):
+    """Сумма позиции: рассчитанная движком акций или цена × количество"""
+    line_total = getattr(item, 'line_total', None)
+    if line_total is not None:
+        return line_total
+    return item.product.price.amount * item.quantity
+
+
 @register.simple_tag
 def cart_item_total(item):
     """
-    Вычисляет стоимость одной позиции в корзине.
+    Вычисляет стоимость одной позиции в корзине с учётом акций.
     Использование: {% cart_item_total item %}
     """
     try:
-        return item.product.price.amount * item.quantity
+        return _line_total(item)
     except (AttributeError, TypeError):
         return 0
@@ -0,0 +1,405 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import OperationalError, connection
+from django.forms.models import model_to_dict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .admin import ProductAdmin
+from .cache_backend import SQLiteCache
+from .catalog_cache import catalog_version, get_or_build, invalidate_catalog
+from .feeds import feed_items
+from .inventory import InsufficientStock, reserve_stock
+from .listings import product_list_queryset
+from .models import CartItem, Category, Order, Product, ProductSalesStats, Subcategory
+from .session_store import SessionStore
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ReserveStockConcurrencyTest(TransactionTestCase):
+    """
+    Параллельные оформления одного товара: каждый поток резервирует товар
+    в своём соединении с файловой тестовой базой.
+    """
+    workers = 24
+    stock = 10
+
+    def setUp(self):
+        category = Category.objects.create(title='Test category', slug='test-category')
+        subcategory = Subcategory.objects.create(category=category, title='Test subcategory', slug='test-subcategory')
+        self.product = Product.objects.create(
+            name='Test product', slug='test-product', subcategory=subcategory,
+            main_image='main/test.jpg', price=100, stock=self.stock,
+        )
+
+    def _buy_concurrently(self, quantity):
+        results = {'reserved': 0, 'rejected': 0, 'locked': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.workers)
+
+        def buyer():
+            barrier.wait()
+            try:
+                reserve_stock([(self.product.pk, quantity)])
+                outcome = 'reserved'
+            except InsufficientStock:
+                outcome = 'rejected'
+            except OperationalError:
+                outcome = 'locked'
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        threads = [threading.Thread(target=buyer) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_no_oversell(self):
+        results = self._buy_concurrently(1)
+        self.product.refresh_from_db()
+        self.assertEqual(results['locked'], 0)
+        self.assertEqual(results['reserved'], self.stock)
+        self.assertEqual(results['rejected'], self.workers - self.stock)
+        self.assertEqual(self.product.stock, 0)
+
+    def test_remainder_is_consistent(self):
+        results = self._buy_concurrently(3)
+        self.product.refresh_from_db()
+        self.assertEqual(results['locked'], 0)
+        self.assertEqual(results['reserved'], self.stock // 3)
+        self.assertEqual(self.product.stock, self.stock - results['reserved'] * 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AdminStockEditTest(TestCase):
+    """Сохранение товара в админке не возвращает списания, сделанные после открытия формы"""
+
+    def setUp(self):
+        # Проверка размера изображения при валидации формы читает файл
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, 'main'))
+        open(os.path.join(media_root, 'main', 'test.jpg'), 'wb').close()
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+        category = Category.objects.create(title='Test category', slug='test-category')
+        subcategory = Subcategory.objects.create(category=category, title='Test subcategory', slug='test-subcategory')
+        self.product = Product.objects.create(
+            name='Test product', slug='test-product', subcategory=subcategory,
+            main_image='main/test.jpg', price=100, stock=10,
+        )
+        self.request = RequestFactory().post('/admin/')
+        self.request.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.admin = ProductAdmin(Product, site)
+
+    def _save(self, **changes):
+        # Форма загружена до оформления заказа, сохраняется после
+        obj = Product.objects.get(pk=self.product.pk)
+        form_class = self.admin.get_form(self.request, obj, change=True)
+        initial = form_class(instance=obj).initial
+        reserve_stock([(self.product.pk, 3)])
+        data = {key: value for key, value in model_to_dict(obj).items() if value is not None and key != 'main_image'}
+        data.update({'price_0': '100', 'price_1': 'RUB', **changes})
+        form = form_class(data, instance=obj, initial=initial)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.admin.save_model(self.request, form.save(commit=False), form, change=True)
+        self.product.refresh_from_db()
+
+    def test_untouched_stock_keeps_reservations(self):
+        self._save(name='Renamed product')
+        self.assertEqual(self.product.name, 'Renamed product')
+        self.assertEqual(self.product.stock, 7)
+
+    def test_stock_edit_is_applied_as_delta(self):
+        self._save(stock=15)
+        self.assertEqual(self.product.stock, 12)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CheckoutIdempotencyTest(TestCase):
+    """Повторная отправка оформления с тем же ключом возвращает уже созданный заказ"""
+
+    def setUp(self):
+        category = Category.objects.create(title='Test category', slug='test-category')
+        subcategory = Subcategory.objects.create(category=category, title='Test subcategory', slug='test-subcategory')
+        product = Product.objects.create(
+            name='Test product', slug='test-product', subcategory=subcategory,
+            main_image='main/test.jpg', price=100, stock=10,
+        )
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        CartItem.objects.create(user=user, product=product, quantity=2)
+        self.client.force_login(user)
+        self.form = {
+            'first_name': 'Иван', 'last_name': 'Петров', 'phone': '+79001234567', 'address': 'Москва',
+        }
+
+    def _checkout_twice(self, data, headers=None):
+        first = self.client.post(reverse('appProducts:checkout'), data, headers=headers)
+        second = self.client.post(reverse('appProducts:checkout'), data, headers=headers)
+        order = Order.objects.get()
+        expected = f"{reverse('appProducts:order_success')}?order={order.id}"
+        self.assertRedirects(first, expected, fetch_redirect_response=False)
+        self.assertRedirects(second, expected, fetch_redirect_response=False)
+        return order
+
+    def test_key_in_form(self):
+        order = self._checkout_twice({**self.form, 'idempotency_key': 'form-key'})
+        self.assertEqual(order.idempotency_key, 'form-key')
+
+    def test_key_in_header(self):
+        order = self._checkout_twice(self.form, headers={'Idempotency-Key': 'header-key'})
+        self.assertEqual(order.idempotency_key, 'header-key')
+
+
+class BestsellerListingTest(TestCase):
+    """Сортировка по продажам: проданные по рейтингу, остальные по названию, постранично"""
+
+    def setUp(self):
+        category = Category.objects.create(title='Test category', slug='test-category')
+        self.subcategory = Subcategory.objects.create(
+            category=category, title='Test subcategory', slug='test-subcategory'
+        )
+        units = {'Delta': 5, 'Echo': 9, 'Alpha': None, 'Charlie': None, 'Bravo': 7, 'Hidden': 50}
+        for name, sold in units.items():
+            product = Product.objects.create(
+                name=name, slug=name.lower(), subcategory=self.subcategory,
+                main_image='main/test.jpg', price=100, is_active=name != 'Hidden',
+            )
+            if sold:
+                ProductSalesStats.objects.create(
+                    product=product, category=category, subcategory=self.subcategory, units_30d=sold
+                )
+
+    def test_order_across_pages(self):
+        listing = product_list_queryset(self.subcategory, None, 'bestsellers')
+        paginator = Paginator(listing, 2)
+        self.assertEqual(paginator.count, 5)
+        names = [product.name for number in paginator.page_range for product in paginator.page(number)]
+        self.assertEqual(names, ['Echo', 'Bravo', 'Delta', 'Alpha', 'Charlie'])
+
+
+class IncrementalFeedTest(TestCase):
+    """Фид с since получает товар, раскупленный через reserve_stock"""
+
+    def test_sold_out_product_is_unavailable(self):
+        category = Category.objects.create(title='Test category', slug='test-category')
+        subcategory = Subcategory.objects.create(category=category, title='Test subcategory', slug='test-subcategory')
+        product = Product.objects.create(
+            name='Test product', slug='test-product', subcategory=subcategory,
+            main_image='main/test.jpg', price=100, stock=1,
+        )
+        time.sleep(0.01)
+        since = timezone.now()
+        self.assertEqual(list(feed_items(since)), [])
+        time.sleep(0.01)
+        reserve_stock([(product.pk, 1)])
+        items = list(feed_items(since))
+        self.assertEqual([(item['id'], item['available']) for item in items], [(product.pk, False)])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CatalogChangeAtomicityTest(TransactionTestCase):
+    """Изменение каталога и запись журнала фиксируются вместе и без внешнего atomic()"""
+
+    def setUp(self):
+        category = Category.objects.create(title='Test category', slug='test-category')
+        subcategory = Subcategory.objects.create(category=category, title='Test subcategory', slug='test-subcategory')
+        self.product = Product.objects.create(
+            name='Test product', slug='test-product', subcategory=subcategory,
+            main_image='main/test.jpg', price=100,
+        )
+
+    def test_failed_journal_write_rolls_back_save(self):
+        self.product.name = 'Renamed product'
+        with mock.patch('appProducts.signals.record_change', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.product.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).name, 'Test product')
+
+    def test_failed_journal_write_rolls_back_delete(self):
+        with mock.patch('appProducts.signals.record_change', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.product.delete()
+        self.assertTrue(Product.objects.filter(pk=self.product.pk).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SessionStoreTest(TransactionTestCase):
+    """Сессии с общим кэшем чтения: пропуск пустой записи, слияние и удаление"""
+
+    def setUp(self):
+        store = SessionStore()
+        store['cart'] = 1
+        store.create()
+        self.session_key = store.session_key
+
+    def _load(self):
+        store = SessionStore(self.session_key)
+        store._get_session()
+        return store
+
+    def test_unchanged_session_is_not_written(self):
+        store = self._load()
+        with self.assertNumQueries(0):
+            store.save()
+
+    def test_concurrent_write_is_merged(self):
+        first, second = self._load(), self._load()
+        first['messages'] = ['saved']
+        first.save()
+        second['cart'] = 2
+        second.save()
+        data = SessionStore(self.session_key)._get_session_from_db().get_decoded()
+        self.assertEqual(data, {'cart': 2, 'messages': ['saved']})
+
+    def test_delete_reaches_other_stores(self):
+        self._load()
+        SessionStore(self.session_key).delete()
+        self.assertEqual(self._load()._session_cache, {})
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Общий кэш в файле SQLite: сроки, атомарный incr между процессами, вытеснение"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.location = os.path.join(directory, 'cache.sqlite3')
+
+    def _cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_add_set_get_and_expiry(self):
+        cache = self._cache()
+        cache.set('key', {'value': 1}, 0.2)
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertFalse(cache.add('key', 'other'))
+        time.sleep(0.3)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'other'))
+        self.assertEqual(cache.get('key'), 'other')
+        cache.delete('key')
+        self.assertEqual(cache.get('key', 'missing'), 'missing')
+
+    def test_incr_is_atomic_across_processes(self):
+        cache = self._cache()
+        cache.set('counter', 0, None)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_increment, args=(self.location, 200)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(cache.get('counter'), 800)
+
+    def test_cull_keeps_recently_read_keys(self):
+        cache = self._cache(MAX_ENTRIES=10, ACCESS_RESOLUTION=0)
+        for n in range(10):
+            cache.set(f'key-{n}', n)
+            time.sleep(0.002)
+        for n in range(10, 20):
+            # Часто читаемый ключ
+            self.assertEqual(cache.get('key-0'), 0)
+            time.sleep(0.002)
+            cache.set(f'key-{n}', n)
+        self.assertLessEqual(cache.stats()['entries'], 10)
+        self.assertEqual(cache.get('key-0'), 0)
+        self.assertIsNone(cache.get('key-1'))
+
+    def test_cull_by_size(self):
+        cache = self._cache(MAX_SIZE=10 * 1024)
+        for n in range(30):
+            cache.set(f'key-{n}', b'x' * 1024)
+        self.assertLessEqual(cache.stats()['bytes'], 10 * 1024)
+        self.assertIsNotNone(cache.get('key-29'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class GetOrBuildTest(SimpleTestCase):
+    """Защита кэша каталога от лавины пересчётов"""
+
+    def setUp(self):
+        cache.clear()
+
+    def _concurrently(self, count, func):
+        results = []
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            results.append(func())
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_rebuild_per_key(self):
+        builds = []
+
+        def builder():
+            builds.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = self._concurrently(10, lambda: get_or_build('catalog:test', builder))
+        self.assertEqual(results, ['value'] * 10)
+        self.assertEqual(len(builds), 1)
+
+    def test_stale_value_served_during_rebuild(self):
+        get_or_build('catalog:test', lambda: 'old')
+        invalidate_catalog()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_builder():
+            started.set()
+            release.wait(5)
+            return 'new'
+
+        rebuild = threading.Thread(target=get_or_build, args=('catalog:test', slow_builder))
+        rebuild.start()
+        self.assertTrue(started.wait(5))
+        self.assertEqual(get_or_build('catalog:test', lambda: self.fail('второй пересчёт')), 'old')
+        release.set()
+        rebuild.join()
+        self.assertEqual(get_or_build('catalog:test', lambda: self.fail('значение не обновилось')), 'new')
+
+    @override_settings(CATALOG_CACHE={'LOCK_WAIT': 0.1})
+    def test_builds_without_lock_after_wait(self):
+        cache.add('catalog:test:lock', 1, 30)
+        with self.assertLogs('appProducts.catalog_cache', 'WARNING'):
+            self.assertEqual(get_or_build('catalog:test', lambda: 'value'), 'value')
+
+    def test_early_refresh_before_expiry(self):
+        # Запись истекает через секунду, а пересчёт занимает секунду
+        cache.set('catalog:test', (catalog_version(), 'old', time.time() + 1, 1.0), None)
+        with mock.patch('appProducts.catalog_cache.random.random', return_value=0.0):
+            self.assertEqual(get_or_build('catalog:test', lambda: 'new'), 'old')
+        with mock.patch('appProducts.catalog_cache.random.random', return_value=0.999):
+            self.assertEqual(get_or_build('catalog:test', lambda: 'new'), 'new')
@@ -1,21 +1,28 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, feeds, views
+
+# Под ASGI страницы каталога обслуживают асинхронные версии
+catalog = async_views if settings.ASYNC_CATALOG_VIEWS else views
 
 app_name = 'appProducts'
 
 urlpatterns = [
-    path('', views.category_list, name='category_list'),
-    path('all-products/', views.all_products, name='all_products'),
+    path('', catalog.category_list, name='category_list'),
+    path('all-products/', catalog.all_products, name='all_products'),
     path('cart/', views.cart_view, name='cart'),
     path('cart/update/<int:item_id>/', views.update_cart, name='update_cart'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/clear/', views.clear_cart, name='clear_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('contact/', views.contact_view, name='contact'),
+    path('feed.<str:fmt>', feeds.product_feed, name='product_feed'),
     path('order/success/', views.order_success, name='order_success'),
+    path('orders/', views.order_history, name='order_history'),
+    path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     
-    path('<slug:category_slug>/', views.subcategory_list, name='subcategory_list'),
-    path('<slug:category_slug>/<slug:subcategory_slug>/', views.product_list, name='product_list'),
-    path('<slug:category_slug>/<slug:subcategory_slug>/<slug:product_slug>/', views.product_detail, name='product_detail'),
+    path('<slug:category_slug>/', catalog.subcategory_list, name='subcategory_list'),
+    path('<slug:category_slug>/<slug:subcategory_slug>/', catalog.product_list, name='product_list'),
+    path('<slug:category_slug>/<slug:subcategory_slug>/<slug:product_slug>/', catalog.product_detail, name='product_detail'),
 ]
\ No newline at end of file
@@ -1,15 +1,30 @@
 import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from django.db import transaction
+from django.urls import reverse
+from django.db import transaction, IntegrityError
 from django.core.exceptions import ValidationError
-from django.db.models import Sum, F, Prefetch
+from django.db.models import Q, Prefetch
 from django.views.decorators.cache import cache_page
 from django.views.decorators.http import require_http_methods, require_POST
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 import json
 from .models import Category, Subcategory, Product, CartItem, Order, OrderItem, ContactMessage
 from .forms import OrderForm, ContactForm
+from .inventory import reserve_stock, InsufficientStock
+from .pricing import price_cart
+from .jobs import enqueue
+from . import intake
+from .counters import product_views
+from .catalog_cache import (
+    cache_key, catalog_tree, catalog_version, get_or_build, home_page, listing_page, params_key, product_page,
+)
+from .listings import (
+    ALL_PRODUCTS_PER_PAGE, PRODUCT_LIST_PER_PAGE, all_products_filters, all_products_listing, all_products_params,
+    all_products_queryset, product_list_listing, product_list_queryset, search_results,
+)
+from .analytics import record_new_order
+from .retry import retry_on_lock
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
@@ -21,121 +36,48 @@ def category_list(request):
     
     if search_query:
         # Поиск по товарам
-        products = Product.objects.filter(
-            name__icontains=search_query,
-            is_active=True
-        ).select_related('subcategory__category').prefetch_related('images')[:20]
-        
-        categories = Category.objects.filter(is_active=True).prefetch_related(
-            Prefetch(
-                'subcategories',
-                queryset=Subcategory.objects.filter(is_active=True)
-            )
-        ).order_by('title')
+        products = search_results(search_query)
         
         return render(request, 'appProducts/category_list.html', {
-            'categories': categories,
+            'categories': catalog_tree(),
             'search_query': search_query,
             'search_results': products,
             'search_count': products.count()
         })
     else:
-        categories = Category.objects.filter(is_active=True).prefetch_related(
-            Prefetch(
-                'subcategories',
-                queryset=Subcategory.objects.filter(is_active=True)
-            )
-        ).order_by('title')
-        
         return render(request, 'appProducts/category_list.html', {
-            'categories': categories
+            'categories': catalog_tree()
         })
 
 
 def all_products(request):
     """Страница всех товаров с фильтрацией и сортировкой"""
-    # Получаем параметры фильтрации
-    category_filter = request.GET.get('category', '')
-    subcategory_filter = request.GET.get('subcategory', '')
-    sort_by = request.GET.get('sort', 'name')
-    search_query = request.GET.get('search', '').strip()
-    
-    # Базовый queryset
-    products = Product.objects.filter(is_active=True).select_related(
-        'subcategory__category'
-    ).prefetch_related('images')
-    
-    # Применяем фильтры
-    if search_query:
-        products = products.filter(name__icontains=search_query)
-    
-    if category_filter:
-        products = products.filter(subcategory__category__slug=category_filter)
-    
-    if subcategory_filter:
-        products = products.filter(subcategory__slug=subcategory_filter)
+    params = all_products_params(request.GET)
+    products = all_products_queryset(**params)
     
-    # Применяем сортировку
-    sort_options = {
-        'name': 'name',
-        'price_asc': 'price',
-        'price_desc': '-price',
-        'newest': '-created_at',
-        'popular': '-views_count',
-    }
-    
-    if sort_by in sort_options:
-        products = products.order_by(sort_options[sort_by])
-    else:
-        products = products.order_by('name')
-    
-    # Пагинация
-    paginator = Paginator(products, 24)  # 24 товара на страницу
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Получаем категории и подкатегории для фильтров
-    categories = Category.objects.filter(is_active=True).order_by('title')
-    subcategories = Subcategory.objects.filter(is_active=True).order_by('title')
-    
-    # Если выбрана категория, показываем только её подкатегории
-    if category_filter:
-        subcategories = subcategories.filter(category__slug=category_filter)
-    
-    # Получаем названия выбранных фильтров для отображения
-    current_category_name = None
-    current_subcategory_name = None
-    
-    if category_filter:
-        try:
-            current_category_obj = categories.get(slug=category_filter)
-            current_category_name = current_category_obj.title
-        except Category.DoesNotExist:
-            pass
+    # Пагинация: число товаров и страница из кэша каталога
+    page_obj = listing_page(all_products_listing(params), products, ALL_PRODUCTS_PER_PAGE, request.GET.get('page'))
     
-    if subcategory_filter:
-        try:
-            current_subcategory_obj = subcategories.get(slug=subcategory_filter)
-            current_subcategory_name = current_subcategory_obj.title
-        except Subcategory.DoesNotExist:
-            pass
+    filters = get_or_build(
+        cache_key('all_products_filters', params_key(category=params['category'], subcategory=params['subcategory'])),
+        lambda: all_products_filters(params['category'], params['subcategory']),
+    )
     
     context = {
         'page_obj': page_obj,
         'products': page_obj,
-        'categories': categories,
-        'subcategories': subcategories,
-        'current_category': category_filter,
-        'current_subcategory': subcategory_filter,
-        'current_category_name': current_category_name,
-        'current_subcategory_name': current_subcategory_name,
-        'current_sort': sort_by,
-        'search_query': search_query,
-        'total_products': products.count(),
+        **filters,
+        'current_category': params['category'],
+        'current_subcategory': params['subcategory'],
+        'current_sort': params['sort'],
+        'search_query': params['search'],
+        'in_stock_only': params['in_stock'],
+        'total_products': page_obj.paginator.count,
     }
     
     return render(request, 'appProducts/all_products.html', context)
 
+
 def subcategory_list(request, category_slug):
     """Список подкатегорий в выбранной категории"""
     category = get_object_or_404(Category, slug=category_slug, is_active=True)
@@ -154,23 +96,14 @@ def product_list(request, category_slug, subcategory_slug):
         category=category,
         is_active=True
     )
-    products = Product.objects.filter(
-        subcategory=subcategory,
-        is_active=True
-    ).select_related('subcategory__category').prefetch_related('images')
-
     tag = request.GET.get('tag')
-    if tag == 'new':
-        products = products.filter(is_new=True)
-    elif tag == 'hit':
-        products = products.filter(is_hit=True)
-    elif tag == 'sale':
-        products = products.filter(is_sale=True)
-
-    # Пагинация (по 12 товаров на страницу)
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    sort = request.GET.get('sort', '')
+    products = product_list_queryset(subcategory, tag, sort)
+
+    # Пагинация (по PRODUCT_LIST_PER_PAGE товаров на страницу)
+    page_obj = listing_page(
+        product_list_listing(subcategory, tag, sort), products, PRODUCT_LIST_PER_PAGE, request.GET.get('page')
+    )
 
     return render(request, 'appProducts/product_list.html', {
         'category': category,
@@ -181,38 +114,20 @@ def product_list(request, category_slug, subcategory_slug):
 
 def product_detail(request, category_slug, subcategory_slug, product_slug):
     """Страница отдельного товара"""
-    product = get_object_or_404(
-        Product,
-        slug=product_slug,
-        subcategory__slug=subcategory_slug,
-        subcategory__category__slug=category_slug,
-        is_active=True
-    )
-    extra_images = product.images.all()
+    page = product_page(category_slug, subcategory_slug, product_slug)
+    if page is None:
+        raise Http404("No Product matches the given query.")
+    # Только счётчик в памяти: запись в базу делает фоновый поток
+    product_views.record(page['product'].id)
 
     return render(request, 'appProducts/product_detail.html', {
-        'product': product,
-        'extra_images': extra_images
+        **page,
+        'catalog_version': catalog_version(),
     })
 
 def home_view(request):
-    """Главная страница с оптимизированными запросами"""
-    new_products = Product.objects.filter(
-        is_new=True, 
-        is_active=True
-    ).select_related(
-        'subcategory__category'
-    ).prefetch_related('images')[:6]
-    
-    # Получаем популярные категории для главной страницы
-    popular_categories = Category.objects.filter(
-        is_active=True
-    ).prefetch_related('subcategories')[:9]  # Берем 9 категорий для сетки 3x3
-    
-    return render(request, 'home/home.html', {
-        'new_products': new_products,
-        'popular_categories': popular_categories
-    })
+    """Главная страница: новинки и 9 категорий для сетки 3x3 из кэша каталога"""
+    return render(request, 'home/home.html', home_page())
 
 @login_required
 @require_POST
@@ -234,6 +149,13 @@ def add_to_cart(request, product_id):
                             category_slug=product.subcategory.category.slug,
                             subcategory_slug=product.subcategory.slug,
                             product_slug=product.slug)
+
+        if not product.in_stock:
+            messages.error(request, f"{product.name} нет в наличии")
+            return redirect('appProducts:product_detail',
+                            category_slug=product.subcategory.category.slug,
+                            subcategory_slug=product.subcategory.slug,
+                            product_slug=product.slug)
         
         cart_item, created = CartItem.objects.get_or_create(
             user=request.user,
@@ -289,11 +211,8 @@ def cart_view(request):
         'product__subcategory__category'
     ).prefetch_related('product__images')
     
-    # Используем агрегацию для вычисления суммы
-    total_data = cart_items.aggregate(
-        total=Sum(F('product__price') * F('quantity'))
-    )
-    total = total_data['total'] or 0
+    # Цены всех позиций с учётом акций считаются одним проходом
+    total = price_cart(cart_items)
     
     return render(request, 'appProducts/cart.html', {
         'cart_items': cart_items,
@@ -305,7 +224,11 @@ def cart_view(request):
 def update_cart(request, item_id):
     """Обновление количества товара в корзине с валидацией"""
     try:
-        cart_item = get_object_or_404(CartItem, id=item_id, user=request.user)
+        cart_item = get_object_or_404(
+            CartItem.objects.select_related('product__subcategory'),
+            id=item_id,
+            user=request.user
+        )
         
         # Получаем данные из POST или JSON
         if request.headers.get('Content-Type') == 'application/json':
@@ -326,7 +249,12 @@ def update_cart(request, item_id):
                 cart_item.save()
                 success_msg = "Количество товара обновлено"
                 if request.headers.get('Content-Type') == 'application/json':
-                    return JsonResponse({'success': True, 'message': success_msg})
+                    price_cart([cart_item])
+                    return JsonResponse({
+                        'success': True,
+                        'message': success_msg,
+                        'line_total': str(cart_item.line_total),
+                    })
                 messages.success(request, success_msg)
         else:
             cart_item.delete()
@@ -398,10 +326,64 @@ def clear_cart(request):
 
 
 
+@retry_on_lock
+def _place_order(user, data, cart_items, idempotency_key=None):
+    """
+    Создаёт заказ из корзины одной транзакцией.
+
+    idempotency_key — ключ из формы или заголовка Idempotency-Key.
+
+    При блокировке базы транзакция откатывается и выполняется заново целиком.
+    """
+    with transaction.atomic():
+        # Резервируем остатки первым запросом транзакции:
+        # при нехватке любой позиции весь заказ откатывается
+        reserve_stock((item.product_id, item.quantity) for item in cart_items)
+        total = price_cart(cart_items)
+        order = Order.objects.create(
+            user=user,
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            phone=data['phone'],
+            address=data['address'],
+            total_price=total,
+            items_count=sum(item.quantity for item in cart_items),
+            idempotency_key=idempotency_key or None
+        )
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                quantity=item.quantity,
+                price=item.unit_price,
+                discount=item.discount,
+                line_total=item.line_total
+            )
+            for item in cart_items
+        ])
+        record_new_order(order, order_items)
+        cart_items.delete()  # очистить корзину
+        # Задачи вставляются в этой же транзакции: после фиксации в _place_order нет
+        # работы, на которой retry_on_lock мог бы повторить уже созданный заказ
+        enqueue('orders.send_confirmation', order_id=order.id)
+        enqueue('orders.notify_admins', order_id=order.id)
+    return order
+
+
 @login_required
 def checkout(request):
     """Оформление заказа с транзакционной безопасностью"""
-    cart_items = CartItem.objects.filter(user=request.user).select_related('product')
+    idempotency_key = None
+    if request.method == 'POST':
+        idempotency_key = request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            # Повтор уже обработанной отправки: отвечаем по уникальному индексу,
+            # не открывая транзакцию и не трогая корзину
+            existing_order = _find_order_by_idempotency_key(request.user, idempotency_key)
+            if existing_order:
+                return _redirect_to_order_success(existing_order)
+
+    cart_items = CartItem.objects.filter(user=request.user).select_related('product__subcategory')
     if not cart_items:
         messages.warning(request, "Ваша корзина пуста")
         return redirect('appProducts:cart')
@@ -410,27 +392,23 @@ def checkout(request):
         form = OrderForm(request.POST)
         if form.is_valid():
             try:
-                with transaction.atomic():
-                    total = sum(item.product.price.amount * item.quantity for item in cart_items)
-                    order = Order.objects.create(
-                        user=request.user,
-                        first_name=form.cleaned_data['first_name'],
-                        last_name=form.cleaned_data['last_name'],
-                        phone=form.cleaned_data['phone'],
-                        address=form.cleaned_data['address'],
-                        total_price=total
-                    )
-                    for item in cart_items:
-                        OrderItem.objects.create(
-                            order=order,
-                            product=item.product,
-                            quantity=item.quantity,
-                            price=item.product.price.amount
-                        )
-                    cart_items.delete()  # очистить корзину
-                    logger.info(f"Заказ #{order.id} создан пользователем {request.user.username}")
-                    messages.success(request, f"Заказ #{order.id} успешно создан!")
-                    return redirect('appProducts:order_success')
+                order = _place_order(request.user, form.cleaned_data, cart_items, idempotency_key)
+                logger.info(f"Заказ #{order.id} создан пользователем {request.user.username}")
+                messages.success(request, f"Заказ #{order.id} успешно создан!")
+                return _redirect_to_order_success(order)
+            except IntegrityError as e:
+                # Параллельная отправка с тем же ключом успела создать заказ первой,
+                # наша транзакция откатилась вместе с резервом остатков
+                if idempotency_key:
+                    existing_order = _find_order_by_idempotency_key(request.user, idempotency_key)
+                    if existing_order:
+                        return _redirect_to_order_success(existing_order)
+                logger.error(f"Ошибка при создании заказа: {e}")
+                messages.error(request, "Произошла ошибка при оформлении заказа. Попробуйте еще раз.")
+            except InsufficientStock as e:
+                product = next(item.product for item in cart_items if item.product_id == e.product_id)
+                logger.info(f"Недостаточно остатка товара #{e.product_id} для пользователя {request.user.username}")
+                messages.error(request, f"Товара «{product.name}» недостаточно на складе. Уменьшите количество в корзине.")
             except ValidationError as e:
                 messages.error(request, f"Ошибка валидации: {e}")
             except Exception as e:
@@ -441,15 +419,87 @@ def checkout(request):
     else:
         form = OrderForm()
 
-    total = sum(item.product.price.amount * item.quantity for item in cart_items)
+    total = price_cart(cart_items)
     return render(request, 'appProducts/checkout.html', {
         'form': form,
         'cart_items': cart_items,
         'total': total
     })
 
+ORDERS_PER_PAGE = 20
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _order_cursor(order):
+    """Курсор keyset-пагинации: время создания в микросекундах и id заказа"""
+    delta = order.created_at - _EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f"{microseconds}-{order.id}"
+
+
+def _parse_order_cursor(value):
+    try:
+        microseconds, order_id = value.split('-')
+        return _EPOCH + timedelta(microseconds=int(microseconds)), int(order_id)
+    except (ValueError, OverflowError):
+        return None
+
+
+@login_required
+def order_history(request):
+    """История заказов пользователя с keyset-пагинацией"""
+    orders = Order.objects.filter(user=request.user).order_by('-created_at', '-id')
+
+    cursor = _parse_order_cursor(request.GET.get('before', ''))
+    if cursor:
+        created_at, order_id = cursor
+        # Индекс (user, -created_at) позволяет начать чтение сразу с нужного места
+        orders = orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        )
+
+    orders = list(
+        orders.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )[:ORDERS_PER_PAGE + 1]
+    )
+    has_next = len(orders) > ORDERS_PER_PAGE
+    orders = orders[:ORDERS_PER_PAGE]
+
+    return render(request, 'appProducts/order_history.html', {
+        'orders': orders,
+        'next_cursor': _order_cursor(orders[-1]) if has_next else None,
+        'is_first_page': cursor is None,
+    })
+
+
+@login_required
+def order_detail(request, order_id):
+    """Страница отдельного заказа пользователя"""
+    order = get_object_or_404(
+        Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product__subcategory__category'))
+        ),
+        id=order_id,
+        user=request.user
+    )
+    return render(request, 'appProducts/order_detail.html', {'order': order})
+
+
+def _find_order_by_idempotency_key(user, key):
+    return Order.objects.filter(idempotency_key=key, user=user).only('id').first()
+
+
+def _redirect_to_order_success(order):
+    return redirect(f"{reverse('appProducts:order_success')}?order={order.id}")
+
+
 def order_success(request):
-    return render(request, 'appProducts/order_success.html')
+    order = None
+    order_id = request.GET.get('order', '')
+    if request.user.is_authenticated and order_id.isdigit():
+        order = Order.objects.filter(id=order_id, user=request.user).first()
+    return render(request, 'appProducts/order_success.html', {'order': order})
 
 def contact_view(request):
     """Обработка формы обратной связи"""
@@ -457,7 +507,13 @@ def contact_view(request):
         form = ContactForm(request.POST)
         if form.is_valid():
             try:
-                ContactMessage.objects.create(
+                if intake.is_enabled():
+                    # Запись в базу пакетом из фонового потока, ответ — сразу
+                    intake.contact_intake.submit(form.cleaned_data)
+                    logger.info(f"Получено сообщение [{form.cleaned_data['category']}] от {form.cleaned_data['email']}")
+                    messages.success(request, "Ваше сообщение отправлено! Мы свяжемся с вами в ближайшее время.")
+                    return redirect('appProducts:contact')
+                contact_message = ContactMessage.objects.create(
                     name=form.cleaned_data['name'],
                     email=form.cleaned_data['email'],
                     phone=form.cleaned_data.get('phone', ''),
@@ -465,6 +521,7 @@ def contact_view(request):
                     subject=form.cleaned_data.get('subject', ''),
                     message=form.cleaned_data['message']
                 )
+                enqueue('contact.notify_admins', message_id=contact_message.id)
                 logger.info(f"Получено сообщение [{form.cleaned_data['category']}] от {form.cleaned_data['email']}")
                 messages.success(request, "Ваше сообщение отправлено! Мы свяжемся с вами в ближайшее время.")
                 return redirect('appProducts:contact')
@@ -0,0 +1,156 @@
+"""
+Прогрев процесса после деплоя: шаблоны, URL-резолвер и кэш каталога.
+
+warm_up() вызывают команда warm_catalog, главный процесс Store.prefork
+(через PREFORK_PRELOAD) до запуска рабочих и Store.wsgi / Store.asgi при
+CATALOG_CACHE['WARM_ON_STARTUP']. Кэш общий для всех процессов сервера
+(appProducts.cache_backend), поэтому достаточно одного прогрева после деплоя:
+командой warm_catalog или в главном процессе prefork.
+
+Страницы списков прогреваются вызовом самих представлений с анонимным
+GET-запросом. Страницы товаров — через product_page() и отрисовку шаблона,
+чтобы прогрев не засчитывался в просмотры товаров.
+"""
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import DatabaseError
+from django.http import HttpRequest, QueryDict
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.loader import render_to_string
+from django.urls import get_resolver
+
+from . import views
+from .catalog_cache import catalog_tree, catalog_version, product_page
+from .models import Product
+from .rankings import top_products
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, default)
+
+
+def compile_templates():
+    """Загружает все шаблоны проекта и приложений в кэширующий загрузчик"""
+    compiled = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if not filename.endswith(('.html', '.txt', '.xml')):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), directory)
+                    try:
+                        engine.get_template(name)
+                    except (TemplateSyntaxError, TemplateDoesNotExist):
+                        # Фрагменты, рассчитанные на чужой контекст загрузки, пропускаем
+                        continue
+                    compiled += 1
+    return compiled
+
+
+def anonymous_request(path, query=''):
+    """GET-запрос анонимного покупателя для вызова представлений вне HTTP-сервера"""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.GET = QueryDict(query)
+    request.META['QUERY_STRING'] = query
+    request.META.update({'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'})
+    request.user = AnonymousUser()
+    return request
+
+
+def _top_products(limit):
+    """Самые продаваемые товары, дополненные самыми просматриваемыми"""
+    ids = top_products(limit=limit)
+    if len(ids) < limit:
+        ids += list(
+            Product.objects.filter(is_active=True).exclude(pk__in=ids)
+            .order_by('-views_count').values_list('pk', flat=True)[:limit - len(ids)]
+        )
+    products = Product.objects.filter(pk__in=ids, is_active=True).select_related('subcategory__category')
+    return sorted(products, key=lambda product: ids.index(product.pk))
+
+
+def warm_pages():
+    """Главная, каталог и все товары — страницы без параметров"""
+    views.home_view(anonymous_request('/'))
+    views.category_list(anonymous_request('/products/'))
+    views.all_products(anonymous_request('/products/all-products/'))
+    return 3
+
+
+def warm_listings(products):
+    """Первые страницы подкатегорий, в которых лежат самые популярные товары"""
+    subcategories = {product.subcategory_id: product.subcategory for product in products}
+    for subcategory in subcategories.values():
+        views.product_list(
+            anonymous_request(f'/products/{subcategory.category.slug}/{subcategory.slug}/'),
+            subcategory.category.slug,
+            subcategory.slug,
+        )
+    return len(subcategories)
+
+
+def warm_product_pages(products):
+    """Данные страниц товаров и фрагменты шаблона для анонимных покупателей"""
+    version = catalog_version()
+    for product in products:
+        slugs = (product.subcategory.category.slug, product.subcategory.slug, product.slug)
+        page = product_page(*slugs)
+        if page is None:
+            continue
+        render_to_string(
+            'appProducts/product_detail.html',
+            {**page, 'catalog_version': version},
+            request=anonymous_request('/products/{}/{}/{}/'.format(*slugs)),
+        )
+    return len(products)
+
+
+def warm_up(top_n=None):
+    """
+    Прогревает шаблоны, резолвер и кэш каталога.
+
+    Возвращает список (шаг, количество, секунды) для отчёта; у шага,
+    упавшего на ошибке базы, количество None.
+    """
+    top_n = _setting('WARM_TOP_N', 20) if top_n is None else top_n
+    report = []
+
+    def step(name, func, *args):
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except DatabaseError:
+            # Прогрев не должен мешать запуску, например до применения миграций
+            logger.exception(f"Прогрев: шаг {name} не выполнен")
+            result = None
+        count = len(result) if isinstance(result, list) else result
+        report.append((name, count, time.perf_counter() - started))
+        return result
+
+    step('templates', compile_templates)
+    step('url_resolver', lambda: len(get_resolver().reverse_dict))
+    step('catalog_tree', lambda: len(catalog_tree()))
+    step('pages', warm_pages)
+    products = step('top_products', _top_products, top_n) or []
+    step('listings', warm_listings, products)
+    step('product_pages', warm_product_pages, products)
+    logger.info(
+        f"Прогрев завершён за {sum(seconds for _, _, seconds in report):.2f} с: "
+        + ', '.join(f"{name}={count}" for name, count, _ in report)
+    )
+    return report
+
+
+def warm_on_startup():
+    """Прогрев при импорте Store.wsgi / Store.asgi, если включён в настройках"""
+    if _setting('WARM_ON_STARTUP', False):
+        warm_up()